@@ -1,25 +1,32 @@
-import subprocess
 import sys
 import os
 import shlex
-import csv
 import torch
 import numpy as np
-import matplotlib.pyplot as plt
-from botorch.models import SingleTaskGP
+from botorch.models import SingleTaskGP, SingleTaskMultiFidelityGP
 from gpytorch.likelihoods import GaussianLikelihood
 from gpytorch.kernels import MaternKernel, ScaleKernel, RBFKernel
 from gpytorch.means import ConstantMean, ZeroMean
-from gpytorch.mlls import ExactMarginalLogLikelihood
-from botorch.fit import fit_gpytorch_mll
 from botorch.acquisition import ExpectedImprovement, ProbabilityOfImprovement, PosteriorMean
-from botorch.acquisition.knowledge_gradient import qKnowledgeGradient
-from botorch.acquisition.max_value_entropy_search import qMaxValueEntropy
-from botorch.optim import optimize_acqf
+from botorch.acquisition.fixed_feature import FixedFeatureAcquisitionFunction
+from botorch.optim import optimize_acqf, optimize_acqf_mixed
 from botorch.models.transforms.input import Normalize
 from botorch.models.transforms.outcome import Standardize
 import time
-import signal
+from gp_update import IncrementalGP
+from optimize_1d import optimize_acqf_1d
+import threading
+from parallel_evaluation import evaluate_in_parallel, AsynchronousEvaluator
+import simulation_cache
+import process_supervisor
+import prestretch_surrogate
+import result_channel
+import checkpoint
+import prior_data
+import results_store
+import stopping_criteria
+from posterior_grid import PosteriorGrid
+import design_space
 
 """
 This is a file to carry out Bayesian Optimization for the cuboid muscle simulation in OpenDiHu.
@@ -36,6 +43,21 @@ For the mean: "const" "zero"
 For the noise: "fixed_noise" "variable_noise"
 For the acquisition function: "ei" "es" "kg" "pi"
 For the stopping criterion: "stopping_xy" "stopping_y"
+Additional stopping criteria, the loop stops as soon as one of the chosen criteria is met (see stopping_criteria.py):
+"stopping_regret" "stopping_variance"
+For the number of simulations that run at the same time in every iteration: "batch 4" (any positive integer)
+For an asynchronous loop that starts a new simulation as soon as a worker is free: "async", optionally with "workers 8"
+To simulate every force again instead of using the results stored in build_release/simulation_cache.sqlite: "no_cache"
+For multi-fidelity BO, which simulates most forces with a coarser mesh, fewer fibers and a shorter end time and only the
+promising ones with the full model: "multi_fidelity" (can't be combined with "batch" or "async")
+To continue an interrupted run with the same options from its last checkpoint without simulating again: "resume"
+To use the trials of earlier runs with the same settings as initial training data: "prior_data"
+To optimize parameters of variables/variables.py together with the force: "parameter pmax 5 10" with the name and the
+bounds of the parameter, repeated for every parameter (see design_space.py, can't be combined with "multi_fidelity" or
+"prior_data")
+matplotlib and the modules of KG, ES and multi-fidelity BO take long to import, so they are only imported when they are
+used. To measure the import time of the scripts, run
+>python benchmark_startup.py
 """
 ########################################################################################################################
 #Customize code here
@@ -61,6 +83,11 @@ improvement_threshold = 1e-4
 stopping_xy = False
 x_range = 5e-2
 num_consecutive_trials = 3
+stopping_regret = False
+regret_threshold = 1e-3
+regret_beta = 2.0
+stopping_variance = False
+variance_threshold = 1e-6
 
 #Minor changes:
 fixed_Yvar = 1e-6
@@ -69,15 +96,42 @@ sobol_on = True
 num_initial_trials = 2 #this needs to be >=2
 visualize = True
 add_points = False
+refit_interval = 3 #the hyperparameters of the GP are fitted every refit_interval iterations, in between the GP is only updated (see gp_update.py)
+min_refit_trials = 6 #as long as there are fewer trials, the hyperparameters are fitted after every iteration
+mll_tolerance = 2.0 #the hyperparameters are also fitted if the log predictive density of a new observation is more than this below the marginal log likelihood per observation
 upper_bound = 30
 specific_relative_upper_bound = False
 max_upper_bound = False
 relative_prestretch_min = 1.5
 relative_prestretch_max = 1.6
+batch_size = 1 #number of query points that are proposed and simulated at the same time in every iteration
+num_workers = None #maximum number of simultaneous simulations, None means one per query point (bounded by the cores)
+asynchronous = False #propose a new query point whenever a simulation has finished instead of waiting for the whole batch
+use_cache = True #reuse the results of earlier simulations with the same force and the same settings
+cache_force_tolerance = 1e-6 #forces that differ by at most this are considered to be the same
+simulation_timeout = 3600 #seconds after which a simulation is killed
+simulation_retries = 1 #how often a failed simulation is started again
+prestretch_timeout = 15 #seconds after which a prestretch is killed, the muscle is considered to be torn then
+memory_limit = None #maximum address space of a simulation in bytes, None means no limit
+num_probes = 8 #number of forces that are stretched at the same time when searching for the upper bound
+multi_fidelity = False #model the contraction depending on force and fidelity and choose both with a cost-aware acquisition function
+fidelities = [0.25, 0.5, 1.0] #the fidelities that can be simulated, 1.0 is the full model (see variables/variables.py)
+fidelity_fixed_cost = 0.1 #the cost of a simulation is fidelity_fixed_cost + fidelity
+resume = False #continue from the checkpoint of an interrupted run with the same options instead of starting a new run
+checkpoint_interval = 1 #number of iterations between two checkpoints
+use_prior_data = False #use the trials of earlier runs with the same settings as initial training data, see prior_data.py
+kg_time_budget = 60 #seconds that KG may take per query point, the number of fantasies is scaled to it
+design_parameters = {} #parameters of variables/variables.py that are optimized together with the force, as name: (lower bound, upper bound), e.g. {"pmax": (5.0, 10.0), "c2": (1.5, 2.1)}
+optimizer_1d = True #maximize the acquisition function on a grid refined by golden section searches (optimize_1d.py) instead of with multi-start L-BFGS
 ########################################################################################################################
 
 #This interprets the custom inputs for the BO model
 inputs = [item.lower() for item in sys.argv]
+#The parameters are taken out first, so their bounds aren't mistaken for other options, e.g. for the nu of the kernel
+while "parameter" in inputs:
+    k = inputs.index("parameter")
+    design_parameters[inputs[k+1]] = (float(inputs[k+2]), float(inputs[k+3]))
+    del inputs[k:k+4]
 if len(inputs) > 0:
     if "matern" in inputs:
         matern = True
@@ -119,10 +173,47 @@ if len(inputs) > 0:
     elif "stopping_xy" in inputs:
         stopping_y = False
         stopping_xy = True
+    if "batch" in inputs:
+        batch_size = int(inputs[inputs.index("batch")+1])
+    if "async" in inputs:
+        asynchronous = True
+    if "workers" in inputs:
+        num_workers = int(inputs[inputs.index("workers")+1])
+    if "no_cache" in inputs:
+        use_cache = False
+    if "multi_fidelity" in inputs:
+        multi_fidelity = True
+    if "stopping_regret" in inputs:
+        stopping_regret = True
+    if "stopping_variance" in inputs:
+        stopping_variance = True
+    if "resume" in inputs or "--resume" in inputs:
+        resume = True
+    if "prior_data" in inputs:
+        use_prior_data = True
+if multi_fidelity and (asynchronous or batch_size > 1):
+    print("Multi-fidelity BO can't be combined with batches or the asynchronous loop, used one simulation at a time instead.")
+    asynchronous = False
+    batch_size = 1
+if len(design_parameters) > 0 and multi_fidelity:
+    print("Multi-fidelity BO can't be combined with further parameters, used the full model only instead.")
+    multi_fidelity = False
+if len(design_parameters) > 0 and use_prior_data:
+    print("The trials of earlier runs can't be used with further parameters, started without them instead.")
+    use_prior_data = False
+design = design_space.DesignSpace(design_parameters)
+dimension = design.dimension
+#The simulations inherit the environment, so the settings files don't use the cache either
+if not use_cache:
+    os.environ[simulation_cache.environment_variable] = "0"
+if num_workers is None and not asynchronous:
+    num_workers = batch_size
+if visualize:
+    import matplotlib.pyplot as plt
 
 
-#We need to write the generated data into files. To see the difference between the resulting files, we add a individuality 
-#parameter in the filename, which we create here. 
+#We need to store the generated data. To tell the runs of different options apart, we add an individuality parameter to
+#the checkpoint filename and to the run in the results store, which we create here.
 global_individuality_parameter = ""
 title = ""
 if matern:
@@ -161,35 +252,71 @@ if stopping_y:
 elif stopping_xy:
     global_individuality_parameter = global_individuality_parameter + "_stopping_xy"
     title = title + "XY-Stopping"
-
-
-#This is the method that evaluates the function we want to optimize.
-def simulation(force):
+if stopping_regret:
+    global_individuality_parameter = global_individuality_parameter + "_regret"
+    title = title + ", Regret-Stopping"
+if stopping_variance:
+    global_individuality_parameter = global_individuality_parameter + "_variance"
+    title = title + ", Variance-Stopping"
+if asynchronous:
+    global_individuality_parameter = global_individuality_parameter + "_async"
+    title = title + ", Asynchronous"
+elif batch_size > 1:
+    global_individuality_parameter = global_individuality_parameter + "_batch_" + str(batch_size)
+    title = title + ", Batches of " + str(batch_size)
+if multi_fidelity:
+    global_individuality_parameter = global_individuality_parameter + "_multi_fidelity"
+    title = title + ", Multi-Fidelity"
+if len(design_parameters) > 0:
+    global_individuality_parameter = global_individuality_parameter + "_parameters_" + "_".join(design.names)
+    title = title + ", Parameters " + ", ".join(design.names)
+
+
+#The results of the simulations are cached together with a hash of these files.
+contraction_files = ["../settings_contraction_with_prestretch.py", "../variables/variables.py", "muscle_contraction_with_prestretch"]
+prestretch_files = ["../prestretch_tensile_test.py", "../variables/variables.py", "incompressible_mooney_rivlin_prestretch_only"]
+
+
+#This is the method that evaluates the function we want to optimize. A fidelity below 1 simulates a coarser model.
+#parameters are the values of further parameters of variables/variables.py as a dict of name: value.
+def simulation(force, fidelity=1.0, parameters={}):
     force = force.numpy()[0]
-    print("start simulation with force", force)
-    individuality_parameter = str(int(time.time()))+str(force)
-    command = shlex.split(f"./muscle_contraction_with_prestretch ../settings_contraction_with_prestretch.py incompressible_mooney_rivlin {force} {individuality_parameter}")
-    subprocess.run(command)
+    cache_kind = "muscle_contraction_with_prestretch"
+    if fidelity != 1.0:
+        cache_kind = cache_kind + "_fidelity_" + str(fidelity)
+    cache_kind = cache_kind + design_space.suffix(parameters)
+    if use_cache:
+        cached = simulation_cache.lookup(cache_kind, simulation_cache.settings_hash(contraction_files), force, cache_force_tolerance)
+        if cached is not None:
+            print("found simulation with force", force, "in the cache")
+            print("The muscle was stretched ", cached["prestretch"])
+            print("The muscle contracted ", cached["contraction"])
+            return cached["contraction"]
+
+    if parameters:
+        print("start simulation with force", force, "fidelity", fidelity, "and parameters", parameters)
+    else:
+        print("start simulation with force", force, "and fidelity", fidelity)
+    individuality_parameter = str(int(time.time()))+"_"+str(threading.get_ident())+"_"+str(force)
+    command = shlex.split(f"./muscle_contraction_with_prestretch ../settings_contraction_with_prestretch.py incompressible_mooney_rivlin {force} {individuality_parameter} {fidelity}")
+    #A simulation that exceeded its timeout is started again as well, it may only have been slowed down by the others
+    run = process_supervisor.run(command, timeout=simulation_timeout, retries=simulation_retries, retry_on_timeout=True,
+                                 memory_limit=memory_limit, env=design.environment(parameters))
+    if run.returncode != 0:
+        raise RuntimeError(f"Simulation with force {force} failed after {run.attempts} attempts")
 
     print("end simulation")
 
-    f = open("muscle_length_prestretch"+individuality_parameter+".csv")
-    reader = csv.reader(f, delimiter=",")
-    for row in reader:
-        prestretch = float(row[1]) - float(row[0])
-        print("The muscle was stretched ", prestretch)
-    f.close()
-
-    f = open("muscle_length_contraction"+individuality_parameter+".csv")
-    reader = csv.reader(f, delimiter=",")
-    muscle_length_process = []
-    for row in reader:
-        for j in row:
-            muscle_length_process.append(j)
-        
-    contraction = float(muscle_length_process[0]) - float(muscle_length_process[-2])
+    muscle_length_prestretch = result_channel.read("muscle_length_prestretch", individuality_parameter)
+    prestretch = float(muscle_length_prestretch[1] - muscle_length_prestretch[0])
+    print("The muscle was stretched ", prestretch)
+
+    muscle_length_process = result_channel.read("muscle_length_contraction", individuality_parameter)
+    contraction = float(muscle_length_process[0] - muscle_length_process[-1])
     print("The muscle contracted ", contraction)
-    f.close()
+
+    if use_cache:
+        simulation_cache.store(cache_kind, simulation_cache.settings_hash(contraction_files), force, {"contraction": contraction, "prestretch": prestretch})
 
     return contraction
 
@@ -205,13 +332,14 @@ class CustomSingleTaskGP(SingleTaskGP):
         else:
             print("Wrong input, used variable noise instead")
             likelihood = GaussianLikelihood()
+        #With several inputs, every input has its own lengthscale (automatic relevance determination)
         if matern:
-            kernel = ScaleKernel(MaternKernel(nu=nu))
+            kernel = ScaleKernel(MaternKernel(nu=nu, ard_num_dims=train_X.shape[-1]))
         elif rbf:
-            kernel = ScaleKernel(RBFKernel())
+            kernel = ScaleKernel(RBFKernel(ard_num_dims=train_X.shape[-1]))
         else:
             print("Wrong input, used Matern Kernel with nu=1.5 instead")
-            kernel = ScaleKernel(MaternKernel(nu=1.5))
+            kernel = ScaleKernel(MaternKernel(nu=1.5, ard_num_dims=train_X.shape[-1]))
 
         if const:
             mean = ConstantMean()
@@ -233,226 +361,502 @@ class CustomSingleTaskGP(SingleTaskGP):
                          outcome_transform=output_transform,
                         )
 
-class TimeoutException(Exception):
-    pass
-
-def handler(signum, frame):
-    raise TimeoutException()
+#In multi-fidelity mode, the GP models the contraction depending on the force and the fidelity (the second input). The
+#kernel of the fidelity is a linear truncated kernel, which lets the GP learn how far the coarse models are off.
+class MultiFidelityGP(SingleTaskMultiFidelityGP):
+    def __init__(self, train_X, train_Y):
+        train_Yvar = torch.full_like(train_Y, fixed_Yvar, dtype=torch.double)
+        if fixed_noise:
+            likelihood = GaussianLikelihood(noise=train_Yvar)
+        else:
+            likelihood = GaussianLikelihood()
+        if matern:
+            kernel_nu = nu
+        else:
+            kernel_nu = 2.5
 
+        super().__init__(train_X,
+                         train_Y,
+                         likelihood=likelihood,
+                         data_fidelities=[1],
+                         nu=kernel_nu,
+                         outcome_transform=Standardize(m=1),
+                        )
 
 #This is the function that only stretches a muscle.
 def find_relative_prestretch(force):
-    individuality_parameter = str(int(time.time()))+"_"+str(force)
+    if use_cache:
+        cached = simulation_cache.lookup("incompressible_mooney_rivlin_prestretch_only", simulation_cache.settings_hash(prestretch_files), force, cache_force_tolerance)
+        if cached is not None:
+            return cached["relative_prestretch"]
+
+    individuality_parameter = str(int(time.time()))+"_"+str(threading.get_ident())+"_"+str(force)
     command = shlex.split(f"./incompressible_mooney_rivlin_prestretch_only ../prestretch_tensile_test.py incompressible_mooney_rivlin_prestretch_only {force} {individuality_parameter}")
-    
-    signal.signal(signal.SIGALRM, handler)
-    signal.alarm(15) #After 15 seconds without feedback, the alarm activates
-
-    try:
-        subprocess.run(command)
-        f = open("muscle_length_prestretch"+individuality_parameter+".csv")
-        reader = csv.reader(f, delimiter=",")
-        for row in reader:
-            relative_prestretch = float(row[1]) / float(row[0])
-        f.close()
-        command2 = shlex.split("rm muscle_length_prestretch"+individuality_parameter+".csv")
-        subprocess.run(command2)
-    except TimeoutException:
-        relative_prestretch = -1
+
+    #If the solver doesn't finish in time, the muscle tore
+    run = process_supervisor.run(command, timeout=prestretch_timeout, memory_limit=memory_limit)
+    if run.timed_out:
         print("Muscle tore")
-    finally:
-        signal.alarm(0)
+        return -1
+    if run.returncode != 0:
+        raise RuntimeError(f"Prestretch with force {force} failed")
+
+    muscle_length_prestretch = result_channel.read("muscle_length_prestretch", individuality_parameter)
+    relative_prestretch = float(muscle_length_prestretch[1] / muscle_length_prestretch[0])
+    result_channel.remove("muscle_length_prestretch", individuality_parameter)
+    if use_cache:
+        simulation_cache.store("incompressible_mooney_rivlin_prestretch_only", simulation_cache.settings_hash(prestretch_files), force, {"relative_prestretch": relative_prestretch})
 
     return relative_prestretch
 
 
-#To find out how far we can stretch the muscle without breaking, we use this function.
+#This runs find_relative_prestretch for several forces at the same time and returns the results in the same order.
+def probe_relative_prestretches(forces):
+    relative_prestretches = [None]*len(forces)
+    for index, relative_prestretch in evaluate_in_parallel(find_relative_prestretch, forces, num_probes):
+        relative_prestretches[index] = relative_prestretch
+    return relative_prestretches
+
+
+#To find out how far we can stretch the muscle without breaking, we use this function. It is a k-section search: every
+#round probes num_probes forces at the same time. As long as the muscle doesn't tear, the probed forces double, then the
+#bracket between the largest force without and the smallest force with tearing is divided into num_probes+1 parts.
 def find_max_upper_bound():
     lower_guess = 0
-    upper_guess = 10
-    relative_prestretch_up = find_relative_prestretch(upper_guess)
-
-    while relative_prestretch_up >= 0 or (relative_prestretch_up < 0 and upper_guess-lower_guess > 1):
-        if relative_prestretch_up >= 0:
-            not_relevant = upper_guess
-            upper_guess = 2*upper_guess - lower_guess
-            lower_guess = not_relevant
-            relative_prestretch_up = find_relative_prestretch(upper_guess)
-        else:
-            middle_guess = (upper_guess+lower_guess)/2
-            relative_prestretch_mid = find_relative_prestretch(middle_guess)
-            if relative_prestretch_mid >= 0:
-                lower_guess = middle_guess
-            elif relative_prestretch_mid < 0:
-                upper_guess = middle_guess
-                relative_prestretch_up = relative_prestretch_mid
+    upper_guess = None
+    first_guess = 10
+
+    while upper_guess is None:
+        forces = [lower_guess + first_guess*2**j for j in range(num_probes)]
+        for force, relative_prestretch in zip(forces, probe_relative_prestretches(forces)):
+            if relative_prestretch < 0:
+                upper_guess = force
+                break
+            lower_guess = force
+        first_guess = 2*first_guess
+
+    while upper_guess-lower_guess > 1:
+        forces = [lower_guess + (upper_guess-lower_guess)*j/(num_probes+1) for j in range(1, num_probes+1)]
+        for force, relative_prestretch in zip(forces, probe_relative_prestretches(forces)):
+            if relative_prestretch < 0:
+                upper_guess = force
+                break
+            lower_guess = force
 
     return lower_guess
     
 
 #If we want to see whith which force we have to stretch the muscle to get a certain length, we can use this function.
+#First, the surrogate of the earlier prestretch runs is asked for the force, which is confirmed with one simulation. If
+#the surrogate can't answer or is wrong, it is a k-section search like find_max_upper_bound, a torn muscle counts as
+#stretched too far. All probes are stored in the cache and improve the surrogate for the next time.
 def find_specific_upper_bound():
+    if use_cache:
+        force = prestretch_surrogate.force_for_relative_prestretch(simulation_cache.settings_hash(prestretch_files), (relative_prestretch_min+relative_prestretch_max)/2)
+        if force is not None:
+            relative_prestretch = find_relative_prestretch(force)
+            if relative_prestretch_min <= relative_prestretch <= relative_prestretch_max:
+                print("The surrogate's force", force, "leads to the relative prestretch", relative_prestretch)
+                return force
+
     lower_guess = 0
-    upper_guess = 10
-    relative_prestretch_low = 1
-    relative_prestretch_up = find_relative_prestretch(upper_guess)
-
-    while (relative_prestretch_low < relative_prestretch_min or relative_prestretch_low > relative_prestretch_max) and (relative_prestretch_up < relative_prestretch_min or relative_prestretch_up > relative_prestretch_max):
-        if relative_prestretch_up < relative_prestretch_min and relative_prestretch_up >= 0:
-            not_relevant = upper_guess
-            upper_guess = 2*upper_guess - lower_guess
-            lower_guess = not_relevant
-            relative_prestretch_low = relative_prestretch_up
-            relative_prestretch_up = find_relative_prestretch(upper_guess)
+    upper_guess = None
+    first_guess = 10
+
+    while True:
+        if upper_guess is None:
+            forces = [lower_guess + first_guess*2**j for j in range(num_probes)]
+            first_guess = 2*first_guess
         else:
-            middle_guess = (upper_guess+lower_guess)/2
-            relative_prestretch_mid = find_relative_prestretch(middle_guess)
-            if relative_prestretch_mid < relative_prestretch_min:
-                lower_guess = middle_guess
-                relative_prestretch_low = relative_prestretch_mid
-            elif relative_prestretch_mid > relative_prestretch_max:
-                upper_guess = middle_guess
-                relative_prestretch_up = relative_prestretch_mid
+            forces = [lower_guess + (upper_guess-lower_guess)*j/(num_probes+1) for j in range(1, num_probes+1)]
+        for force, relative_prestretch in zip(forces, probe_relative_prestretches(forces)):
+            if relative_prestretch_min <= relative_prestretch <= relative_prestretch_max:
+                return force
+            if relative_prestretch < 0 or relative_prestretch > relative_prestretch_max:
+                upper_guess = force
+                break
+            lower_guess = force
+        #upper_guess tore or overstretched the muscle, so the largest force below the range is taken instead
+        if upper_guess is not None and upper_guess-lower_guess < 1e-6:
+            if lower_guess == 0:
+                raise RuntimeError(f"No force reaches a relative prestretch between {relative_prestretch_min} and {relative_prestretch_max}")
+            print("No force reaches a relative prestretch between", relative_prestretch_min, "and", relative_prestretch_max,
+                  ", using the largest force below it:", lower_guess)
+            return lower_guess
+
+
+#ES keeps its candidate set and the max-value samples for the whole run, see es_engine.py. KG keeps the maximizer of the
+#posterior mean and the time per fantasy, see kg_engine.py.
+entropy_search = None
+knowledge_gradient = None
+
+#This chooses the next query point by optimizing the acquisition function of the given GP.
+def next_candidate(gp, best_f):
+    if EI:
+        acq_fct = ExpectedImprovement(model=gp, best_f=best_f)
+    elif PI:
+        acq_fct = ProbabilityOfImprovement(model=gp, best_f=best_f)
+    elif KG:
+        pass
+    elif ES:
+        global entropy_search
+        if entropy_search is None:
+            from es_engine import EntropySearch
+            entropy_search = EntropySearch(dimension=dimension)
+        acq_fct = entropy_search.acquisition_function(gp)
+    else:
+        print("Wrong input, used Expected Improvement instead.")
+        acq_fct = ExpectedImprovement(model=gp, best_f=best_f)
+
+    if KG:
+        global knowledge_gradient
+        if knowledge_gradient is None:
+            from kg_engine import KnowledgeGradient
+            SMOKE_TEST = os.environ.get("SMOKE_TEST")
+            if SMOKE_TEST:
+                knowledge_gradient = KnowledgeGradient(kg_time_budget, min_fantasies=2, max_fantasies=4, num_restarts=2,
+                                                       dimension=dimension, one_dimensional=optimizer_1d and dimension == 1)
             else:
-                return middle_guess
-        
-    return upper_guess
+                knowledge_gradient = KnowledgeGradient(kg_time_budget, dimension=dimension,
+                                                       one_dimensional=optimizer_1d and dimension == 1)
+        candidate, acq_value = knowledge_gradient.next_candidate(gp)
+    elif optimizer_1d and dimension == 1:
+        candidate, acq_value = optimize_acqf_1d(acq_fct)
+    else:
+        #With several inputs, the raw samples that the restarts are chosen from grow with the dimension
+        candidate, acq_value = optimize_acqf(
+            acq_function=acq_fct,
+            bounds=torch.stack([torch.zeros(dimension, dtype=torch.double), torch.ones(dimension, dtype=torch.double)]),
+            q=1,
+            num_restarts=20,
+            raw_samples=256*dimension,
+        )
+
+    return candidate
+
+
+#This chooses the next query point and its fidelity in multi-fidelity mode with the knowledge gradient divided by the cost
+#of the simulation. The value of a simulation is measured at full fidelity, so cheap simulations are chosen as long as
+#they tell enough about the full model, and a simulation with the full model only when it is worth its cost.
+def next_multi_fidelity_candidate(gp):
+    from botorch.acquisition.knowledge_gradient import qMultiFidelityKnowledgeGradient
+    from botorch.acquisition.cost_aware import InverseCostWeightedUtility
+    from botorch.acquisition.utils import project_to_target_fidelity
+    from botorch.models.cost import AffineFidelityCostModel
+    SMOKE_TEST = os.environ.get("SMOKE_TEST")
+    NUM_FANTASIES = 128 if not SMOKE_TEST else 4
+    NUM_RESTARTS = 10 if not SMOKE_TEST else 2
+    RAW_SAMPLES = 128
+    bounds = torch.tensor([[0, min(fidelities)], [1, 1]], dtype=torch.double)
+    cost_model = AffineFidelityCostModel(fidelity_weights={1: 1.0}, fixed_cost=fidelity_fixed_cost)
+
+    def project(X):
+        return project_to_target_fidelity(X=X, target_fidelities={1: 1.0}, d=2)
+
+    argmax_pmean, max_pmean = optimize_acqf(
+        acq_function=FixedFeatureAcquisitionFunction(acq_function=PosteriorMean(gp), d=2, columns=[1], values=[1]),
+        bounds=bounds[:, :1],
+        q=1,
+        num_restarts=NUM_RESTARTS,
+        raw_samples=RAW_SAMPLES,
+    )
+    acq_fct = qMultiFidelityKnowledgeGradient(
+        model=gp,
+        num_fantasies=NUM_FANTASIES,
+        current_value=max_pmean,
+        cost_aware_utility=InverseCostWeightedUtility(cost_model=cost_model),
+        project=project,
+    )
+    candidate, acq_value = optimize_acqf_mixed(
+        acq_function=acq_fct,
+        bounds=bounds,
+        fixed_features_list=[{1: fidelity} for fidelity in fidelities],
+        q=1,
+        num_restarts=NUM_RESTARTS,
+        raw_samples=RAW_SAMPLES,
+    )
+
+    return candidate
+
+
+#This is the query point in [0,1] with the highest posterior mean at full fidelity, together with the fidelity 1.
+def recommended_candidate(gp):
+    candidate, value = optimize_acqf(
+        acq_function=FixedFeatureAcquisitionFunction(acq_function=PosteriorMean(gp), d=2, columns=[1], values=[1]),
+        bounds=torch.tensor([[0], [1]], dtype=torch.double),
+        q=1,
+        num_restarts=20,
+        raw_samples=256,
+    )
+    return torch.cat([candidate, torch.ones_like(candidate)], dim=-1)
+
+
+#The grid of query points in [0,1] on which the posterior is plotted and stored in the results store
+x_query = torch.linspace(0, 1, 1000, dtype=torch.double).unsqueeze(-1)
+
+#The posterior of the GP on x_query, in multi-fidelity mode at full fidelity. With further parameters, it is the
+#posterior along the force with the parameters of the best trial. It is only computed when it is used.
+def posterior_grid(gp):
+    if multi_fidelity:
+        return PosteriorGrid(gp, torch.cat([x_query, torch.ones_like(x_query)], dim=-1))
+    if dimension > 1:
+        best_parameters = initial_x[initial_y[:, 0].argmax(), 1:]
+        return PosteriorGrid(gp, torch.cat([x_query, best_parameters.expand(len(x_query), -1)], dim=-1))
+    return PosteriorGrid(gp, x_query)
+
+
+#In multi-fidelity mode, the stopping criteria and the result only take the simulations at full fidelity into account.
+def full_fidelity_trials(x, y):
+    if multi_fidelity:
+        full = x[:, 1] == 1
+        return x[full, :1], y[full]
+    return x, y
+
+
+#The GP is conditioned on query points that are not evaluated yet. As observations, the posterior mean is used (kriging
+#believer), so the acquisition function of the fantasy model prefers query points away from the pending ones.
+def fantasize_pending(gp, pending_x):
+    fantasy_y = gp.posterior(pending_x).mean.detach()
+    return gp.condition_on_observations(X=pending_x, Y=fantasy_y)
+
+
+#This chooses q query points that are simulated at the same time. Every query point is chosen with the acquisition
+#function of the GP that is conditioned on the previously chosen ones.
+def next_batch(gp, best_f, q):
+    candidates = next_candidate(gp, best_f)
+    while len(candidates) < q:
+        fantasy_gp = fantasize_pending(gp, candidates)
+        candidates = torch.cat([candidates, next_candidate(fantasy_gp, best_f)])
+    return candidates
+
+
+#This simulates a query point in [0,1]. In multi-fidelity mode, its second entry is the fidelity.
+def simulate_candidate(candidate):
+    if multi_fidelity:
+        return simulation(candidate[:1]*(upper_bound-lower_bound)+lower_bound, candidate[1].item())
+    return simulation(candidate[:1]*(upper_bound-lower_bound)+lower_bound, parameters=design.values(candidate))
+
+
+#The force of the query point for the output, together with the further parameters if there are any.
+def describe(candidate):
+    force = candidate[0].item()*(upper_bound-lower_bound)+lower_bound
+    if dimension == 1:
+        return force
+    return f"{force}, Parameters = {design.values(candidate)}"
+
+
+def write_trial(candidate, y):
+    force = candidate[0].item()*(upper_bound-lower_bound)+lower_bound
+    if multi_fidelity:
+        results_store.add_trial(run_id, force, y, fidelity=candidate[1].item())
+    else:
+        results_store.add_trial(run_id, force, y, parameters=design.values(candidate))
+
+
+#This simulates the query points in parallel and writes every result into the results store as soon as it is available.
+def evaluate(candidates):
+    new_y = torch.zeros(len(candidates), 1, dtype=torch.double)
+    for index, y in evaluate_in_parallel(simulate_candidate, candidates, num_workers):
+        new_y[index, 0] = y
+        write_trial(candidates[index], y)
+
+    return new_y
+
+
+#This writes the pairs (query point, result) of finished simulations into the results store and returns them as tensors.
+def collect_finished(results):
+    for candidate, y in results:
+        write_trial(candidate, y)
+    candidates = torch.stack([candidate for candidate, y in results])
+    new_y = torch.tensor([[y] for candidate, y in results], dtype=torch.double)
+    return candidates, new_y
+
+
+#This starts new simulations until every worker is busy. The simulations that are still running are treated as
+#fantasized observations, so the new query points are chosen away from them.
+def fill_workers(evaluator, gp, best_f):
+    while evaluator.has_free_worker():
+        pending_x = evaluator.pending_inputs()
+        if len(pending_x) > 0:
+            candidate = next_candidate(fantasize_pending(gp, torch.stack(pending_x)), best_f)
+        else:
+            candidate = next_candidate(gp, best_f)
+        evaluator.submit(candidate[0])
+
+
+#This stores everything that is needed to continue the run after the given iteration without simulating again. The
+#simulations that are still running in the asynchronous loop are not stored, they are started again after resuming.
+def save_checkpoint(iteration):
+    checkpoint.save(checkpoint_file, {
+        "iteration": iteration,
+        "run_id": run_id,
+        "upper_bound": upper_bound,
+        "initial_x": initial_x,
+        "initial_y": initial_y,
+        "initial_yvar": initial_yvar,
+        "initial_x_vals": initial_x_vals,
+        "initial_y_vals": initial_y_vals,
+        "gp": incremental_gp.state(),
+        "sobol": sobol,
+        "best_value": best_value,
+        "no_improvement_trials": no_improvement_trials,
+        "counter": counter,
+        "elapsed_time": time.time() - starting_time,
+    })
+
 
 os.chdir("build_release")
 
+checkpoint_file = "BayesOpt_checkpoint"+global_individuality_parameter+".pt"
+state = None
+if resume:
+    if os.path.exists(checkpoint_file):
+        state = checkpoint.load(checkpoint_file)
+        print("Resuming after iteration", state["iteration"], "with", state["counter"], "trials from", checkpoint_file)
+    else:
+        print("No checkpoint", checkpoint_file, "found, starting a new run.")
+
+#Results that were simulated with other settings or another binary can't be reused anymore.
+if use_cache:
+    simulation_cache.invalidate("muscle_contraction_with_prestretch", simulation_cache.settings_hash(contraction_files))
+    simulation_cache.invalidate("incompressible_mooney_rivlin_prestretch_only", simulation_cache.settings_hash(prestretch_files))
+    simulation_cache.invalidate("prestretch_state", simulation_cache.settings_hash(contraction_files))
+
+#The run is stored in build_release/BayesOpt_results.sqlite together with the hash of its settings, see results_store.py.
+#A resumed run keeps its run_id.
+if state is not None and "run_id" in state:
+    run_id = state["run_id"]
+else:
+    run_id = results_store.start_run(global_individuality_parameter, "BayesOpt", simulation_cache.settings_hash(contraction_files))
+
 #Finds the upper bound
-if specific_relative_upper_bound:
+if state is not None:
+    upper_bound = state["upper_bound"]
+elif specific_relative_upper_bound:
     upper_bound = find_specific_upper_bound()
 elif max_upper_bound:
     upper_bound = find_max_upper_bound()
 
 starting_time = time.time()
 
-#Chooses the initial query points for BO and evaluates them
-sobol = torch.quasirandom.SobolEngine(dimension=1, scramble=True)
-if sobol_on:
-    initial_x = sobol.draw(num_initial_trials, dtype=torch.double)
+if state is not None:
+    #The trials of the interrupted run are written into the results store again, in the order of the checkpoint
+    sobol = state["sobol"]
+    initial_x = state["initial_x"]
+    initial_y = state["initial_y"]
+    initial_yvar = state["initial_yvar"]
+    initial_x_vals = state["initial_x_vals"]
+    initial_y_vals = state["initial_y_vals"]
+    starting_time -= state["elapsed_time"]
+    results_store.clear_trials(run_id)
+    for k in range(len(initial_x)):
+        write_trial(initial_x[k], initial_y[k].item())
 else:
-    initial_x = torch.linspace(0, 1, num_initial_trials, dtype=torch.double).unsqueeze(1)
-    
-with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "w"):
-    pass
-
-initial_y = torch.tensor([])
-for force in initial_x:
-    y = torch.tensor([[simulation(force*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
-
-    with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([force.numpy()[0]*(upper_bound-lower_bound)+lower_bound, y.numpy()[0,0]])
+    #The trials of earlier runs with the same settings are used as initial training data. Only as many initial query
+    #points are simulated as are missing to num_initial_trials.
+    prior_x = torch.zeros(0, 2 if multi_fidelity else dimension, dtype=torch.double)
+    prior_y = torch.zeros(0, 1, dtype=torch.double)
+    if use_prior_data:
+        trials = prior_data.trials_from_results_store(simulation_cache.settings_hash(contraction_files))
+        if use_cache:
+            trials += prior_data.trials_from_cache("muscle_contraction_with_prestretch", simulation_cache.settings_hash(contraction_files),
+                                                   fidelities if multi_fidelity else [1.0])
+        forces, contractions, trial_fidelities = prior_data.combine(trials, lower_bound, upper_bound, cache_force_tolerance)
+        if not multi_fidelity:
+            forces, contractions = forces[trial_fidelities == 1], contractions[trial_fidelities == 1]
+        prior_x = torch.tensor((forces - lower_bound)/(upper_bound-lower_bound), dtype=torch.double).unsqueeze(-1)
+        if multi_fidelity:
+            prior_x = torch.cat([prior_x, torch.tensor(trial_fidelities, dtype=torch.double).unsqueeze(-1)], dim=-1)
+        prior_y = torch.tensor(contractions, dtype=torch.double).unsqueeze(-1)
+        print("Using", len(prior_x), "trials of earlier runs as initial training data")
+    num_new_initial_trials = max(0, num_initial_trials - len(prior_x))
+
+    #Chooses the initial query points for BO and evaluates them
+    sobol = torch.quasirandom.SobolEngine(dimension=dimension, scramble=True)
+    if num_new_initial_trials == 0:
+        initial_x = torch.zeros(0, dimension, dtype=torch.double)
+    elif sobol_on:
+        initial_x = sobol.draw(num_new_initial_trials, dtype=torch.double)
+    else:
+        #The forces are spread evenly, further parameters are in the middle of their bounds
+        initial_x = torch.full((num_new_initial_trials, dimension), 0.5, dtype=torch.double)
+        initial_x[:, 0] = torch.linspace(0, 1, num_new_initial_trials, dtype=torch.double)
 
-    initial_y = torch.cat([initial_y, y])
-initial_yvar = torch.full_like(initial_y, fixed_Yvar, dtype=torch.double)
+    #In multi-fidelity mode, the initial trials are simulated at the lowest fidelity, except for the last one.
+    if multi_fidelity:
+        initial_fidelities = torch.full_like(initial_x, min(fidelities))
+        initial_fidelities[-1:] = 1.0
+        initial_x = torch.cat([initial_x, initial_fidelities], dim=-1)
 
-initial_x_vals = initial_x.clone()
-initial_y_vals = initial_y.clone()
+    for k in range(len(prior_x)):
+        write_trial(prior_x[k], prior_y[k].item())
 
-#Initializes the GP and calculates its posterior distribution
-gp = CustomSingleTaskGP(initial_x, initial_y)
-mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-fit_gpytorch_mll(mll)
+    if num_new_initial_trials > 0:
+        initial_y = evaluate(initial_x)
+    else:
+        initial_y = torch.zeros(0, 1, dtype=torch.double)
+    initial_x = torch.cat([prior_x, initial_x])
+    initial_y = torch.cat([prior_y, initial_y])
+    initial_yvar = torch.full_like(initial_y, fixed_Yvar, dtype=torch.double)
+
+    initial_x_vals = initial_x.clone()
+    initial_y_vals = initial_y.clone()
+
+#Initializes the GP and calculates its posterior distribution. When resuming, the stored hyperparameters are used.
+gp_state = state["gp"] if state is not None else None
+if multi_fidelity:
+    incremental_gp = IncrementalGP(MultiFidelityGP, initial_x, initial_y, refit_interval, mll_tolerance, gp_state,
+                                   min_refit_trials=min_refit_trials)
+else:
+    incremental_gp = IncrementalGP(CustomSingleTaskGP, initial_x, initial_y, refit_interval, mll_tolerance, gp_state,
+                                   min_refit_trials=min_refit_trials)
+gp = incremental_gp.gp
 
 
 #This starts the optimization loop. It is being carried out 100 times, unless the stopping criterion is being triggered.
 num_iterations = 100
 best_value = -float('inf')
 no_improvement_trials = 0
-counter = num_initial_trials
-
-for i in range(num_iterations):
-    if EI:
-        acq_fct = ExpectedImprovement(model=gp, best_f=initial_y.max())
-    elif PI:
-        acq_fct = ProbabilityOfImprovement(model=gp, best_f=initial_y.max())
-    elif KG:
-        pass
-    elif ES:
-        bounds=torch.tensor([[0], [1]], dtype=torch.double)
-        candidate_set = torch.rand(1000, bounds.size(1))
-        candidate_set = bounds[0] + (bounds[1] - bounds[0]) * candidate_set
-        acq_fct = qMaxValueEntropy(model=gp, candidate_set=candidate_set)
-    else:
-        print("Wrong input, used Expected Improvement instead.")
-        acq_fct = ExpectedImprovement(model=gp, best_f=initial_y.max())
-
-    if KG:
-        SMOKE_TEST = os.environ.get("SMOKE_TEST")
-        NUM_FANTASIES = 128 if not SMOKE_TEST else 4
-        NUM_RESTARTS = 10 if not SMOKE_TEST else 2
-        RAW_SAMPLES = 128
-        bounds = torch.stack([torch.zeros(1, dtype=torch.double), torch.ones(1, dtype=torch.double)])
-        acq_fct = qKnowledgeGradient(model=gp, num_fantasies=NUM_FANTASIES)
-        candidates, acq_value = optimize_acqf(
-            acq_function=acq_fct,
-            bounds=bounds,
-            q=1,
-            num_restarts=NUM_RESTARTS,
-            raw_samples=RAW_SAMPLES,
-        )
-
-        argmax_pmean, max_pmean = optimize_acqf(
-            acq_function=PosteriorMean(gp),
-            bounds=bounds,
-            q=1,
-            num_restarts=NUM_RESTARTS,
-            raw_samples=RAW_SAMPLES,
-        )
-        qKG_proper = qKnowledgeGradient(
-            gp,
-            num_fantasies=NUM_FANTASIES,
-            sampler=acq_fct.sampler,
-            current_value=max_pmean,
-        )
-
-        candidate, acq_value_proper = optimize_acqf(
-            acq_function=qKG_proper,
-            bounds=bounds,
-            q=1,
-            num_restarts=NUM_RESTARTS,
-            raw_samples=RAW_SAMPLES,
-        )
+counter = len(initial_x)
+start_iteration = 0
+if state is not None:
+    best_value = state["best_value"]
+    no_improvement_trials = state["no_improvement_trials"]
+    counter = state["counter"]
+    start_iteration = state["iteration"]
+else:
+    save_checkpoint(0)
+
+if asynchronous:
+    evaluator = AsynchronousEvaluator(simulate_candidate, num_workers)
+    fill_workers(evaluator, gp, initial_y.max())
+
+for i in range(start_iteration, num_iterations):
+    if asynchronous:
+        candidate, new_y = collect_finished(evaluator.wait_for_results())
+    elif multi_fidelity:
+        candidate = next_multi_fidelity_candidate(gp)
+        new_y = evaluate(candidate)
     else:
-        candidate, acq_value = optimize_acqf(
-            acq_function=acq_fct,
-            bounds=torch.tensor([[0], [1]], dtype=torch.double),
-            q=1,
-            num_restarts=20,
-            raw_samples=256,
-        )
-
-    new_y = torch.tensor([[simulation(candidate[0]*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
+        candidate = next_batch(gp, initial_y.max(), batch_size)
+        new_y = evaluate(candidate)
     new_yvar = torch.full_like(new_y, fixed_Yvar, dtype=torch.double)
 
-    with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([candidate.numpy()[0,0]*(upper_bound-lower_bound)+lower_bound, new_y.numpy()[0,0]])
-
     initial_x = torch.cat([initial_x, candidate])
     initial_y = torch.cat([initial_y, new_y])
     initial_yvar = torch.cat([initial_yvar, new_yvar])
-    gp = CustomSingleTaskGP(initial_x, initial_y)
-    mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-    fit_gpytorch_mll(mll)
-
-    x_query = torch.linspace(0, 1, 1000).unsqueeze(-1)
-    posterior = gp.posterior(x_query)
+    gp = incremental_gp.update(initial_x, initial_y, candidate, new_y)
 
-    mean = posterior.mean.squeeze(-1).detach().numpy()
-    variance = posterior.variance.squeeze(-1)
-    stddev = torch.sqrt(variance).detach().numpy()
+    grid = posterior_grid(gp)
 
     if visualize:
-        plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
-        plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
+        mean, stddev = grid.mean, grid.stddev
+        plt.scatter(initial_x[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
+        plt.plot(initial_x[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
         plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
-        plt.scatter(candidate.numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
+        plt.scatter(candidate[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
         plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
-        plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
+        plt.scatter(initial_x_vals[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
         plt.xlabel("prestretch force")
         plt.ylabel("contraction of muscle")
         plt.title("Optimization Process")
@@ -460,66 +864,95 @@ for i in range(num_iterations):
         plt.legend()
         plt.show()
 
-    counter += 1
-
-    if stopping_y:
-        current_value = new_y.item()
-        if current_value > best_value + improvement_threshold:
-            best_value = current_value
-            no_improvement_trials = 0
-        elif len(initial_x) > num_initial_trials:
-            no_improvement_trials += 1
-        if no_improvement_trials >= num_consecutive_trials:
-            print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()*(upper_bound-lower_bound)+lower_bound}, Value = {current_value}, Best Value = {best_value}")
-            print("Stopping criterion met. No significant improvement for consecutive trials.")
-            print("Number of total trials: ", i+1+num_initial_trials)
-            break
-    elif stopping_xy:
-        max_index = torch.argmax(initial_y)
-        for k in range(len(initial_x)):
-            number_x_in_epsilon_neighborhood = 0
-            breaking = False
-            max_y_in_range = False
-            for j in range(len(initial_x)):
-                if np.abs(initial_x[k,0].numpy() - initial_x[j,0].numpy()) < x_range:
-                    number_x_in_epsilon_neighborhood += 1
-                    if initial_x[max_index,0].numpy() == initial_x[k,0].numpy() or initial_x[max_index,0].numpy() == initial_x[j,0].numpy():
-                        max_y_in_range = True
-            if number_x_in_epsilon_neighborhood >= num_consecutive_trials and max_y_in_range:
+    breaking = False
+    for k in range(len(candidate)):
+        counter += 1
+        current_value = new_y[k].item()
+
+        if multi_fidelity and candidate[k, 1].item() < 1:
+            print(f"Trial {counter}: x = {describe(candidate[k])}, Fidelity = {candidate[k, 1].item()}, Value = {current_value}")
+            continue
+
+        if stopping_y:
+            if current_value > best_value + improvement_threshold:
+                best_value = current_value
+                no_improvement_trials = 0
+            elif counter > num_initial_trials:
+                no_improvement_trials += 1
+            if no_improvement_trials >= num_consecutive_trials:
+                print(f"Trial {counter}: x = {describe(candidate[k])}, Value = {current_value}, Best Value = {best_value}")
                 print("Stopping criterion met. No significant improvement for consecutive trials.")
-                print("Number of total trials: ", i+1+num_initial_trials)
+                print("Number of total trials: ", counter)
                 breaking = True
                 break
-        if breaking:
-            break
-    else:
-        print("Wrong input, used stopping_y instead.")
-        stopping_y = True
+        elif not stopping_xy:
+            print("Wrong input, used stopping_y instead.")
+            stopping_y = True
 
-    current_value = new_y.item()
-    if current_value > best_value + improvement_threshold:
-        best_value = current_value
+        if current_value > best_value + improvement_threshold:
+            best_value = current_value
 
-    print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()*(upper_bound-lower_bound)+lower_bound}, Value = {current_value}, Best Value = {best_value}")
+        print(f"Trial {counter}: x = {describe(candidate[k])}, Value = {current_value}, Best Value = {best_value}")
+    if breaking:
+        break
 
-    
-x_query = torch.linspace(0, 1, 1000).unsqueeze(-1)
-posterior = gp.posterior(x_query)
+    if stopping_xy:
+        trials_x, trials_y = full_fidelity_trials(initial_x, initial_y)
+        if len(trials_x) > 0 and stopping_criteria.stopping_xy_met(trials_x, trials_y, x_range, num_consecutive_trials):
+            print("Stopping criterion met. No significant improvement for consecutive trials.")
+            print("Number of total trials: ", counter)
+            break
 
-mean = posterior.mean.squeeze(-1).detach().numpy()
-variance = posterior.variance.squeeze(-1)
-stddev = torch.sqrt(variance).detach().numpy()
+    if ((stopping_regret and stopping_criteria.regret_bound_met(torch.from_numpy(grid.mean), torch.from_numpy(grid.stddev), regret_threshold, regret_beta))
+            or (stopping_variance and stopping_criteria.posterior_variance_met(torch.from_numpy(grid.stddev), variance_threshold))):
+        print("Stopping criterion met. The posterior is certain enough about the maximum.")
+        print("Number of total trials: ", counter)
+        break
+
+    if (i+1) % checkpoint_interval == 0:
+        save_checkpoint(i+1)
+
+    if asynchronous:
+        fill_workers(evaluator, gp, initial_y.max())
+
+#The simulations that are still running when the loop stops are finished and used as well.
+if asynchronous:
+    results = evaluator.finish()
+    if len(results) > 0:
+        candidate, new_y = collect_finished(results)
+        for k in range(len(candidate)):
+            counter += 1
+            print(f"Trial {counter}: x = {describe(candidate[k])}, Value = {new_y[k].item()}")
+        initial_x = torch.cat([initial_x, candidate])
+        initial_y = torch.cat([initial_y, new_y])
+        initial_yvar = torch.cat([initial_yvar, torch.full_like(new_y, fixed_Yvar, dtype=torch.double)])
+        gp = incremental_gp.update(initial_x, initial_y, candidate, new_y)
+
+#In multi-fidelity mode, the maximizer of the posterior mean at full fidelity is confirmed with the full model.
+if multi_fidelity:
+    candidate = recommended_candidate(gp)
+    new_y = evaluate(candidate)
+    counter += 1
+    print(f"Trial {counter}: x = {candidate[0, 0].item()*(upper_bound-lower_bound)+lower_bound}, Value = {new_y[0].item()}")
+    initial_x = torch.cat([initial_x, candidate])
+    initial_y = torch.cat([initial_y, new_y])
+    initial_yvar = torch.cat([initial_yvar, torch.full_like(new_y, fixed_Yvar, dtype=torch.double)])
+    gp = incremental_gp.update(initial_x, initial_y, candidate, new_y)
+
+grid = posterior_grid(gp)
 
 if visualize:
-    max_index = torch.argmax(initial_y)
-    max_x = initial_x[max_index]
-    max_y = initial_y[max_index]
-    plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
-    plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
+    mean, stddev = grid.mean, grid.stddev
+    trials_x, trials_y = full_fidelity_trials(initial_x, initial_y)
+    max_index = torch.argmax(trials_y)
+    max_x = trials_x[max_index]
+    max_y = trials_y[max_index]
+    plt.scatter(initial_x[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
+    plt.plot(initial_x[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
     plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
     plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
-    plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
-    plt.scatter(max_x.numpy()*(upper_bound-lower_bound)+lower_bound, max_y.numpy(), color="green", label="Maximum", zorder=3)
+    plt.scatter(initial_x_vals[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
+    plt.scatter(max_x[:1].numpy()*(upper_bound-lower_bound)+lower_bound, max_y.numpy(), color="green", label="Maximum", zorder=3)
     plt.xlabel("prestretch force")
     plt.ylabel("contraction of muscle")
     plt.title("Optimization Results")
@@ -536,39 +969,36 @@ else:
 while continuing == "y":
     candidate = input("Which point do you want to add?")
     candidate = torch.tensor([[float(candidate)]], dtype=torch.double)
+    if multi_fidelity:
+        candidate = torch.cat([candidate, torch.ones_like(candidate)], dim=-1)
+    elif dimension > 1:
+        #Further parameters are taken from the best trial
+        candidate = torch.cat([candidate, initial_x[initial_y[:, 0].argmax(), 1:].unsqueeze(0)], dim=-1)
 
-    new_y = torch.tensor([[simulation(candidate[0]*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
+    new_y = torch.tensor([[simulate_candidate(candidate[0])]], dtype=torch.double)
     new_yvar = torch.full_like(new_y, fixed_Yvar, dtype=torch.double)
 
-    with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([candidate.numpy()[0,0]*(upper_bound-lower_bound)+lower_bound, new_y.numpy()[0,0]])
+    write_trial(candidate[0], new_y.item())
 
     initial_x = torch.cat([initial_x, candidate])
     initial_y = torch.cat([initial_y, new_y])
     initial_yvar = torch.cat([initial_yvar, new_yvar])
-    gp = CustomSingleTaskGP(initial_x, initial_y)
-    mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-    fit_gpytorch_mll(mll)
+    gp = incremental_gp.update(initial_x, initial_y, candidate, new_y)
 
     counter += 1
 
-    print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()}, Value = {current_value}, Best Value = {best_value}")
-
-    x_query = torch.linspace(0, 1, 1000).unsqueeze(-1)
-    posterior = gp.posterior(x_query)
+    print(f"Trial {counter}: x = {candidate[0, 0].item()*(upper_bound-lower_bound)+lower_bound}, Value = {new_y.item()}")
 
-    mean = posterior.mean.squeeze(-1).detach().numpy()
-    variance = posterior.variance.squeeze(-1)
-    stddev = torch.sqrt(variance).detach().numpy()
+    grid = posterior_grid(gp)
 
     if visualize:
-        plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
-        plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
+        mean, stddev = grid.mean, grid.stddev
+        plt.scatter(initial_x[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
+        plt.plot(initial_x[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
         plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
-        plt.scatter(candidate.numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
+        plt.scatter(candidate[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
         plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
-        plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
+        plt.scatter(initial_x_vals[:, :1].numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
         plt.xlabel("prestretch force")
         plt.ylabel("contraction of muscle")
         plt.title("Optimization Process")
@@ -578,21 +1008,16 @@ while continuing == "y":
 
     continuing = input("Do you want to add another query point? (y/n)")
 
-max_index = torch.argmax(initial_y)
-maximizer = initial_x[max_index]
-best_y = initial_y[max_index]
+trials_x, trials_y = full_fidelity_trials(initial_x, initial_y)
+max_index = torch.argmax(trials_y)
+maximizer = trials_x[max_index]
+best_y = trials_y[max_index]
 
-with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(np.linspace(lower_bound, upper_bound, 1000))
-    writer.writerow(mean)
-    writer.writerow(stddev)
-    writer.writerow([counter])
-    writer.writerow([maximizer.numpy()[0]*(upper_bound-lower_bound)+lower_bound, best_y.numpy()[0]])
-    writer.writerow([time.time()-starting_time])
+results_store.finish_run(run_id, counter, maximizer[0].item()*(upper_bound-lower_bound)+lower_bound, best_y.item(),
+                         time.time()-starting_time, np.linspace(lower_bound, upper_bound, 1000), grid.mean, grid.stddev,
+                         design.values(maximizer))
 
-print(global_individuality_parameter)
+#The run is complete, so there is nothing to resume anymore
+checkpoint.remove(checkpoint_file)
 
-with open("BayesOpt_global_individuality_parameters.csv", "a") as f:
-    writer = csv.writer(f)
-    writer.writerow([global_individuality_parameter])
+print(global_individuality_parameter, "run", run_id)
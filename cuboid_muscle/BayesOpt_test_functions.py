@@ -1,33 +1,30 @@
-import subprocess
 import sys
 import os
-import shlex
-import csv
 import torch
 import numpy as np
-import matplotlib.pyplot as plt
 from botorch.models import SingleTaskGP
 from gpytorch.likelihoods import GaussianLikelihood
 from gpytorch.kernels import MaternKernel, ScaleKernel, RBFKernel
 from gpytorch.means import ConstantMean, ZeroMean
-from gpytorch.mlls import ExactMarginalLogLikelihood
-from botorch.fit import fit_gpytorch_mll
-from botorch.acquisition import ExpectedImprovement, ProbabilityOfImprovement, PosteriorMean
-from botorch.acquisition.knowledge_gradient import qKnowledgeGradient
-from botorch.acquisition.max_value_entropy_search import qMaxValueEntropy
+from botorch.acquisition import ExpectedImprovement, ProbabilityOfImprovement
 from botorch.optim import optimize_acqf
 from botorch.models.transforms.input import Normalize
 from botorch.models.transforms.outcome import Standardize
 import time
-import signal
+from collections import namedtuple
+from gp_update import IncrementalGP
+from optimize_1d import optimize_acqf_1d
+import stopping_criteria
+from posterior_grid import PosteriorGrid
+import results_store
 
 
 """
 This is a file to carry out Bayesian Optimization for the test functions.
 If you want to call this file, you have two options:
->python BayesOpt.py
+>python BayesOpt_test_functions.py
 or
->python BayesOpt.py matern 1.5 const fixed_noise ei stopping_xy 1
+>python BayesOpt_test_functions.py matern 1.5 const fixed_noise ei stopping_xy 1
 You can change these inputs to any ones of it kind, see options below. A chosen option becomes True, every other option
 of this kind becomes False. You can leave any option out, then the current setup in here is being chosen. The order
 also doesn't matter.
@@ -37,6 +34,13 @@ For the mean: "const" "zero"
 For the noise: "fixed_noise" "variable_noise"
 For the acquisition function: "ei" "es" "kg" "pi"
 For the stopping criterion: "stopping_xy" "stopping_y"
+Additional stopping criteria, the loop stops as soon as one of the chosen criteria is met (see stopping_criteria.py):
+"stopping_regret" "stopping_acq" "stopping_variance"
+The optimization can also be imported and called in-process, e.g. by the evaluation scripts:
+>import BayesOpt_test_functions
+>BayesOpt_test_functions.set_options(["matern", "1.5", "ei", "stopping_xy"])
+>result = BayesOpt_test_functions.bayes_opt(function_number=1, write_files=False)
+matplotlib and the modules of KG and ES are only imported when they are used, see benchmark_startup.py.
 """
 
 ########################################################################################################################
@@ -63,6 +67,13 @@ improvement_threshold = 1e-4
 stopping_xy = False
 x_range = 5e-2
 num_consecutive_trials = 3
+stopping_regret = False
+regret_threshold = 1e-3
+regret_beta = 2.0
+stopping_acq = False
+acq_threshold = 1e-6
+stopping_variance = False
+variance_threshold = 1e-6
 
 test_function_number = 0
 
@@ -73,121 +84,153 @@ sobol_on = True
 num_initial_trials = 2 #this needs to be >=2
 visualize = True
 add_points = False
+refit_interval = 3 #the hyperparameters of the GP are fitted every refit_interval iterations, in between the GP is only updated (see gp_update.py)
+min_refit_trials = 6 #as long as there are fewer trials, the hyperparameters are fitted after every iteration
+mll_tolerance = 2.0 #the hyperparameters are also fitted if the log predictive density of a new observation is more than this below the marginal log likelihood per observation
+kg_time_budget = 10 #seconds that KG may take per query point, the number of fantasies is scaled to it
+optimizer_1d = True #maximize the acquisition function on a grid refined by golden section searches (optimize_1d.py) instead of with multi-start L-BFGS
 upper_bound = 1
 specific_relative_upper_bound = False
 max_upper_bound = False
 ########################################################################################################################
 
 #This interprets the custom inputs for the BO model
-inputs = [item.lower() for item in sys.argv]
-if len(inputs) > 0:
-    if "matern" in inputs:
-        matern = True
-        if "0.5" in inputs:
-            nu = 0.5
-        elif "1.5" in inputs:
-            nu = 1.5
-        elif "2.5" in inputs:
-            nu = 2.5
-    elif "rbf" in inputs:
-        matern = False
-        rbf = True
-    if "const" in inputs:
-        const = True
-    elif "zero" in inputs:
-        const = False
-        zero = True
-    if "fixed_noise" in inputs:
-        fixed_noise = True
-    elif "variable_noise" in inputs:
-        fixed_noise = False
-        variable_noise = True
-    if "ei" in inputs:
-        EI = True
-    elif "pi" in inputs:
-        EI = False
-        PI = True
-    elif "kg" in inputs:
-        EI = False
-        PI = False
-        KG = True
-    elif "es" in inputs:
-        EI = False
-        PI = False
-        KG = False
-        ES = True
-    if "stopping_y" in inputs:
-        stopping_y = True
-    elif "stopping_xy" in inputs:
-        stopping_y = False
-        stopping_xy = True
-    if "1" in inputs:
-        test_function_number = 1
-    elif "2" in inputs:
-        test_function_number = 2
-    elif "3" in inputs:
-        test_function_number = 3
-    elif "4" in inputs:
-        test_function_number = 4
-    elif "5" in inputs:
-        test_function_number = 5
-    elif "6" in inputs:
-        test_function_number = 6
-    elif "7" in inputs:
-        test_function_number = 7
-    elif "8" in inputs:
-        test_function_number = 8
-    elif "9" in inputs:
-        test_function_number = 9
-
+def set_options(inputs):
+    global nu, matern, rbf, const, zero, fixed_noise, variable_noise, EI, PI, KG, ES, stopping_y, stopping_xy, test_function_number
+    global stopping_regret, stopping_acq, stopping_variance
+    inputs = [item.lower() for item in inputs]
+    if len(inputs) > 0:
+        if "matern" in inputs:
+            matern = True
+            if "0.5" in inputs:
+                nu = 0.5
+            elif "1.5" in inputs:
+                nu = 1.5
+            elif "2.5" in inputs:
+                nu = 2.5
+        elif "rbf" in inputs:
+            matern = False
+            rbf = True
+        if "const" in inputs:
+            const = True
+        elif "zero" in inputs:
+            const = False
+            zero = True
+        if "fixed_noise" in inputs:
+            fixed_noise = True
+        elif "variable_noise" in inputs:
+            fixed_noise = False
+            variable_noise = True
+        if "ei" in inputs:
+            EI = True
+        elif "pi" in inputs:
+            EI = False
+            PI = True
+        elif "kg" in inputs:
+            EI = False
+            PI = False
+            KG = True
+        elif "es" in inputs:
+            EI = False
+            PI = False
+            KG = False
+            ES = True
+        if "stopping_y" in inputs:
+            stopping_y = True
+        elif "stopping_xy" in inputs:
+            stopping_y = False
+            stopping_xy = True
+        if "stopping_regret" in inputs:
+            stopping_regret = True
+        if "stopping_acq" in inputs:
+            stopping_acq = True
+        if "stopping_variance" in inputs:
+            stopping_variance = True
+        if "1" in inputs:
+            test_function_number = 1
+        elif "2" in inputs:
+            test_function_number = 2
+        elif "3" in inputs:
+            test_function_number = 3
+        elif "4" in inputs:
+            test_function_number = 4
+        elif "5" in inputs:
+            test_function_number = 5
+        elif "6" in inputs:
+            test_function_number = 6
+        elif "7" in inputs:
+            test_function_number = 7
+        elif "8" in inputs:
+            test_function_number = 8
+        elif "9" in inputs:
+            test_function_number = 9
 
 
 #We need to write the generated data into files. To see the difference between the resulting files, we add a individuality 
 #parameter in the filename, which we create here. 
-global_individuality_parameter = ""
-title = ""
-if matern:
-    global_individuality_parameter = global_individuality_parameter + "_matern_" + str(nu)
-    title = title + "Matern Kernel with nu=" + str(nu) + ", "
-elif rbf:
-    global_individuality_parameter = global_individuality_parameter + "_rbf"
-    title = title + "RBF Kernel, "
-if const:
-    global_individuality_parameter = global_individuality_parameter + "_const"
-    title = title + "Constant Mean, "
-elif zero:
-    global_individuality_parameter = global_individuality_parameter + "_zero"
-    title = title + "Zero Mean, "
-if fixed_noise:
-    global_individuality_parameter = global_individuality_parameter + "_fixed_noise"
-    title = title + "Fixed Noise, "
-elif variable_noise:
-    global_individuality_parameter = global_individuality_parameter + "_variable_noise"
-    title = title + "Variable Noise, "
-if EI:
-    global_individuality_parameter = global_individuality_parameter + "_EI"
-    title = title + "Expected Improvement, "
-elif PI:
-    global_individuality_parameter = global_individuality_parameter + "_PI"
-    title = title + "Probability of Improvement, "
-elif KG:
-    global_individuality_parameter = global_individuality_parameter + "_KG"
-    title = title + "Knoledge Gradient, "
-elif ES:
-    global_individuality_parameter = global_individuality_parameter + "_ES"
-    title = title + "Entropy Search, "
-if stopping_y:
-    global_individuality_parameter = global_individuality_parameter + "_stopping_y"
-    title = title + "Y-Stopping"
-elif stopping_xy:
-    global_individuality_parameter = global_individuality_parameter + "_stopping_xy"
-    title = title + "XY-Stopping"
-global_individuality_parameter = global_individuality_parameter + f"_{test_function_number}"
+def individuality_parameter_and_title():
+    global_individuality_parameter = ""
+    title = ""
+    if matern:
+        global_individuality_parameter = global_individuality_parameter + "_matern_" + str(nu)
+        title = title + "Matern Kernel with nu=" + str(nu) + ", "
+    elif rbf:
+        global_individuality_parameter = global_individuality_parameter + "_rbf"
+        title = title + "RBF Kernel, "
+    if const:
+        global_individuality_parameter = global_individuality_parameter + "_const"
+        title = title + "Constant Mean, "
+    elif zero:
+        global_individuality_parameter = global_individuality_parameter + "_zero"
+        title = title + "Zero Mean, "
+    if fixed_noise:
+        global_individuality_parameter = global_individuality_parameter + "_fixed_noise"
+        title = title + "Fixed Noise, "
+    elif variable_noise:
+        global_individuality_parameter = global_individuality_parameter + "_variable_noise"
+        title = title + "Variable Noise, "
+    if EI:
+        global_individuality_parameter = global_individuality_parameter + "_EI"
+        title = title + "Expected Improvement, "
+    elif PI:
+        global_individuality_parameter = global_individuality_parameter + "_PI"
+        title = title + "Probability of Improvement, "
+    elif KG:
+        global_individuality_parameter = global_individuality_parameter + "_KG"
+        title = title + "Knoledge Gradient, "
+    elif ES:
+        global_individuality_parameter = global_individuality_parameter + "_ES"
+        title = title + "Entropy Search, "
+    if stopping_y:
+        global_individuality_parameter = global_individuality_parameter + "_stopping_y"
+        title = title + "Y-Stopping"
+    elif stopping_xy:
+        global_individuality_parameter = global_individuality_parameter + "_stopping_xy"
+        title = title + "XY-Stopping"
+    if stopping_regret:
+        global_individuality_parameter = global_individuality_parameter + "_regret"
+        title = title + ", Regret-Stopping"
+    if stopping_acq:
+        global_individuality_parameter = global_individuality_parameter + "_acq"
+        title = title + ", Acquisition-Stopping"
+    if stopping_variance:
+        global_individuality_parameter = global_individuality_parameter + "_variance"
+        title = title + ", Variance-Stopping"
+    global_individuality_parameter = global_individuality_parameter + f"_{test_function_number}"
+    return global_individuality_parameter, title
+
+
+#The grid of query points in [0,1] on which the posterior is plotted and stored in the results store
+x_query = torch.linspace(0, 1, 1000, dtype=torch.double).unsqueeze(-1)
 
 
 #This is the method that evaluates the test functions.
 def test_function(x):
-    x = x.numpy()[0]
+    return test_function_values(x.numpy()[0])
+
+
+#This evaluates the test function elementwise, x can be a number or a numpy array.
+def test_function_values(x):
     if test_function_number == 1:
         return -3*x*(x-1.3) + 0.3
     elif test_function_number == 2:
@@ -248,276 +291,243 @@ class CustomSingleTaskGP(SingleTaskGP):
                         )
 
 
-os.chdir("build_release")
+#This is what a BO run returns. trials_x, x and maximizer are given in [lower_bound, upper_bound].
+BayesOptResult = namedtuple("BayesOptResult", ["individuality_parameter", "trials_x", "trials_y", "x", "mean", "stddev",
+                                               "number_of_trials", "maximizer", "best_y", "time"])
 
-starting_time = time.time()
 
-#Chooses the initial query points for BO and evaluates them
-sobol = torch.quasirandom.SobolEngine(dimension=1, scramble=True)
-if sobol_on:
-    initial_x = sobol.draw(num_initial_trials, dtype=torch.double)
-else:
-    initial_x = torch.linspace(0, 1, num_initial_trials, dtype=torch.double).unsqueeze(1)
-    
-with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "w"):
-    pass
+#This carries out BO for the test function with the options set by set_options and returns a BayesOptResult. If
+#write_files is True, the trials and results are also stored in the results store as a run of its own (see
+#results_store.py).
+def bayes_opt(function_number=None, seed=None, write_files=True):
+    global test_function_number, stopping_y
+    if function_number is not None:
+        test_function_number = function_number
+    if seed is not None:
+        torch.manual_seed(seed)
+    global_individuality_parameter, title = individuality_parameter_and_title()
+    if visualize:
+        import matplotlib.pyplot as plt
 
-initial_y = torch.tensor([])
-for force in initial_x:
-    y = torch.tensor([[test_function(force*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
+    starting_time = time.time()
 
-    with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([force.numpy()[0]*(upper_bound-lower_bound)+lower_bound, y.numpy()[0,0]])
+    #Chooses the initial query points for BO and evaluates them
+    sobol = torch.quasirandom.SobolEngine(dimension=1, scramble=True)
+    if sobol_on:
+        initial_x = sobol.draw(num_initial_trials, dtype=torch.double)
+    else:
+        initial_x = torch.linspace(0, 1, num_initial_trials, dtype=torch.double).unsqueeze(1)
 
-    initial_y = torch.cat([initial_y, y])
-initial_yvar = torch.full_like(initial_y, fixed_Yvar, dtype=torch.double)
+    initial_y = torch.tensor([])
+    for force in initial_x:
+        y = torch.tensor([[test_function(force*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
+        initial_y = torch.cat([initial_y, y])
+    initial_yvar = torch.full_like(initial_y, fixed_Yvar, dtype=torch.double)
 
 
-initial_x_vals = initial_x.clone()
-initial_y_vals = initial_y.clone()
+    initial_x_vals = initial_x.clone()
+    initial_y_vals = initial_y.clone()
 
-#Initializes the GP and calculates its posterior distribution
-gp = CustomSingleTaskGP(initial_x, initial_y)
-mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-fit_gpytorch_mll(mll)
+    #Initializes the GP and calculates its posterior distribution
+    incremental_gp = IncrementalGP(CustomSingleTaskGP, initial_x, initial_y, refit_interval, mll_tolerance,
+                                  min_refit_trials=min_refit_trials)
+    gp = incremental_gp.gp
 
+    #ES keeps its candidate set and the max-value samples for the whole run, see es_engine.py. KG keeps the maximizer of
+    #the posterior mean and the time per fantasy, see kg_engine.py.
+    if ES:
+        from es_engine import EntropySearch
+        entropy_search = EntropySearch()
+    elif KG:
+        from kg_engine import KnowledgeGradient
+        SMOKE_TEST = os.environ.get("SMOKE_TEST")
+        if SMOKE_TEST:
+            knowledge_gradient = KnowledgeGradient(kg_time_budget, min_fantasies=2, max_fantasies=4, num_restarts=2,
+                                                   one_dimensional=optimizer_1d)
+        else:
+            knowledge_gradient = KnowledgeGradient(kg_time_budget, one_dimensional=optimizer_1d)
+
+    #This starts the optimization loop. It is being carried out 100 times, unless the stopping criterion is being triggered.
+    num_iterations = 100
+    best_value = -float('inf')
+    no_improvement_trials = 0
+    counter = num_initial_trials
+
+    for i in range(num_iterations):
+        if EI:
+            acq_fct = ExpectedImprovement(model=gp, best_f=initial_y.max())
+        elif PI:
+            acq_fct = ProbabilityOfImprovement(model=gp, best_f=initial_y.max())
+        elif KG:
+            pass
+        elif ES:
+            acq_fct = entropy_search.acquisition_function(gp)
+        else:
+            print("Wrong input, used Expected Improvement instead.")
+            acq_fct = ExpectedImprovement(model=gp, best_f=initial_y.max())
 
-#This starts the optimization loop. It is being carried out 100 times, unless the stopping criterion is being triggered.
-num_iterations = 100
-best_value = -float('inf')
-no_improvement_trials = 0
-counter = num_initial_trials
+        if KG:
+            candidate, acq_value = knowledge_gradient.next_candidate(gp)
+        elif optimizer_1d:
+            candidate, acq_value = optimize_acqf_1d(acq_fct)
+        else:
+            candidate, acq_value = optimize_acqf(
+                acq_function=acq_fct,
+                bounds=torch.tensor([[0], [1]], dtype=torch.double),
+                q=1,
+                num_restarts=20,
+                raw_samples=256,
+            )
+
+        new_y = torch.tensor([[test_function(candidate[0]*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
+        new_yvar = torch.full_like(new_y, fixed_Yvar, dtype=torch.double)
+
+        initial_x = torch.cat([initial_x, candidate])
+        initial_y = torch.cat([initial_y, new_y])
+        initial_yvar = torch.cat([initial_yvar, new_yvar])
+        gp = incremental_gp.update(initial_x, initial_y, candidate, new_y)
+
+        grid = PosteriorGrid(gp, x_query)
+
+        if visualize:
+            mean, stddev = grid.mean, grid.stddev
+            plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
+            plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
+            plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
+            plt.scatter(candidate.numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
+            plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
+            plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
+            plt.xlabel("x")
+            plt.ylabel("y")
+            plt.title("Optimization Process")
+            plt.gcf().suptitle(title, fontsize=12)
+            plt.legend()
+            plt.show()
+
+        counter += 1
+
+        if stopping_y:
+            current_value = new_y.item()
+            if current_value > best_value + improvement_threshold:
+                best_value = current_value
+                no_improvement_trials = 0
+            elif len(initial_x) > num_initial_trials:
+                no_improvement_trials += 1
+            if no_improvement_trials >= num_consecutive_trials:
+                print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()*(upper_bound-lower_bound)+lower_bound}, Value = {current_value}, Best Value = {best_value}")
+                print("Stopping criterion met. No significant improvement for consecutive trials.")
+                print("Number of total trials: ", i+1+num_initial_trials)
+                break
+        elif stopping_xy:
+            if stopping_criteria.stopping_xy_met(initial_x, initial_y, x_range, num_consecutive_trials):
+                print("Stopping criterion met. No significant improvement for consecutive trials.")
+                print("Number of total trials: ", i+1+num_initial_trials)
+                break
+        else:
+            print("Wrong input, used stopping_y instead.")
+            stopping_y = True
 
-for i in range(num_iterations):
-    if EI:
-        acq_fct = ExpectedImprovement(model=gp, best_f=initial_y.max())
-    elif PI:
-        acq_fct = ProbabilityOfImprovement(model=gp, best_f=initial_y.max())
-    elif KG:
-        pass
-    elif ES:
-        bounds=torch.tensor([[0], [1]], dtype=torch.double)
-        candidate_set = torch.rand(1000, bounds.size(1))
-        candidate_set = bounds[0] + (bounds[1] - bounds[0]) * candidate_set
-        acq_fct = qMaxValueEntropy(model=gp, candidate_set=candidate_set)
-    else:
-        print("Wrong input, used Expected Improvement instead.")
-        acq_fct = ExpectedImprovement(model=gp, best_f=initial_y.max())
+        if ((stopping_regret and stopping_criteria.regret_bound_met(torch.from_numpy(grid.mean), torch.from_numpy(grid.stddev), regret_threshold, regret_beta))
+                or (stopping_acq and stopping_criteria.acquisition_value_met(acq_value, acq_threshold))
+                or (stopping_variance and stopping_criteria.posterior_variance_met(torch.from_numpy(grid.stddev), variance_threshold))):
+            print("Stopping criterion met. The posterior is certain enough about the maximum.")
+            print("Number of total trials: ", i+1+num_initial_trials)
+            break
+
+        current_value = new_y.item()
+        if current_value > best_value + improvement_threshold:
+            best_value = current_value
+
+        print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()*(upper_bound-lower_bound)+lower_bound}, Value = {current_value}, Best Value = {best_value}")
 
-    if KG:
-        SMOKE_TEST = os.environ.get("SMOKE_TEST")
-        NUM_FANTASIES = 128 if not SMOKE_TEST else 4
-        NUM_RESTARTS = 10 if not SMOKE_TEST else 2
-        RAW_SAMPLES = 128
-        bounds = torch.stack([torch.zeros(1, dtype=torch.double), torch.ones(1, dtype=torch.double)])
-        acq_fct = qKnowledgeGradient(model=gp, num_fantasies=NUM_FANTASIES)
-        candidates, acq_value = optimize_acqf(
-            acq_function=acq_fct,
-            bounds=bounds,
-            q=1,
-            num_restarts=NUM_RESTARTS,
-            raw_samples=RAW_SAMPLES,
-        )
-
-        argmax_pmean, max_pmean = optimize_acqf(
-            acq_function=PosteriorMean(gp),
-            bounds=bounds,
-            q=1,
-            num_restarts=NUM_RESTARTS,
-            raw_samples=RAW_SAMPLES,
-        )
-        qKG_proper = qKnowledgeGradient(
-            gp,
-            num_fantasies=NUM_FANTASIES,
-            sampler=acq_fct.sampler,
-            current_value=max_pmean,
-        )
-
-        candidate, acq_value_proper = optimize_acqf(
-            acq_function=qKG_proper,
-            bounds=bounds,
-            q=1,
-            num_restarts=NUM_RESTARTS,
-            raw_samples=RAW_SAMPLES,
-        )
-    else:
-        candidate, acq_value = optimize_acqf(
-            acq_function=acq_fct,
-            bounds=torch.tensor([[0], [1]], dtype=torch.double),
-            q=1,
-            num_restarts=20,
-            raw_samples=256,
-        )
-
-    new_y = torch.tensor([[test_function(candidate[0]*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
-    new_yvar = torch.full_like(new_y, fixed_Yvar, dtype=torch.double)
-
-    with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([candidate.numpy()[0,0]*(upper_bound-lower_bound)+lower_bound, new_y.numpy()[0,0]])
-
-    initial_x = torch.cat([initial_x, candidate])
-    initial_y = torch.cat([initial_y, new_y])
-    initial_yvar = torch.cat([initial_yvar, new_yvar])
-    gp = CustomSingleTaskGP(initial_x, initial_y)
-    mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-    fit_gpytorch_mll(mll)
-
-    x_query = torch.linspace(0, 1, 1000).unsqueeze(-1)
-    posterior = gp.posterior(x_query)
-
-    mean = posterior.mean.squeeze(-1).detach().numpy()
-    variance = posterior.variance.squeeze(-1)
-    stddev = torch.sqrt(variance).detach().numpy()
+
+    grid = PosteriorGrid(gp, x_query)
 
     if visualize:
+        mean, stddev = grid.mean, grid.stddev
+        max_index = torch.argmax(initial_y)
+        max_x = initial_x[max_index]
+        max_y = initial_y[max_index]
         plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
         plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
         plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
-        plt.scatter(candidate.numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
         plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
         plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
+        plt.scatter(max_x.numpy()*(upper_bound-lower_bound)+lower_bound, max_y.numpy(), color="green", label="Maximum", zorder=3)
         plt.xlabel("x")
         plt.ylabel("y")
-        plt.title("Optimization Process")
+        plt.title("Optimization Results")
         plt.gcf().suptitle(title, fontsize=12)
         plt.legend()
         plt.show()
 
-    counter += 1
-
-    if stopping_y:
-        current_value = new_y.item()
-        if current_value > best_value + improvement_threshold:
-            best_value = current_value
-            no_improvement_trials = 0
-        elif len(initial_x) > num_initial_trials:
-            no_improvement_trials += 1
-        if no_improvement_trials >= num_consecutive_trials:
-            print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()*(upper_bound-lower_bound)+lower_bound}, Value = {current_value}, Best Value = {best_value}")
-            print("Stopping criterion met. No significant improvement for consecutive trials.")
-            print("Number of total trials: ", i+1+num_initial_trials)
-            break
-    elif stopping_xy:
-        max_index = torch.argmax(initial_y)
-        for k in range(len(initial_x)):
-            number_x_in_epsilon_neighborhood = 0
-            breaking = False
-            max_y_in_range = False
-            for j in range(len(initial_x)):
-                if np.abs(initial_x[k,0].numpy() - initial_x[j,0].numpy()) < x_range:
-                    number_x_in_epsilon_neighborhood += 1
-                    if initial_x[max_index,0].numpy() == initial_x[k,0].numpy() or initial_x[max_index,0].numpy() == initial_x[j,0].numpy():
-                        max_y_in_range = True
-            if number_x_in_epsilon_neighborhood >= num_consecutive_trials and max_y_in_range:
-                print("Stopping criterion met. No significant improvement for consecutive trials.")
-                print("Number of total trials: ", i+1+num_initial_trials)
-                breaking = True
-                break
-        if breaking:
-            break
+    if add_points:
+        continuing = input("Do you want to add another query point? (y/n)")
     else:
-        print("Wrong input, used stopping_y instead.")
-        stopping_y = True
+        continuing = "n"
 
-    current_value = new_y.item()
-    if current_value > best_value + improvement_threshold:
-        best_value = current_value
+    #In case you want to add another point:
+    while continuing == "y":
+        candidate = input("Which point do you want to add?")
+        candidate = torch.tensor([[float(candidate)]], dtype=torch.double)
 
-    print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()*(upper_bound-lower_bound)+lower_bound}, Value = {current_value}, Best Value = {best_value}")
+        new_y = torch.tensor([[test_function(candidate[0]*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
+        new_yvar = torch.full_like(new_y, fixed_Yvar, dtype=torch.double)
 
-    
-x_query = torch.linspace(0, 1, 1000).unsqueeze(-1)
-posterior = gp.posterior(x_query)
+        initial_x = torch.cat([initial_x, candidate])
+        initial_y = torch.cat([initial_y, new_y])
+        initial_yvar = torch.cat([initial_yvar, new_yvar])
+        gp = incremental_gp.update(initial_x, initial_y, candidate, new_y)
 
-mean = posterior.mean.squeeze(-1).detach().numpy()
-variance = posterior.variance.squeeze(-1)
-stddev = torch.sqrt(variance).detach().numpy()
+        counter += 1
+
+        print(f"Trial {counter}: x = {candidate[0, 0].item()*(upper_bound-lower_bound)+lower_bound}, Value = {new_y.item()}")
+
+        grid = PosteriorGrid(gp, x_query)
+
+        if visualize:
+            mean, stddev = grid.mean, grid.stddev
+            plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
+            plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
+            plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
+            plt.scatter(candidate.numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
+            plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
+            plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
+            plt.xlabel("x")
+            plt.ylabel("y")
+            plt.title("Optimization Process")
+            plt.gcf().suptitle(title, fontsize=12)
+            plt.legend()
+            plt.show()
+
+        continuing = input("Do you want to add another query point? (y/n)")
 
-if visualize:
     max_index = torch.argmax(initial_y)
-    max_x = initial_x[max_index]
-    max_y = initial_y[max_index]
-    plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
-    plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
-    plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
-    plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
-    plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
-    plt.scatter(max_x.numpy()*(upper_bound-lower_bound)+lower_bound, max_y.numpy(), color="green", label="Maximum", zorder=3)
-    plt.xlabel("x")
-    plt.ylabel("y")
-    plt.title("Optimization Results")
-    plt.gcf().suptitle(title, fontsize=12)
-    plt.legend()
-    plt.show()
-
-if add_points:
-    continuing = input("Do you want to add another query point? (y/n)")
-else:
-    continuing = "n"
-
-#In case you want to add another point:
-while continuing == "y":
-    candidate = input("Which point do you want to add?")
-    candidate = torch.tensor([[float(candidate)]], dtype=torch.double)
-
-    new_y = torch.tensor([[test_function(candidate[0]*(upper_bound-lower_bound)+lower_bound)]], dtype=torch.double)
-    new_yvar = torch.full_like(new_y, fixed_Yvar, dtype=torch.double)
-
-    with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([candidate.numpy()[0,0]*(upper_bound-lower_bound)+lower_bound, new_y.numpy()[0,0]])
-
-    initial_x = torch.cat([initial_x, candidate])
-    initial_y = torch.cat([initial_y, new_y])
-    initial_yvar = torch.cat([initial_yvar, new_yvar])
-    gp = CustomSingleTaskGP(initial_x, initial_y)
-    mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-    fit_gpytorch_mll(mll)
-
-    counter += 1
-
-    print(f"Trial {i + 1 + num_initial_trials}: x = {candidate.item()}, Value = {current_value}, Best Value = {best_value}")
-
-    x_query = torch.linspace(0, 1, 1000).unsqueeze(-1)
-    posterior = gp.posterior(x_query)
-
-    mean = posterior.mean.squeeze(-1).detach().numpy()
-    variance = posterior.variance.squeeze(-1)
-    stddev = torch.sqrt(variance).detach().numpy()
+    maximizer = initial_x[max_index]
+    best_y = initial_y[max_index]
 
-    if visualize:
-        plt.scatter(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", label="Trials", zorder=3)
-        plt.plot(initial_x.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y.numpy(), color="red", linestyle="", markersize=3)
-        plt.plot(x_query*(upper_bound-lower_bound)+lower_bound, mean)
-        plt.scatter(candidate.numpy()*(upper_bound-lower_bound)+lower_bound, new_y.numpy(), color="green", s=30, zorder=5, label="New query point")
-        plt.fill_between(x_query.numpy().squeeze()*(upper_bound-lower_bound)+lower_bound, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI")
-        plt.scatter(initial_x_vals.numpy()*(upper_bound-lower_bound)+lower_bound, initial_y_vals.numpy(), color="orange", label="Initial values", zorder=3)
-        plt.xlabel("x")
-        plt.ylabel("y")
-        plt.title("Optimization Process")
-        plt.gcf().suptitle(title, fontsize=12)
-        plt.legend()
-        plt.show()
+    result = BayesOptResult(individuality_parameter=global_individuality_parameter,
+                            trials_x=initial_x.numpy()[:,0]*(upper_bound-lower_bound)+lower_bound,
+                            trials_y=initial_y.numpy()[:,0],
+                            x=np.linspace(lower_bound, upper_bound, 1000),
+                            mean=grid.mean,
+                            stddev=grid.stddev,
+                            number_of_trials=counter,
+                            maximizer=maximizer.item()*(upper_bound-lower_bound)+lower_bound,
+                            best_y=best_y.item(),
+                            time=time.time()-starting_time)
+
+    if write_files:
+        results_store.store_result(result, "BayesOpt_test_functions", seed)
+
+    return result
 
-    continuing = input("Do you want to add another query point? (y/n)")
 
-max_index = torch.argmax(initial_y)
-maximizer = initial_x[max_index]
-best_y = initial_y[max_index]
+if __name__ == "__main__":
+    set_options(sys.argv)
 
-with open("BayesOpt_outputs"+global_individuality_parameter+".csv", "a", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(np.linspace(lower_bound, upper_bound, 1000))
-    writer.writerow(mean)
-    writer.writerow(stddev)
-    writer.writerow([counter])
-    writer.writerow([maximizer.numpy()[0]*(upper_bound-lower_bound)+lower_bound, best_y.numpy()[0]])
-    writer.writerow([time.time()-starting_time])
+    os.chdir("build_release")
 
-print(global_individuality_parameter)
+    result = bayes_opt()
 
-with open("BayesOpt_global_individuality_parameters.csv", "a") as f:
-    writer = csv.writer(f)
-    writer.writerow([global_individuality_parameter])
+    print(result.individuality_parameter)
\ No newline at end of file
@@ -0,0 +1,209 @@
+import sys
+import time
+import torch
+import numpy as np
+from botorch.models import SingleTaskGP
+from gpytorch.likelihoods import GaussianLikelihood
+from gpytorch.kernels import MaternKernel, ScaleKernel, RBFKernel
+from gpytorch.means import ConstantMean, ZeroMean
+from gpytorch.mlls import ExactMarginalLogLikelihood
+from botorch.fit import fit_gpytorch_mll
+from botorch.acquisition import ExpectedImprovement, ProbabilityOfImprovement
+from botorch.generation.gen import gen_candidates_scipy
+from botorch.models.transforms.input import Normalize
+from botorch.models.transforms.outcome import Standardize
+import BayesOpt_test_functions as bo
+import stopping_criteria
+
+
+"""
+This is a file to carry out many independent BO runs (replicates) for one of the test functions at the same time.
+All replicates have the same model options as BayesOpt_test_functions.py and are fitted and optimized together: the
+training data of the replicates is stacked along a batch dimension, so one batched GP with its own hyperparameters per
+replicate is fitted in one go, and the acquisition function of all replicates is evaluated and optimized with the same
+tensor operations. A replicate that meets its stopping criterion is removed from the batch, the remaining ones carry on.
+The results are the same BayesOptResult tuples that BayesOpt_test_functions.bayes_opt returns.
+Only EI and PI are batched, with KG or ES the replicates are carried out one after the other by
+BayesOpt_test_functions.bayes_opt, so the results always belong to the chosen acquisition function.
+You can call this file with the same options as BayesOpt_test_functions.py and the number of replicates, e.g.:
+>python BayesOpt_test_functions_batched.py matern 1.5 const fixed_noise ei stopping_xy 1 replicates 100
+"""
+
+########################################################################################################################
+#Customize code here
+num_replicates = 100
+num_iterations = 100
+raw_samples = 256
+########################################################################################################################
+
+
+#The batched counterpart of CustomSingleTaskGP, the batch shape is given by the leading dimensions of train_X.
+class BatchedSingleTaskGP(SingleTaskGP):
+    def __init__(self, train_X, train_Y):
+        batch_shape = train_X.shape[:-2]
+        train_Yvar = torch.full_like(train_Y, bo.fixed_Yvar, dtype=torch.double)
+        if bo.fixed_noise:
+            likelihood = GaussianLikelihood(noise=train_Yvar, batch_shape=batch_shape)
+        else:
+            likelihood = GaussianLikelihood(batch_shape=batch_shape)
+        if bo.matern:
+            kernel = ScaleKernel(MaternKernel(nu=bo.nu, batch_shape=batch_shape), batch_shape=batch_shape)
+        elif bo.rbf:
+            kernel = ScaleKernel(RBFKernel(batch_shape=batch_shape), batch_shape=batch_shape)
+        else:
+            kernel = ScaleKernel(MaternKernel(nu=1.5, batch_shape=batch_shape), batch_shape=batch_shape)
+
+        if bo.zero:
+            mean = ZeroMean(batch_shape=batch_shape)
+        else:
+            mean = ConstantMean(batch_shape=batch_shape)
+
+        input_transform = Normalize(d=train_X.shape[-1], batch_shape=batch_shape)
+        output_transform = Standardize(m=1, batch_shape=batch_shape)
+
+        super().__init__(train_X,
+                         train_Y,
+                         likelihood=likelihood,
+                         covar_module=kernel,
+                         mean_module=mean,
+                         input_transform=input_transform,
+                         outcome_transform=output_transform,
+                        )
+
+
+#Maximizes the acquisition function of every replicate of a batched GP. The best points of a common grid of raw_samples
+#points are the starting points of one L-BFGS-B run for all replicates, the replicates don't interact since the sum of
+#their acquisition values is maximized. Returns the candidates with shape (replicates, 1, 1) and their acquisition values.
+def optimize_acqf_batched(acq_fct, num_replicates):
+    grid = torch.linspace(0, 1, raw_samples, dtype=torch.double).view(-1, 1, 1, 1)
+    with torch.no_grad():
+        values = acq_fct(grid).view(raw_samples, num_replicates)
+    initial_conditions = grid.view(-1)[values.argmax(dim=0)].view(num_replicates, 1, 1)
+    candidates, acq_values = gen_candidates_scipy(initial_conditions=initial_conditions,
+                                                  acquisition_function=acq_fct,
+                                                  lower_bounds=0.,
+                                                  upper_bounds=1.,
+                                                  use_parallel_mode=False)
+    return candidates.detach(), acq_values.detach().view(num_replicates)
+
+
+#This carries out num_replicates BO runs of the test function with the options set by bo.set_options and returns a list
+#of BayesOptResult, one per replicate. The time of a result is the share of the replicate in the time of the batch, i.e.
+#the time of the batch until the replicate stopped divided by num_replicates, so it can be compared with the time of a
+#run of BayesOpt_test_functions.py.
+def bayes_opt_batched(function_number=None, num_replicates=num_replicates, seed=None):
+    if function_number is not None:
+        bo.test_function_number = function_number
+    if seed is not None:
+        torch.manual_seed(seed)
+    if not (bo.EI or bo.PI):
+        print("Batched BO only supports EI and PI, the replicates are carried out one after the other.")
+        return [bo.bayes_opt(write_files=False) for _ in range(num_replicates)]
+    global_individuality_parameter, _ = bo.individuality_parameter_and_title()
+    if not (bo.stopping_y or bo.stopping_xy):
+        print("Wrong input, used stopping_y instead.")
+
+    starting_time = time.time()
+    scale = bo.upper_bound - bo.lower_bound
+
+    #Every replicate gets its own scrambled Sobol sequence for the initial trials
+    if bo.sobol_on:
+        train_x = torch.stack([torch.quasirandom.SobolEngine(dimension=1, scramble=True).draw(bo.num_initial_trials, dtype=torch.double)
+                               for _ in range(num_replicates)])
+    else:
+        train_x = torch.linspace(0, 1, bo.num_initial_trials, dtype=torch.double).view(1, -1, 1).repeat(num_replicates, 1, 1)
+    train_y = torch.from_numpy(bo.test_function_values(train_x.numpy()*scale+bo.lower_bound))
+
+    x_query = torch.linspace(0, 1, 1000, dtype=torch.double).unsqueeze(-1)
+    active = torch.arange(num_replicates)
+    best_value = torch.full((num_replicates,), -float('inf'), dtype=torch.double)
+    no_improvement_trials = torch.zeros(num_replicates, dtype=torch.long)
+    results = [None]*num_replicates
+
+    #Writes the results of the replicates in finished (indices into the active ones) while gp still describes them
+    def finish(gp, finished):
+        with torch.no_grad():
+            posterior = gp.posterior(x_query)
+            mean = posterior.mean[finished, :, 0].numpy()
+            stddev = posterior.variance[finished, :, 0].sqrt().numpy()
+        elapsed = (time.time() - starting_time)/num_replicates
+        for k, index in enumerate(finished.tolist()):
+            replicate = active[index].item()
+            max_index = train_y[index, :, 0].argmax()
+            results[replicate] = bo.BayesOptResult(individuality_parameter=global_individuality_parameter,
+                                                   trials_x=train_x[index, :, 0].numpy()*scale+bo.lower_bound,
+                                                   trials_y=train_y[index, :, 0].numpy(),
+                                                   x=np.linspace(bo.lower_bound, bo.upper_bound, 1000),
+                                                   mean=mean[k],
+                                                   stddev=stddev[k],
+                                                   number_of_trials=train_x.shape[1],
+                                                   maximizer=train_x[index, max_index, 0].item()*scale+bo.lower_bound,
+                                                   best_y=train_y[index, max_index, 0].item(),
+                                                   time=elapsed)
+
+    for i in range(num_iterations):
+        gp = BatchedSingleTaskGP(train_x, train_y)
+        mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
+        fit_gpytorch_mll(mll)
+
+        best_f = train_y.max(dim=-2).values
+        if bo.PI:
+            acq_fct = ProbabilityOfImprovement(model=gp, best_f=best_f)
+        else:
+            acq_fct = ExpectedImprovement(model=gp, best_f=best_f)
+        candidates, acq_values = optimize_acqf_batched(acq_fct, len(active))
+
+        new_y = torch.from_numpy(bo.test_function_values(candidates.numpy()*scale+bo.lower_bound))
+        train_x = torch.cat([train_x, candidates], dim=-2)
+        train_y = torch.cat([train_y, new_y], dim=-2)
+
+        current_value = new_y[:, 0, 0]
+        improved = current_value > best_value[active] + bo.improvement_threshold
+        best_value[active] = torch.where(improved, current_value, best_value[active])
+        if bo.stopping_xy:
+            stopped = stopping_criteria.stopping_xy_met(train_x, train_y, bo.x_range, bo.num_consecutive_trials)
+        else:
+            no_improvement_trials[active] = torch.where(improved, 0, no_improvement_trials[active] + 1)
+            stopped = no_improvement_trials[active] >= bo.num_consecutive_trials
+        if bo.stopping_acq:
+            stopped = stopped | stopping_criteria.acquisition_value_met(acq_values, bo.acq_threshold)
+        if bo.stopping_regret or bo.stopping_variance:
+            with torch.no_grad():
+                posterior = gp.condition_on_observations(X=candidates, Y=new_y).posterior(x_query)
+                mean = posterior.mean[..., 0]
+                stddev = posterior.variance[..., 0].sqrt()
+            if bo.stopping_regret:
+                stopped = stopped | stopping_criteria.regret_bound_met(mean, stddev, bo.regret_threshold, bo.regret_beta)
+            if bo.stopping_variance:
+                stopped = stopped | stopping_criteria.posterior_variance_met(stddev, bo.variance_threshold)
+
+        if i == num_iterations - 1:
+            stopped = torch.ones_like(stopped)
+        if stopped.any():
+            #The GP of the stopped replicates is updated with their last trial before their results are taken
+            gp = gp.condition_on_observations(X=candidates, Y=new_y)
+            finish(gp, stopped.nonzero()[:, 0])
+            train_x = train_x[~stopped]
+            train_y = train_y[~stopped]
+            active = active[~stopped]
+        print(f"Trial {i + 1 + bo.num_initial_trials}: {len(active)} of {num_replicates} replicates still running")
+        if len(active) == 0:
+            break
+
+    return results
+
+
+if __name__ == "__main__":
+    inputs = [item.lower() for item in sys.argv]
+    if "replicates" in inputs:
+        index = inputs.index("replicates")
+        num_replicates = int(inputs[index + 1])
+        del inputs[index:index + 2]
+    bo.set_options(inputs)
+
+    results = bayes_opt_batched(num_replicates=num_replicates)
+
+    print("Average number of trials: ", np.mean([result.number_of_trials for result in results]))
+    print("Maximizers: ", [result.maximizer for result in results])
+    print("Maxima: ", [result.best_y for result in results])
+    print("Average time elapsed per replicate: ", np.mean([result.time for result in results]), " seconds")
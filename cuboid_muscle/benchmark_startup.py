@@ -0,0 +1,86 @@
+import sys
+import os
+import ast
+import subprocess
+import statistics
+
+"""
+This is a file to measure how long the BO scripts take to start, i.e. to import the modules they need.
+Each script is started a few times in a fresh python process that only runs the imports at the top of the script, and
+python's -X importtime is used to find the modules that take the longest. The modules that are only imported when
+they are used (matplotlib for the plots, the acquisition functions KG and ES, multi-fidelity BO) are measured separately
+on top of the imports of the script.
+>python benchmark_startup.py
+or, with the number of repetitions,
+>python benchmark_startup.py 10
+"""
+
+########################################################################################################################
+#Customize code here
+
+scripts = ["BayesOpt.py", "BayesOpt_test_functions.py", "BayesOpt_test_functions_batched.py", "Evaluate_BayesOpt_model.py"]
+deferred_imports = {
+    "matplotlib": "import matplotlib.pyplot",
+    "KG": "import kg_engine",
+    "ES": "import es_engine",
+    "multi-fidelity": "import botorch.acquisition.cost_aware, botorch.models.cost",
+}
+repetitions = 5
+number_of_slowest_modules = 5
+
+########################################################################################################################
+
+if len(sys.argv) > 1:
+    repetitions = int(sys.argv[1])
+
+script_path = os.path.dirname(os.path.abspath(__file__))
+
+
+#Returns the import statements at the top level of the script, so the script itself is not run.
+def top_level_imports(script):
+    with open(os.path.join(script_path, script)) as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+#Runs baseline and then code in a new python process and returns the import time of code in seconds, i.e. without the
+#modules that baseline has imported already, and the import times of the modules that are imported directly by code.
+def import_time(code, baseline=""):
+    marker = "--- end of baseline ---"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              baseline + "\nimport sys\nprint('" + marker + "', file=sys.stderr)\n" + code],
+                             cwd=script_path, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+    total = 0
+    modules = []
+    for line in process.stderr.split(marker)[1].splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        total += int(self_time)
+        if not name[1:].startswith(" "):
+            modules.append((int(cumulative_time) / 1e6, name.strip()))
+    return total / 1e6, modules
+
+
+def measure(code, baseline=""):
+    times = []
+    for repetition in range(repetitions):
+        total, modules = import_time(code, baseline)
+        times.append(total)
+    return statistics.median(times), sorted(modules, reverse=True)
+
+
+for script in scripts:
+    imports = top_level_imports(script)
+    median, modules = measure(imports)
+    print("{}: {:.3f} s".format(script, median))
+    for cumulative_time, name in modules[:number_of_slowest_modules]:
+        print("    {:.3f} s  {}".format(cumulative_time, name))
+
+baseline = top_level_imports("BayesOpt.py")
+print("Imported only when used, on top of the imports of BayesOpt.py:")
+for name, code in deferred_imports.items():
+    median, modules = measure(code, baseline)
+    print("    {:.3f} s  {}".format(median, name))
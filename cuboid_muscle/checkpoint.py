@@ -0,0 +1,38 @@
+import os
+import random
+import torch
+import numpy as np
+
+"""
+This is a file to store the state of a BO run in a checkpoint, so that an interrupted run can be continued later without
+simulating any query point again.
+A checkpoint is a dict of tensors, numbers and other picklable objects (e.g. the Sobol engine) that is saved with
+torch.save. The states of the random number generators of torch, numpy and random are added when saving and restored
+when loading, so a resumed run proposes the same query points as the run without interruption would have.
+The file is written under a temporary name first and then renamed, so an interruption while saving leaves the previous
+checkpoint intact.
+"""
+
+
+def save(filename, state):
+    state = dict(state)
+    state["rng_states"] = {
+        "torch": torch.get_rng_state(),
+        "numpy": np.random.get_state(),
+        "random": random.getstate(),
+    }
+    torch.save(state, filename + ".tmp")
+    os.replace(filename + ".tmp", filename)
+
+
+def load(filename):
+    state = torch.load(filename, weights_only=False)
+    torch.set_rng_state(state["rng_states"]["torch"])
+    np.random.set_state(state["rng_states"]["numpy"])
+    random.setstate(state["rng_states"]["random"])
+    return state
+
+
+def remove(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
@@ -0,0 +1,78 @@
+import os
+import marshal
+import hashlib
+import simulation_cache
+
+"""
+This is a file to cache the OpenDiHu config of a settings file between simulations.
+Building the config (fiber meshes, CellML instances, boundary conditions, initial values) is repeated at the
+start of every simulation, although only a few fields depend on the force. The config is therefore serialized once per
+version of the settings files and arguments, and later simulations load it and only fill in the force-dependent fields.
+The config only consists of dicts, lists, tuples, strings and numbers, so it is stored with marshal, which loads such
+data faster than pickle.
+The force-dependent fields are given as a dict {name: object}. When the config is stored, every place in the config that
+holds one of these objects is remembered by its path and emptied, so the callbacks, which cannot be serialized, are never
+stored. When the config is loaded, the current objects are put in these places again.
+"""
+
+directory = "config_cache" #relative to the working directory, i.e. build_release
+
+
+#The key depends on the content of the given files and on the arguments that change the force-independent part.
+def key(paths, arguments):
+    sha = hashlib.sha256(simulation_cache.settings_hash(paths).encode())
+    sha.update(repr(arguments).encode())
+    return sha.hexdigest()
+
+
+def find_paths(value, objects, path, found):
+    for name, obj in objects.items():
+        if value is obj:
+            found.append((name, path))
+            return
+    if isinstance(value, dict):
+        for k, v in value.items():
+            find_paths(v, objects, path + (k,), found)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            find_paths(v, objects, path + (i,), found)
+
+
+def set_path(config, path, value):
+    for k in path[:-1]:
+        config = config[k]
+    config[path[-1]] = value
+
+
+#Returns the config stored under key with the force-dependent fields filled in, or None if nothing is stored.
+def load(key, force_dependent):
+    filename = os.path.join(directory, key + ".marshal")
+    try:
+        with open(filename, "rb") as f:
+            config, paths = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    for name, path in paths:
+        set_path(config, path, force_dependent[name])
+    return config
+
+
+#Stores config under key without the force-dependent fields. config itself is not changed. If the config contains
+#other objects than marshal supports, nothing is stored.
+def store(key, config, force_dependent):
+    paths = []
+    find_paths(config, force_dependent, (), paths)
+    for name, path in paths:
+        set_path(config, path, None)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, key + ".marshal")
+        with open(filename + ".tmp" + str(os.getpid()), "wb") as f:
+            marshal.dump((config, paths), f)
+        os.replace(filename + ".tmp" + str(os.getpid()), filename)
+    except ValueError:
+        print("The config cannot be cached, it contains objects that marshal does not support")
+        os.remove(filename + ".tmp" + str(os.getpid()))
+    finally:
+        for name, path in paths:
+            set_path(config, path, force_dependent[name])
@@ -0,0 +1,41 @@
+import os
+import json
+
+"""
+This is a file for the design space of a multi-dimensional BO run: the prestretch force together with further parameters
+of variables/variables.py (e.g. pmax, the material parameters c1, c2, b, d or the number of fibers), each between a
+lower and an upper bound.
+A query point is in the unit cube. Its first entry is the normalized force as in a run with one input, the others are
+the normalized parameters in the order in which they are given. The parameters are passed to the simulation in the
+environment variable VARIABLES_OVERRIDES as a JSON object, which variables/variables.py reads, so the command line of
+OpenDiHu stays the same and simulations with different parameters can run at the same time.
+Results of simulations with overridden parameters are stored under their own kind in the simulation cache and the config
+cache, see suffix().
+"""
+
+environment_variable = "VARIABLES_OVERRIDES"
+
+
+#Returns a string that identifies the values of the overridden parameters, "" if there are none.
+def suffix(values):
+    return "".join("_{}_{}".format(name, value) for name, value in sorted(values.items()))
+
+
+class DesignSpace:
+    #parameters is a dict of name: (lower bound, upper bound)
+    def __init__(self, parameters):
+        self.names = list(parameters)
+        self.lower_bounds = [float(parameters[name][0]) for name in self.names]
+        self.upper_bounds = [float(parameters[name][1]) for name in self.names]
+        self.dimension = 1 + len(self.names)
+
+    #Returns the parameters of the query point x (a tensor with dimension entries) as a dict of name: value.
+    def values(self, x):
+        return {name: lower + (upper - lower)*x[k+1].item()
+                for k, (name, lower, upper) in enumerate(zip(self.names, self.lower_bounds, self.upper_bounds))}
+
+    #Returns the environment of a simulation with the given parameters.
+    def environment(self, values):
+        environment = dict(os.environ)
+        environment[environment_variable] = json.dumps(values)
+        return environment
@@ -0,0 +1,148 @@
+import math
+import numpy as np
+import torch
+from scipy.optimize import brentq
+from scipy.stats import norm
+from torch.quasirandom import SobolEngine
+from botorch.acquisition.max_value_entropy_search import qMaxValueEntropy
+
+"""
+This is a file for the acquisition function ES (max-value entropy search) of a whole BO run.
+The max values of the GP are sampled from a Gumbel distribution that is fitted to the posterior on a discrete candidate
+set. Instead of 1000 new random candidates in every iteration, the engine draws a scrambled Sobol set in double
+precision once and keeps it for the whole run. In every iteration, a few points near the best trials (the incumbents)
+are added, since the maximum is most likely there.
+The posterior on the Sobol set is cached. If the GP of the next iteration only differs by one new observation from the
+GP of the cache (same hyperparameters, same transforms, i.e. it was updated with condition_on_observations), the
+posterior is updated with a rank-one update instead of being computed again:
+    mean_new = mean + c*(y - mean(x))/(var(x) + noise)
+    var_new = var - c**2/(var(x) + noise)
+where c is the posterior covariance between the candidates and the new point x, which only needs the kernel between
+the candidates and x, since the kernel between the candidates and the earlier trials is kept. The max values are drawn
+with the same uniform random numbers in every iteration, so they only change as much as the posterior does.
+"""
+
+gumbel_quantiles = [0.25, 0.5, 0.75]
+
+
+class MaxValueEntropy(qMaxValueEntropy):
+    #qMaxValueEntropy that takes the max values from the engine instead of sampling them again. With pending points,
+    #the max values of the fantasy models are sampled as usual.
+    def __init__(self, model, candidate_set, max_values, **kwargs):
+        self.cached_max_values = max_values
+        super().__init__(model=model, candidate_set=candidate_set, **kwargs)
+
+    def _sample_max_values(self, num_samples, X_pending=None):
+        if X_pending is None:
+            self.posterior_max_values = self.cached_max_values
+        else:
+            super()._sample_max_values(num_samples, X_pending)
+
+
+class EntropySearch:
+    def __init__(self, dimension=1, num_candidates=1024, num_incumbents=3, num_local_candidates=32, local_scale=0.02,
+                 num_mv_samples=10):
+        self.num_incumbents = num_incumbents
+        self.num_mv_samples = num_mv_samples
+        self.candidate_set = SobolEngine(dimension, scramble=True).draw(num_candidates, dtype=torch.double)
+        self.local_offsets = local_scale*torch.randn(num_local_candidates, dimension, dtype=torch.double)
+        self.uniform = torch.rand(num_mv_samples, 1, dtype=torch.double)
+        self.gp = None
+        self.num_full_updates = 0
+        self.num_incremental_updates = 0
+
+    #Returns the trials of gp (in the unit cube) and points near the best ones.
+    def trial_candidates(self, gp):
+        train_x = gp.train_inputs[0]
+        if getattr(gp, "input_transform", None) is not None:
+            train_x = gp.input_transform.untransform(train_x)
+        k = min(self.num_incumbents, train_x.shape[0])
+        incumbents = train_x[gp.train_targets.topk(k).indices]
+        local_x = (incumbents.unsqueeze(-2) + self.local_offsets).reshape(-1, train_x.shape[-1]).clamp(0, 1)
+        return torch.cat([local_x, train_x])
+
+    #True if gp is the cached GP conditioned on exactly one more observation.
+    def is_one_point_update(self, gp):
+        if self.gp is None or gp.train_inputs[0].dim() != 2:
+            return False
+        old_x, new_x = self.gp.train_inputs[0], gp.train_inputs[0]
+        old_y, new_y = self.gp.train_targets, gp.train_targets
+        if new_x.shape[0] != old_x.shape[0] + 1:
+            return False
+        if not (torch.equal(new_x[:-1], old_x) and torch.equal(new_y[:-1], old_y)):
+            return False
+        for old_module, new_module in [(self.gp.covar_module, gp.covar_module), (self.gp.likelihood, gp.likelihood),
+                                       (self.gp.mean_module, gp.mean_module)]:
+            old_state, new_state = old_module.state_dict(), new_module.state_dict()
+            if old_state.keys() != new_state.keys():
+                return False
+            if not all(torch.equal(old_state[key], new_state[key]) for key in old_state):
+                return False
+        for transform in ["input_transform", "outcome_transform"]:
+            old_transform, new_transform = getattr(self.gp, transform, None), getattr(gp, transform, None)
+            if (old_transform is None) != (new_transform is None):
+                return False
+            if old_transform is not None:
+                old_state, new_state = old_transform.state_dict(), new_transform.state_dict()
+                if not all(torch.equal(old_state[key], new_state[key]) for key in old_state):
+                    return False
+        return True
+
+    #Posterior mean and variance on the Sobol set in the space of the GP (normalized inputs, standardized outputs). The
+    #kernel between the Sobol set and the trials is kept, so a rank-one update only evaluates the kernel of the new
+    #trial.
+    def update_posterior(self, gp):
+        with torch.no_grad():
+            if self.is_one_point_update(gp):
+                train_x = self.gp.train_inputs[0]
+                x = gp.train_inputs[0][-1:]
+                y = gp.train_targets[-1]
+                train_covariance = self.gp.likelihood(self.gp.forward(train_x)).covariance_matrix
+                solved = torch.cholesky_solve(gp.covar_module(train_x, x).to_dense(), torch.linalg.cholesky(train_covariance))
+                candidates_x = gp.covar_module(self.transformed_candidates, x).to_dense()
+                c = (candidates_x - self.candidates_train @ solved)[:, 0]
+                observed = self.gp.likelihood(self.gp(x))
+                self.mean = self.mean + c*(y - observed.mean[0])/observed.variance[0]
+                self.variance = (self.variance - c**2/observed.variance[0]).clamp_min(0)
+                self.candidates_train = torch.cat([self.candidates_train, candidates_x], dim=-1)
+                self.num_incremental_updates += 1
+            else:
+                self.transformed_candidates = gp.transform_inputs(self.candidate_set)
+                prediction = gp(self.transformed_candidates)
+                self.mean = prediction.mean
+                self.variance = prediction.variance
+                self.candidates_train = gp.covar_module(self.transformed_candidates, gp.train_inputs[0]).to_dense()
+                self.num_full_updates += 1
+        self.gp = gp
+
+    #Samples the max values from the Gumbel distribution that fits the distribution of the maximum of independent
+    #normal distributions, as in botorch, but with the fixed uniform random numbers of the engine.
+    def sample_max_values(self, mean, stddev):
+        mean, stddev = mean.numpy(), stddev.numpy()
+        distribution = norm(mean, stddev)
+        lower = (mean - 3*stddev).min()
+        upper = (mean + 5*stddev).max()
+        q25, q50, q75 = [brentq(lambda y: np.exp(np.sum(distribution.logcdf(y))) - p, lower, upper)
+                         for p in gumbel_quantiles]
+        b = (q25 - q75)/(math.log(math.log(4.0/3.0)) - math.log(math.log(4.0)))
+        a = q50 + b*math.log(math.log(2.0))
+        return a - b*self.uniform.log().mul(-1.0).log()
+
+    #Returns the acquisition function for gp. In batches and in the asynchronous loop, gp can also be a GP conditioned
+    #on the fantasized observations of pending points.
+    def acquisition_function(self, gp):
+        self.update_posterior(gp)
+        outcome_transform = getattr(gp, "outcome_transform", None)
+        if outcome_transform is None:
+            mean, variance = self.mean, self.variance
+        else:
+            mean = self.mean*outcome_transform.stdvs.squeeze() + outcome_transform.means.squeeze()
+            variance = self.variance*outcome_transform.stdvs.squeeze()**2
+        with torch.no_grad():
+            extra_candidates = self.trial_candidates(gp)
+            posterior = gp.posterior(extra_candidates)
+            mean = torch.cat([mean, posterior.mean.squeeze(-1)])
+            variance = torch.cat([variance, posterior.variance.squeeze(-1)])
+        max_values = self.sample_max_values(mean, variance.clamp_min(1e-8).sqrt())
+        candidate_set = torch.cat([self.candidate_set, extra_candidates])
+        return MaxValueEntropy(gp, candidate_set, max_values, num_mv_samples=self.num_mv_samples)
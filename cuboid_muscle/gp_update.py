@@ -0,0 +1,103 @@
+import math
+import torch
+from gpytorch.mlls import ExactMarginalLogLikelihood
+from botorch.fit import fit_gpytorch_mll
+
+"""
+This is a file to keep the GP of a BO loop up to date without building and fitting it from scratch after every new
+observation.
+New observations are appended with condition_on_observations, which updates the cached Cholesky factor of the training
+covariance by the new rows instead of factorizing it again, and keeps the hyperparameters. The hyperparameters are only
+fitted again every refit_interval updates or when the marginal likelihood drifts, i.e. when the log predictive density of
+one of the new observations is more than mll_tolerance below the average log marginal likelihood per observation of the
+last fit. Such a fit builds a new GP and starts the optimizer at the previous hyperparameters.
+As long as there are fewer than min_refit_trials observations, the hyperparameters are fitted after every update: the
+ones fitted on the first few trials are far off, and a GP that keeps them is too sure of itself, so the stopping
+criteria stop the run too early. With refit_interval = 1, the hyperparameters are fitted after every update as without
+an IncrementalGP.
+The state of an IncrementalGP (hyperparameters and counters) can be stored with state() and given to a new IncrementalGP,
+which then continues without fitting the hyperparameters again, e.g. when a BO run is resumed from a checkpoint.
+"""
+
+class IncrementalGP:
+    def __init__(self, model_class, train_x, train_y, refit_interval=1, mll_tolerance=2.0, state=None,
+                 min_refit_trials=0):
+        self.model_class = model_class
+        self.refit_interval = refit_interval
+        self.min_refit_trials = min_refit_trials
+        self.mll_tolerance = mll_tolerance
+        self.num_fits = 0
+        self.num_updates = 0
+        self.gp = None
+        if state is None:
+            self.refit(train_x, train_y)
+        else:
+            self.restore(train_x, train_y, state)
+
+    #Builds a new GP for all observations and fits its hyperparameters, starting at the ones of the previous GP.
+    def refit(self, train_x, train_y):
+        gp = self.model_class(train_x, train_y)
+        if self.gp is not None:
+            gp.likelihood.load_state_dict(self.gp.likelihood.state_dict())
+            gp.covar_module.load_state_dict(self.gp.covar_module.state_dict())
+            gp.mean_module.load_state_dict(self.gp.mean_module.state_dict())
+        mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
+        fit_gpytorch_mll(mll)
+
+        gp.train()
+        with torch.no_grad():
+            self.mll_per_observation = mll(gp(*gp.train_inputs), gp.train_targets).item()
+        gp.eval()
+
+        self.gp = gp
+        self.num_fits += 1
+        self.updates_since_fit = 0
+        return gp
+
+    def state(self):
+        return {
+            "likelihood": self.gp.likelihood.state_dict(),
+            "covar_module": self.gp.covar_module.state_dict(),
+            "mean_module": self.gp.mean_module.state_dict(),
+            "mll_per_observation": self.mll_per_observation,
+            "num_fits": self.num_fits,
+            "num_updates": self.num_updates,
+            "updates_since_fit": self.updates_since_fit,
+        }
+
+    #Builds a new GP for all observations with the hyperparameters of a stored state instead of fitting them.
+    def restore(self, train_x, train_y, state):
+        gp = self.model_class(train_x, train_y)
+        gp.likelihood.load_state_dict(state["likelihood"])
+        gp.covar_module.load_state_dict(state["covar_module"])
+        gp.mean_module.load_state_dict(state["mean_module"])
+        gp.eval()
+
+        self.gp = gp
+        self.mll_per_observation = state["mll_per_observation"]
+        self.num_fits = state["num_fits"]
+        self.num_updates = state["num_updates"]
+        self.updates_since_fit = state["updates_since_fit"]
+        return gp
+
+    #Log predictive density of every new observation, in the standardized space of the last fit.
+    def log_predictive_density(self, new_x, new_y):
+        with torch.no_grad():
+            posterior = self.gp.posterior(new_x, observation_noise=True)
+            variance = posterior.variance.clamp_min(1e-12)
+            scale = self.gp.outcome_transform.stdvs.squeeze()
+            log_density = -0.5*(new_y - posterior.mean)**2/variance - 0.5*torch.log(2*math.pi*variance/scale**2)
+        return log_density.squeeze(-1)
+
+    #Appends the new observations (train_x and train_y contain all observations including the new ones) and returns the
+    #updated GP.
+    def update(self, train_x, train_y, new_x, new_y):
+        self.num_updates += 1
+        self.updates_since_fit += 1
+        if len(train_x) < self.min_refit_trials or self.updates_since_fit >= self.refit_interval:
+            return self.refit(train_x, train_y)
+        drift = self.mll_per_observation - self.log_predictive_density(new_x, new_y).min().item()
+        if drift > self.mll_tolerance:
+            return self.refit(train_x, train_y)
+        self.gp = self.gp.condition_on_observations(X=new_x, Y=new_y)
+        return self.gp
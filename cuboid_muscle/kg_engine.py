@@ -0,0 +1,113 @@
+import time
+import torch
+from torch.quasirandom import SobolEngine
+from botorch.acquisition import PosteriorMean
+from botorch.acquisition.knowledge_gradient import qKnowledgeGradient
+from botorch.optim import optimize_acqf
+from optimize_1d import maximize_1d
+
+"""
+This is a file for the acquisition function KG (knowledge gradient) of a whole BO run within a time budget per
+iteration.
+KG needs the maximum of the posterior mean of the current GP (current_value) as a baseline. It is found first, with a
+few restarts at the maximizer of the previous iteration, the best trial and some Sobol points, since it hardly moves
+between iterations. Then qKG is optimized once, with current_value. The number of fantasies, which makes up most of the
+time of KG, is scaled to the time budget: after every iteration, the time per fantasy is measured and the number of
+fantasies for the next iteration is chosen such that KG takes about time_budget seconds, between min_fantasies and
+max_fantasies.
+For a single input (one_dimensional), KG is computed on a grid instead (discrete KG): an observation at x changes the
+posterior mean at every point x' by sigma(x', x)*z, where sigma(x', x) is the posterior covariance divided by the
+standard deviation of the observation at x, and z is standard normal. KG(x) is the expectation over z of the largest
+updated mean on the grid and x minus the largest current mean there. The fantasies are fixed quantiles of z, so KG is a
+smooth function of x and is maximized with optimize_1d.py, and no separate maximization of the posterior mean is needed.
+"""
+
+
+class KnowledgeGradient:
+    def __init__(self, time_budget, min_fantasies=8, max_fantasies=128, num_restarts=10, raw_samples=128,
+                 num_mean_restarts=4, dimension=1, one_dimensional=False, num_grid_points=201, batch_size=64):
+        self.time_budget = time_budget
+        self.min_fantasies = min_fantasies
+        self.max_fantasies = max_fantasies
+        self.num_restarts = num_restarts
+        self.raw_samples = raw_samples
+        self.bounds = torch.stack([torch.zeros(dimension, dtype=torch.double), torch.ones(dimension, dtype=torch.double)])
+        self.sobol = SobolEngine(dimension, scramble=True)
+        self.num_mean_restarts = num_mean_restarts
+        self.num_fantasies = min_fantasies
+        self.time_per_fantasy = None
+        self.argmax_pmean = None
+        self.one_dimensional = one_dimensional
+        self.grid = torch.linspace(0, 1, num_grid_points, dtype=torch.double).unsqueeze(-1)
+        self.batch_size = batch_size
+
+    #The maximizer of the posterior mean in the unit cube and its value, started at the maximizer of the previous
+    #iteration and the best trial.
+    def max_posterior_mean(self, gp):
+        train_x = gp.train_inputs[0]
+        if getattr(gp, "input_transform", None) is not None:
+            train_x = gp.input_transform.untransform(train_x)
+        starts = [train_x[gp.train_targets.argmax()].unsqueeze(0)]
+        if self.argmax_pmean is not None:
+            starts.append(self.argmax_pmean)
+        starts.append(self.sobol.draw(self.num_mean_restarts, dtype=torch.double))
+        starts = torch.cat(starts).unsqueeze(-2)
+        argmax_pmean, max_pmean = optimize_acqf(
+            acq_function=PosteriorMean(gp),
+            bounds=self.bounds,
+            q=1,
+            num_restarts=starts.shape[0],
+            batch_initial_conditions=starts,
+        )
+        self.argmax_pmean = argmax_pmean.detach()
+        return argmax_pmean, max_pmean
+
+    #Discrete KG of the query points x (a tensor of n inputs in [0,1]) with the fantasies z.
+    def discrete_values(self, gp, x, z):
+        values = []
+        for batch in x.split(self.batch_size):
+            points = torch.cat([self.grid, batch.unsqueeze(-1)])
+            with torch.no_grad():
+                posterior = gp.posterior(points)
+                noisy_variance = gp.posterior(batch.unsqueeze(-1), observation_noise=True).variance.squeeze(-1)
+            mean = posterior.mean.squeeze(-1)
+            covariance = posterior.distribution.covariance_matrix
+            m = self.grid.shape[0]
+            sigma = covariance[:, m:]/noisy_variance.sqrt()
+            grid_max = (mean[:m, None, None] + sigma[:m, None, :]*z[:, None]).max(dim=0).values
+            own = mean[m:] + sigma[m:].diagonal()*z[:, None]
+            current_value = torch.maximum(mean[:m].max(), mean[m:])
+            values.append(torch.maximum(grid_max, own).mean(dim=0) - current_value)
+        return torch.cat(values)
+
+    #Returns the next query point and its KG value.
+    def next_candidate(self, gp):
+        start = time.perf_counter()
+        if self.one_dimensional:
+            kg_start = start
+            z = torch.distributions.Normal(0, 1).icdf((torch.arange(self.num_fantasies, dtype=torch.double) + 0.5)/self.num_fantasies)
+            best_x, best_value = maximize_1d(lambda x: self.discrete_values(gp, x, z))
+            candidate = torch.tensor([[best_x]], dtype=torch.double)
+            acq_value = torch.tensor(best_value, dtype=torch.double)
+        else:
+            argmax_pmean, max_pmean = self.max_posterior_mean(gp)
+            kg_start = time.perf_counter()
+            acq_fct = qKnowledgeGradient(model=gp, num_fantasies=self.num_fantasies, current_value=max_pmean)
+            candidate, acq_value = optimize_acqf(
+                acq_function=acq_fct,
+                bounds=self.bounds,
+                q=1,
+                num_restarts=self.num_restarts,
+                raw_samples=self.raw_samples,
+            )
+        end = time.perf_counter()
+
+        #The time of the posterior mean is taken off the budget, the rest is shared by the fantasies
+        time_per_fantasy = (end - kg_start)/self.num_fantasies
+        if self.time_per_fantasy is None:
+            self.time_per_fantasy = time_per_fantasy
+        else:
+            self.time_per_fantasy = (self.time_per_fantasy + time_per_fantasy)/2
+        remaining_budget = self.time_budget - (kg_start - start)
+        self.num_fantasies = int(min(max(remaining_budget/self.time_per_fantasy, self.min_fantasies), self.max_fantasies))
+        return candidate, acq_value
@@ -0,0 +1,32 @@
+import numpy as np
+
+"""
+This is a file to reduce the z-components of the geometry field in the callbacks of the settings files.
+The nodes are numbered layer by layer along z, so the values of one output step form a (number of layers) x (nodes per
+layer) array. The functions work on a view of the values buffer instead of looping over the nodes.
+"""
+
+
+#Returns the values of the geometry in z-direction as a (number of layers) x (nodes per layer) array. If the values are
+#already a numpy array, this is a view without copying.
+def z_layers(z_values, nodes_per_layer):
+    return np.asarray(z_values, dtype=float).reshape(-1, nodes_per_layer)
+
+
+#Returns the length of the muscle, i.e. the distance between the average z of the bottom and the top layer of nodes.
+def muscle_length(z_values, nodes_per_layer):
+    layers = z_layers(z_values, nodes_per_layer)
+    return abs(layers[-1].mean() - layers[0].mean())
+
+
+#Returns the average z of every layer of nodes and the spread of z within every layer.
+def layer_statistics(z_values, nodes_per_layer):
+    layers = z_layers(z_values, nodes_per_layer)
+    return layers.mean(axis=1), layers.std(axis=1)
+
+
+#Returns the length profile of the muscle along z, i.e. the distance of every layer of nodes from the bottom layer. The
+#last entry is the length of the muscle.
+def length_profile(z_values, nodes_per_layer):
+    layer_means = z_layers(z_values, nodes_per_layer).mean(axis=1)
+    return np.abs(layer_means - layer_means[0])
@@ -0,0 +1,59 @@
+import math
+import torch
+
+"""
+This is a file to maximize an acquisition function of a single input in [0,1], e.g. the normalized force.
+Instead of many restarts of a gradient based optimizer, the function is evaluated on a dense grid at once, and the best
+local maxima of the grid are refined with a golden section search between their neighbors on the grid. The searches of
+all maxima are carried out together, so every step evaluates the function once for all of them, which is faster than
+Brent's method for each maximum one after the other. In one dimension, this finds the global maximum up to the
+tolerance as long as no maximum is narrower than the spacing of the grid.
+maximize_1d takes a vectorized function, which gets a tensor of n inputs and returns n values, so it can be used for
+quantities that are no botorch acquisition function, e.g. the discrete KG of kg_engine.py. optimize_acqf_1d does the
+same for a botorch acquisition function and returns the same as optimize_acqf with q=1.
+"""
+
+inverse_golden_ratio = (math.sqrt(5) - 1)/2
+
+
+#Returns the maximizer of f in [0,1] and its value as floats.
+def maximize_1d(f, num_points=1001, num_maxima=3, tolerance=1e-6):
+    x = torch.linspace(0, 1, num_points, dtype=torch.double)
+    values = f(x)
+    #Indices of the local maxima of the grid, the bounds included
+    padded = torch.cat([values.new_full((1,), -float("inf")), values, values.new_full((1,), -float("inf"))])
+    is_maximum = (values >= padded[:-2]) & (values >= padded[2:])
+    maxima = is_maximum.nonzero().squeeze(-1)
+    maxima = maxima[values[maxima].argsort(descending=True)[:num_maxima]]
+
+    #Golden section search between the neighbors of all maxima at the same time: the bracket [lower, upper] contains
+    #the inner points c < d, and the part beyond the lower one of them is cut off in every step.
+    lower = x[(maxima - 1).clamp_min(0)]
+    upper = x[(maxima + 1).clamp_max(num_points - 1)]
+    c = upper - inverse_golden_ratio*(upper - lower)
+    d = lower + inverse_golden_ratio*(upper - lower)
+    f_c, f_d = f(c), f(d)
+    while (upper - lower).max() > tolerance:
+        left = f_c > f_d
+        upper = torch.where(left, d, upper)
+        lower = torch.where(left, lower, c)
+        new = torch.where(left, upper - inverse_golden_ratio*(upper - lower), lower + inverse_golden_ratio*(upper - lower))
+        f_new = f(new)
+        c, f_c, d, f_d = (torch.where(left, new, d), torch.where(left, f_new, f_d),
+                          torch.where(left, c, new), torch.where(left, f_c, f_new))
+
+    points = torch.cat([x[maxima], c, d])
+    point_values = torch.cat([values[maxima], f_c, f_d])
+    best = point_values.argmax()
+    return points[best].item(), point_values[best].item()
+
+
+#Maximizes a botorch acquisition function of one input and returns the candidate (1 x 1) and its value like
+#optimize_acqf.
+def optimize_acqf_1d(acq_function, num_points=1001, num_maxima=3, tolerance=1e-6, batch_size=256):
+    def f(x):
+        with torch.no_grad():
+            return torch.cat([acq_function(batch.reshape(-1, 1, 1)) for batch in x.split(batch_size)])
+
+    best_x, best_value = maximize_1d(f, num_points, num_maxima, tolerance)
+    return torch.tensor([[best_x]], dtype=torch.double), torch.tensor(best_value, dtype=torch.double)
@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+"""
+This is a file to evaluate several query points at the same time.
+Every OpenDiHu simulation runs in its own process, so a pool of threads that only wait for their child processes is
+enough to keep several cores busy. The number of workers is bounded by the number of query points and by the number of
+cores of the machine.
+evaluate_in_parallel evaluates a fixed batch of inputs, AsynchronousEvaluator accepts new inputs whenever a worker is free.
+"""
+
+def number_of_workers(num_workers, num_tasks):
+    if num_workers is None:
+        num_workers = num_tasks
+    return max(1, min(num_workers, num_tasks, os.cpu_count() or 1))
+
+
+#Calls function for every input in a bounded worker pool. The pairs (index of the input, result) are yielded in the order
+#in which the evaluations finish, so the results can be processed while the slower evaluations are still running.
+def evaluate_in_parallel(function, inputs, num_workers=None):
+    inputs = list(inputs)
+    if len(inputs) == 0:
+        return
+    with ThreadPoolExecutor(max_workers=number_of_workers(num_workers, len(inputs))) as executor:
+        futures = {executor.submit(function, x): index for index, x in enumerate(inputs)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+#Keeps up to num_workers evaluations running. New inputs can be submitted at any time, e.g. as soon as an evaluation has
+#finished, so the workers don't idle until the slowest evaluation of a batch is done.
+class AsynchronousEvaluator:
+    def __init__(self, function, num_workers):
+        self.function = function
+        self.num_workers = number_of_workers(num_workers, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        self.pending = {}
+
+    def submit(self, x):
+        self.pending[self.executor.submit(self.function, x)] = x
+
+    def pending_inputs(self):
+        return list(self.pending.values())
+
+    def has_free_worker(self):
+        return len(self.pending) < self.num_workers
+
+    #Blocks until at least one evaluation has finished and returns the pairs (input, result) of all finished ones.
+    def wait_for_results(self):
+        done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+        return [(self.pending.pop(future), future.result()) for future in done]
+
+    #Waits for all evaluations that are still running and returns their pairs (input, result).
+    def finish(self):
+        results = []
+        while len(self.pending) > 0:
+            results += self.wait_for_results()
+        self.executor.shutdown()
+        return results
@@ -0,0 +1,36 @@
+import torch
+
+"""
+This is a file to evaluate the posterior of a GP on the grid of query points that is plotted and stored in the results
+store.
+A PosteriorGrid is only a view: the posterior is computed when mean or stddev are used for the first time, e.g. for a
+plot, a stopping criterion or the results store, and then kept. If visualize is off, nothing is computed during the loop.
+The posterior is computed without gradients from the GP after the update (or refit) with the trial of the iteration,
+i.e. not from the GP the acquisition function of the iteration was optimized with, so no prediction caches are shared
+with it and the caches of the training covariance are built for the grid.
+"""
+
+
+class PosteriorGrid:
+    def __init__(self, gp, x):
+        self.gp = gp
+        self.x = x
+        self.computed = False
+
+    def compute(self):
+        if not self.computed:
+            with torch.no_grad():
+                posterior = self.gp.posterior(self.x)
+                self.mean_tensor = posterior.mean.squeeze(-1)
+                self.stddev_tensor = posterior.variance.squeeze(-1).sqrt()
+            self.computed = True
+
+    @property
+    def mean(self):
+        self.compute()
+        return self.mean_tensor.numpy()
+
+    @property
+    def stddev(self):
+        self.compute()
+        return self.stddev_tensor.numpy()
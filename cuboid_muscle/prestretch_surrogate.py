@@ -0,0 +1,48 @@
+import numpy as np
+import simulation_cache
+
+"""
+This is a surrogate model of the relative prestretch depending on the force, built from all prestretch-only runs that are
+stored in the simulation cache.
+Below tearing, the muscle gets longer the more it is pulled, so the relative prestretch is fitted with isotonic
+regression (pool adjacent violators), i.e. the best non-decreasing fit of the stored values. The inverse of the fit, a
+piecewise linear interpolation, gives the force for a certain relative prestretch without a simulation. A simulation is
+only needed to confirm this force.
+"""
+
+kind = "incompressible_mooney_rivlin_prestretch_only"
+
+
+#Pool adjacent violators: returns the non-decreasing sequence with the least squared distance to values.
+def isotonic_fit(values):
+    blocks = [] #[mean, number of values]
+    for value in values:
+        blocks.append([value, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean, number = blocks.pop()
+            blocks[-1][0] = (blocks[-1][0]*blocks[-1][1] + mean*number) / (blocks[-1][1] + number)
+            blocks[-1][1] += number
+    return np.repeat([mean for mean, number in blocks], [number for mean, number in blocks])
+
+
+#Returns the stored forces and the isotonic fit of their relative prestretches, both sorted by force.
+def fit(settings_hash):
+    stored = simulation_cache.entries(kind, settings_hash)
+    forces = np.array([force for force, result in stored])
+    relative_prestretches = np.array([result["relative_prestretch"] for force, result in stored])
+    return forces, isotonic_fit(relative_prestretches)
+
+
+#Returns the force that leads to the relative prestretch target according to the surrogate, or None if target is outside
+#of the range of the stored runs (then the curve has to be extended by simulations first).
+def force_for_relative_prestretch(settings_hash, target):
+    forces, fitted = fit(settings_hash)
+    if len(forces) < 2 or target < fitted[0] or target > fitted[-1]:
+        return None
+    #On flat parts of the fit, the middle of the flat part is taken
+    first = np.searchsorted(fitted, target, side="left")
+    last = np.searchsorted(fitted, target, side="right")
+    if first < last:
+        return (forces[first] + forces[last-1]) / 2
+    weight = (target - fitted[first-1]) / (fitted[first] - fitted[first-1])
+    return forces[first-1] + weight*(forces[first] - forces[first-1])
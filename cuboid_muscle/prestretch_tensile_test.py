@@ -15,6 +15,10 @@ sys.path.insert(0, var_path)
 
 import variables
 
+sys.path.insert(0, script_path)
+import result_channel
+import muscle_geometry
+
 n_ranks = (int)(sys.argv[-1])
 
 print(sys.argv)
@@ -101,38 +105,22 @@ traction_vector = [0, 0, force]     # the traction force in specified in the ref
 
 elasticity_neumann_bc = [{"element": k*nx*ny + j*nx + i, "constantVector": traction_vector, "face": "2+"} for j in range(ny) for i in range(nx)]
 
+# The muscle lengths are recorded in memory and written as a binary file at the end, see result_channel.py
+muscle_lengths_prestretch = result_channel.LengthRecord("muscle_length_prestretch", individuality_parameter, 2)
+
 # callback for result
 def handle_result_hyperelasticity(result):
   data = result[0]
 
-  number_of_nodes = mx * my
-  average_z_start = 0
-  average_z_end = 0
-
   z_data = data["data"][0]["components"][2]["values"]
-
-  for i in range(number_of_nodes):
-    average_z_start += z_data[i]
-    average_z_end += z_data[number_of_nodes*(mz -1) + i]
-
-  average_z_start /= number_of_nodes
-  average_z_end /= number_of_nodes
-
-  length_of_muscle = np.abs(average_z_end - average_z_start)
+  length_of_muscle = muscle_geometry.muscle_length(z_data, mx * my)
   print("length of muscle: ", length_of_muscle)
 
-  if data["timeStepNo"] == 0:
-    f = open("muscle_length_prestretch"+individuality_parameter+".csv", "w")
-    f.write(str(length_of_muscle))
-    f.write(",")
-    f.close()
-  else:
-    f = open("muscle_length_prestretch"+individuality_parameter+".csv", "a")
-    f.write(str(length_of_muscle))
-    f.write(",")
-    f.close()
+  muscle_lengths_prestretch.append(length_of_muscle)
   
   if data["timeStepNo"] == 1:
+    muscle_lengths_prestretch.write()
+
     field_variables = data["data"]
     
     strain = max(field_variables[1]["components"][2]["values"])
@@ -0,0 +1,44 @@
+import numpy as np
+import simulation_cache
+import results_store
+
+"""
+This is a file to reuse the trials of earlier BO runs as initial training data of a new run.
+The trials are read from the results store of earlier runs (see results_store.py) and from the simulation cache. Every
+run is stored together with the hash of its settings, and only the trials of runs whose hash is the same as the current
+one are used, since the contraction of a force changes with the settings. The entries of the simulation cache are stored
+together with their settings hash anyway.
+Trials outside of the bounds of the new run are left out, and trials whose forces differ by at most a tolerance are only
+used once.
+"""
+
+
+#Returns the trials of all earlier runs that were computed with the given settings as a list of (force, contraction,
+#fidelity). Trials of runs with further parameters than the force are left out.
+def trials_from_results_store(settings_hash):
+    return results_store.trials_with_settings(settings_hash)
+
+
+#Returns the trials in the simulation cache for the given fidelities that were computed with the given settings.
+def trials_from_cache(kind, settings_hash, fidelities):
+    trials = []
+    for fidelity in fidelities:
+        fidelity_kind = kind if fidelity == 1.0 else kind + "_fidelity_" + str(fidelity)
+        for force, result in simulation_cache.entries(fidelity_kind, settings_hash):
+            trials.append((force, result["contraction"], fidelity))
+    return trials
+
+
+#Returns the trials as arrays of forces, contractions and fidelities, without trials outside of [lower_bound,
+#upper_bound] and without trials whose force differs by at most tolerance from the one of an earlier trial with the
+#same fidelity.
+def combine(trials, lower_bound, upper_bound, tolerance):
+    trials = [trial for trial in trials if lower_bound <= trial[0] <= upper_bound and np.isfinite(trial[1])]
+    if len(trials) == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    forces, contractions, fidelities = np.array(trials).T
+    order = np.lexsort((forces, fidelities))
+    forces, contractions, fidelities = forces[order], contractions[order], fidelities[order]
+    duplicate = np.zeros(len(forces), dtype=bool)
+    duplicate[1:] = (np.diff(forces) <= tolerance) & (fidelities[1:] == fidelities[:-1])
+    return forces[~duplicate], contractions[~duplicate], fidelities[~duplicate]
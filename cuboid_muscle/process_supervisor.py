@@ -0,0 +1,92 @@
+import os
+import time
+import atexit
+import signal
+import resource
+import threading
+import subprocess
+from collections import namedtuple
+
+"""
+This is a file to run the OpenDiHu binaries under supervision.
+Every run gets its own process group, so if it exceeds its timeout, the solver is killed together with all processes it
+started (e.g. MPI ranks) instead of being left running in the background. Optionally, the address space and the CPU
+time of a run are limited, and failed runs are started again.
+Nothing here relies on signals in the calling process, so run() can be called from worker threads and pools. Process
+groups that are still running when python exits are killed as well.
+"""
+
+#This is what run() returns. returncode is None if the last attempt timed out.
+RunResult = namedtuple("RunResult", ["returncode", "timed_out", "attempts", "duration"])
+
+kill_grace_period = 5 #seconds between SIGTERM and SIGKILL
+
+running = set()
+running_lock = threading.Lock()
+
+
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(timeout=kill_grace_period)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+@atexit.register
+def kill_all():
+    with running_lock:
+        processes = list(running)
+    for process in processes:
+        kill_process_group(process)
+
+
+#The limits are set from outside with prlimit, since a preexec_fn is not safe to use when there are other threads. The
+#process runs without them for the moment between Popen and this call, and if it has already exited, there is nothing
+#left to limit.
+def set_limits(pid, memory_limit, cpu_time_limit):
+    try:
+        if memory_limit is not None:
+            resource.prlimit(pid, resource.RLIMIT_AS, (memory_limit, memory_limit))
+        if cpu_time_limit is not None:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_time_limit, cpu_time_limit))
+    except ProcessLookupError:
+        pass
+
+
+#Runs command (a list of arguments) and waits for it at most timeout seconds. memory_limit is given in bytes,
+#cpu_time_limit in seconds. A run that fails with a non-zero return code is repeated up to retries times, a run that
+#timed out only if retry_on_timeout is True. env is the environment of the run, None means the one of python.
+def run(command, timeout=None, retries=0, retry_on_timeout=False, memory_limit=None, cpu_time_limit=None, cwd=None,
+        env=None):
+    starting_time = time.time()
+    attempts = 0
+    while True:
+        attempts += 1
+        process = subprocess.Popen(command, cwd=cwd, env=env, start_new_session=True)
+        with running_lock:
+            running.add(process)
+        try:
+            set_limits(process.pid, memory_limit, cpu_time_limit)
+            returncode = process.wait(timeout=timeout)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            print("Run exceeded its timeout of", timeout, "seconds, killing", command[0])
+            kill_process_group(process)
+            returncode = None
+            timed_out = True
+        finally:
+            with running_lock:
+                running.discard(process)
+
+        if returncode == 0 or attempts > retries or (timed_out and not retry_on_timeout):
+            return RunResult(returncode, timed_out, attempts, time.time() - starting_time)
+        print("Run of", command[0], "failed, starting attempt", attempts + 1)
@@ -0,0 +1,56 @@
+import os
+import atexit
+import numpy as np
+
+"""
+This is a file to pass the muscle lengths from the callbacks of the settings files to BayesOpt.py.
+The callbacks record one value per time step in a preallocated NumPy array instead of appending to a CSV file, and the
+record is written once as a binary .npy file at the end of the run (or when the process exits). The driver maps the
+file into memory with read() instead of parsing text.
+"""
+
+records = []
+
+
+class LengthRecord:
+    def __init__(self, name, individuality_parameter, capacity):
+        self.path = name + individuality_parameter + ".npy"
+        self.values = np.empty(capacity)
+        self.count = 0
+        self.written = False
+        records.append(self)
+        atexit.register(self.write)
+
+    def append(self, value):
+        if self.count == len(self.values):
+            self.values = np.resize(self.values, 2*len(self.values))
+        self.values[self.count] = value
+        self.count += 1
+
+    #The recorded values so far, as a view without copying.
+    def recorded(self):
+        return self.values[:self.count]
+
+    #Writes the record into a temporary file first, so a reader never sees a partially written record.
+    def write(self):
+        if self.written:
+            return
+        with open(self.path + ".tmp", "wb") as f:
+            np.save(f, self.recorded())
+        os.replace(self.path + ".tmp", self.path)
+        self.written = True
+
+
+#Writes every record that is not written yet, e.g. before the process is ended with os._exit, which skips the atexit
+#handlers.
+def write_all():
+    for record in records:
+        record.write()
+
+
+def read(name, individuality_parameter):
+    return np.load(name + individuality_parameter + ".npy", mmap_mode="r")
+
+
+def remove(name, individuality_parameter):
+    os.remove(name + individuality_parameter + ".npy")
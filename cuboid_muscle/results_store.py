@@ -0,0 +1,247 @@
+import sys
+import json
+import time
+import sqlite3
+import numpy as np
+
+"""
+This is a file to store the results of BO runs in an SQLite database (BayesOpt_results.sqlite in build_release), instead
+of one BayesOpt_outputs*.csv file per run and the list of runs in BayesOpt_global_individuality_parameters.csv.
+There are three tables:
+runs: one row per run with its individuality parameter (the options of the run, e.g. "_matern_2.5_const_fixed_noise_EI_
+    stopping_xy"), the script that carried it out, the hash of the settings of the simulation, the seed and, once the
+    run is finished, the number of trials, the maximizer, the best value and the time the run took.
+trials: the query points of a run in the order in which they were evaluated, the force (or x of a test function), the
+    result, the fidelity and the further parameters of a multi-dimensional run as JSON (NULL if there are none).
+posteriors: snapshots of the posterior mean and standard deviation of a run on the grid x, stored as arrays of doubles.
+The runs are indexed by their individuality parameter and by their settings hash, so the runs of a configuration and the
+trials of earlier runs with the same settings are found without reading all files.
+The database is in WAL mode and every write is a transaction of its own, so several BO runs or evaluation workers can
+write at the same time. A run gets its run_id from the database when it starts, so concurrent runs can't get the same
+one.
+The database can be inspected from the command line, go to build_release and run:
+>python ../results_store.py info
+>python ../results_store.py runs _matern_2.5_const_fixed_noise_EI_stopping_xy
+"""
+
+database = "BayesOpt_results.sqlite"
+
+
+def connect():
+    connection = sqlite3.connect(database, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript("""CREATE TABLE IF NOT EXISTS runs (
+                                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                    individuality_parameter TEXT NOT NULL,
+                                    script TEXT NOT NULL,
+                                    settings_hash TEXT,
+                                    seed INTEGER,
+                                    started REAL NOT NULL,
+                                    finished REAL,
+                                    number_of_trials INTEGER,
+                                    maximizer REAL,
+                                    maximizer_parameters TEXT,
+                                    best_y REAL,
+                                    time REAL);
+                                CREATE INDEX IF NOT EXISTS runs_individuality_parameter
+                                    ON runs (individuality_parameter);
+                                CREATE INDEX IF NOT EXISTS runs_settings_hash ON runs (settings_hash);
+                                CREATE TABLE IF NOT EXISTS trials (
+                                    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+                                    trial_no INTEGER NOT NULL,
+                                    x REAL NOT NULL,
+                                    y REAL NOT NULL,
+                                    fidelity REAL NOT NULL,
+                                    parameters TEXT,
+                                    PRIMARY KEY (run_id, trial_no));
+                                CREATE TABLE IF NOT EXISTS posteriors (
+                                    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+                                    snapshot_no INTEGER NOT NULL,
+                                    x BLOB NOT NULL,
+                                    mean BLOB NOT NULL,
+                                    stddev BLOB NOT NULL,
+                                    created REAL NOT NULL,
+                                    PRIMARY KEY (run_id, snapshot_no));""")
+    return connection
+
+
+def to_blob(values):
+    return np.ascontiguousarray(values, dtype=np.float64).tobytes()
+
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype=np.float64)
+
+
+#Inserts the trials (a list of (x, y, fidelity, parameters)) after the last trial of the run.
+def insert_trials(connection, run_id, trials):
+    first = connection.execute("SELECT COALESCE(MAX(trial_no) + 1, 0) FROM trials WHERE run_id = ?",
+                               (run_id,)).fetchone()[0]
+    connection.executemany("INSERT INTO trials VALUES (?, ?, ?, ?, ?, ?)",
+                           [(run_id, first + k, float(x), float(y), float(fidelity),
+                             json.dumps(parameters) if parameters else None)
+                            for k, (x, y, fidelity, parameters) in enumerate(trials)])
+
+
+def insert_posterior(connection, run_id, x, mean, stddev):
+    snapshot_no = connection.execute("SELECT COALESCE(MAX(snapshot_no) + 1, 0) FROM posteriors WHERE run_id = ?",
+                                     (run_id,)).fetchone()[0]
+    connection.execute("INSERT INTO posteriors VALUES (?, ?, ?, ?, ?, ?)",
+                       (run_id, snapshot_no, to_blob(x), to_blob(mean), to_blob(stddev), time.time()))
+
+
+#Registers a new run and returns its run_id.
+def start_run(individuality_parameter, script, settings_hash=None, seed=None):
+    connection = connect()
+    try:
+        with connection:
+            cursor = connection.execute("""INSERT INTO runs (individuality_parameter, script, settings_hash, seed,
+                                           started) VALUES (?, ?, ?, ?, ?)""",
+                                        (individuality_parameter, script, settings_hash, seed, time.time()))
+    finally:
+        connection.close()
+    return cursor.lastrowid
+
+
+def add_trial(run_id, x, y, fidelity=1.0, parameters=None):
+    connection = connect()
+    try:
+        with connection:
+            insert_trials(connection, run_id, [(x, y, fidelity, parameters)])
+    finally:
+        connection.close()
+
+
+#Removes the trials of a run, e.g. before the trials of a checkpoint are stored again when a run is resumed.
+def clear_trials(run_id):
+    connection = connect()
+    try:
+        with connection:
+            connection.execute("DELETE FROM trials WHERE run_id = ?", (run_id,))
+    finally:
+        connection.close()
+
+
+def add_posterior(run_id, x, mean, stddev):
+    connection = connect()
+    try:
+        with connection:
+            insert_posterior(connection, run_id, x, mean, stddev)
+    finally:
+        connection.close()
+
+
+#Stores the result of a finished run together with the posterior on the grid x.
+def finish_run(run_id, number_of_trials, maximizer, best_y, elapsed_time, x, mean, stddev, maximizer_parameters=None):
+    connection = connect()
+    try:
+        with connection:
+            insert_posterior(connection, run_id, x, mean, stddev)
+            connection.execute("""UPDATE runs SET finished = ?, number_of_trials = ?, maximizer = ?,
+                                  maximizer_parameters = ?, best_y = ?, time = ? WHERE run_id = ?""",
+                               (time.time(), int(number_of_trials), float(maximizer),
+                                json.dumps(maximizer_parameters) if maximizer_parameters else None, float(best_y),
+                                float(elapsed_time), run_id))
+    finally:
+        connection.close()
+
+
+#Stores complete runs of the test functions (BayesOptResults of BayesOpt_test_functions.py) in one transaction and
+#returns their run_ids. seeds is a list with the seed of every run, or None.
+def store_results(results, script, seeds=None):
+    if seeds is None:
+        seeds = [None]*len(results)
+    now = time.time()
+    run_ids = []
+    connection = connect()
+    try:
+        with connection:
+            for result, seed in zip(results, seeds):
+                cursor = connection.execute("""INSERT INTO runs (individuality_parameter, script, seed, started,
+                                               finished, number_of_trials, maximizer, best_y, time)
+                                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                            (result.individuality_parameter, script, seed, now - result.time, now,
+                                             int(result.number_of_trials), float(result.maximizer),
+                                             float(result.best_y), float(result.time)))
+                run_id = cursor.lastrowid
+                insert_trials(connection, run_id, [(x, y, 1.0, None) for x, y in zip(result.trials_x, result.trials_y)])
+                insert_posterior(connection, run_id, result.x, result.mean, result.stddev)
+                run_ids.append(run_id)
+    finally:
+        connection.close()
+    return run_ids
+
+
+def store_result(result, script, seed=None):
+    return store_results([result], script, [seed])[0]
+
+
+#Returns the runs as a list of dicts, optionally only the ones with the given individuality parameter or settings hash,
+#the latest run last.
+def runs(individuality_parameter=None, settings_hash=None):
+    conditions, arguments = [], []
+    if individuality_parameter is not None:
+        conditions.append("individuality_parameter = ?")
+        arguments.append(individuality_parameter)
+    if settings_hash is not None:
+        conditions.append("settings_hash = ?")
+        arguments.append(settings_hash)
+    connection = connect()
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute("SELECT * FROM runs" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+                                  + " ORDER BY run_id", arguments).fetchall()
+    finally:
+        connection.close()
+    return [dict(row) for row in rows]
+
+
+#Returns the trials of a run as a list of (x, y, fidelity, parameters) in the order in which they were evaluated.
+def trials(run_id):
+    connection = connect()
+    try:
+        rows = connection.execute("SELECT x, y, fidelity, parameters FROM trials WHERE run_id = ? ORDER BY trial_no",
+                                  (run_id,)).fetchall()
+    finally:
+        connection.close()
+    return [(x, y, fidelity, json.loads(parameters) if parameters else None) for x, y, fidelity, parameters in rows]
+
+
+#Returns the trials (x, y, fidelity) of all runs with the given settings hash that have no further parameters.
+def trials_with_settings(settings_hash):
+    connection = connect()
+    try:
+        rows = connection.execute("""SELECT trials.x, trials.y, trials.fidelity FROM trials JOIN runs USING (run_id)
+                                     WHERE runs.settings_hash = ? AND trials.parameters IS NULL
+                                     ORDER BY trials.run_id, trials.trial_no""", (settings_hash,)).fetchall()
+    finally:
+        connection.close()
+    return rows
+
+
+#Returns the last posterior snapshot of a run as (x, mean, stddev), or None if there is none.
+def posterior(run_id):
+    connection = connect()
+    try:
+        row = connection.execute("""SELECT x, mean, stddev FROM posteriors WHERE run_id = ?
+                                    ORDER BY snapshot_no DESC LIMIT 1""", (run_id,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    return tuple(from_blob(blob) for blob in row)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "runs":
+        for run in runs(sys.argv[2]):
+            print(run["run_id"], run["script"], "trials:", run["number_of_trials"], "maximizer:", run["maximizer"],
+                  "best value:", run["best_y"], "time:", run["time"])
+    else:
+        connection = connect()
+        for individuality_parameter, number, finished in connection.execute(
+                """SELECT individuality_parameter, COUNT(*), COUNT(finished) FROM runs
+                   GROUP BY individuality_parameter ORDER BY individuality_parameter"""):
+            print(individuality_parameter, ":", number, "runs,", finished, "finished")
+        connection.close()
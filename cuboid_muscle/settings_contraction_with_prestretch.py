@@ -2,7 +2,8 @@
 # - Isotropic hyperelastic material
 # - Linear elasticity
 #
-# arguments: <scenario_name> <force> <individuality_parameter>
+# arguments: <scenario_name> <force> <individuality_parameter> [<fidelity>]
+# The optional fidelity (1.0 by default) is read in variables/variables.py and coarsens the model if it is smaller than 1.
 
 
 import numpy as np
@@ -15,6 +16,13 @@ sys.path.insert(0, var_path)
 
 import variables
 
+sys.path.insert(0, script_path)
+import simulation_cache
+import result_channel
+import muscle_geometry
+import config_cache
+import design_space
+
 n_ranks = (int)(sys.argv[-1])
 
 # parameters
@@ -62,55 +70,60 @@ if len(sys.argv) > 4:
 else:
   individuality_parameter = str(time.time())
 
-nx, ny, nz = 3, 3, 12                     # number of elements
+nx, ny, nz = variables.el_x, variables.el_y, variables.el_z # number of elements
 mx, my, mz = 2*nx+1, 2*ny+1, 2*nz+1 # quadratic basis functions
 
-fb_x, fb_y = 10, 10         # number of fibers
+fb_x, fb_y = variables.fb_x, variables.fb_y # number of fibers
 fb_points = 100             # number of points per fiber
 fiber_direction = [0, 0, 1] # direction of fiber in element
 
 def get_fiber_no(fiber_x, fiber_y):
     return fiber_x + fiber_y*fb_x
 
-meshes = { # create 3D mechanics mesh
-    "3Dmesh_quadratic": { 
-      "inputMeshIsGlobal":          True,                       # boundary conditions are specified in global numberings, whereas the mesh is given in local numberings
-      "nElements":                  [nx, ny, nz],               # number of quadratic elements in x, y and z direction
-      "physicalExtent":             physical_extent,            # physical size of the box
-      "physicalOffset":             [0, 0, 0],                  # offset/translation where the whole mesh begins
-    },
-}
-
-for fiber_x in range(fb_x):
-    for fiber_y in range(fb_y):
-        fiber_no = get_fiber_no(fiber_x, fiber_y)
-        x = nx * fiber_x / (fb_x - 1)
-        y = ny * fiber_y / (fb_y - 1)
-        nodePositions = [[x, y, nz * i / (fb_points - 1)] for i in range(fb_points)]
-        meshName = "fiber{}".format(fiber_no)
-        meshes[meshName] = { # create fiber meshes
-            "nElements":            [fb_points - 1],
-            "nodePositions":        nodePositions,
-            "inputMeshIsGlobal":    True,
-            "nRanks":               n_ranks
-        }
+def create_meshes():
+  meshes = { # create 3D mechanics mesh
+      "3Dmesh_quadratic": { 
+        "inputMeshIsGlobal":          True,                       # boundary conditions are specified in global numberings, whereas the mesh is given in local numberings
+        "nElements":                  [nx, ny, nz],               # number of quadratic elements in x, y and z direction
+        "physicalExtent":             physical_extent,            # physical size of the box
+        "physicalOffset":             [0, 0, 0],                  # offset/translation where the whole mesh begins
+      },
+  }
+
+  node_positions = np.zeros((fb_points, 3))
+  node_positions[:, 2] = physical_extent[2] * np.arange(fb_points) / (fb_points - 1)
+  for fiber_x in range(fb_x):
+      for fiber_y in range(fb_y):
+          fiber_no = get_fiber_no(fiber_x, fiber_y)
+          node_positions[:, 0] = physical_extent[0] * fiber_x / (fb_x - 1)
+          node_positions[:, 1] = physical_extent[1] * fiber_y / (fb_y - 1)
+          meshName = "fiber{}".format(fiber_no)
+          meshes[meshName] = { # create fiber meshes
+              "nElements":            [fb_points - 1],
+              "nodePositions":        node_positions.tolist(),
+              "inputMeshIsGlobal":    True,
+              "nRanks":               n_ranks
+          }
+  return meshes
 
 # set Dirichlet BC, fix bottom
-elasticity_dirichlet_bc = {}
-k = 0
-
-# fix z value on the whole x-y-plane
-for j in range(my):
+def create_dirichlet_bc():
+  elasticity_dirichlet_bc = {}
+  k = 0
+
+  # fix z value on the whole x-y-plane
+  for j in range(my):
+    for i in range(mx):
+      elasticity_dirichlet_bc[k*mx*my + j*mx + i] = [None,None,0.0,None,None,None]
+
+  # fix left edge 
+  for j in range(my):
+    elasticity_dirichlet_bc[k*mx*my + j*mx + 0][0] = 0.0
+    
+  # fix front edge 
   for i in range(mx):
-    elasticity_dirichlet_bc[k*mx*my + j*mx + i] = [None,None,0.0,None,None,None]
-
-# fix left edge 
-for j in range(my):
-  elasticity_dirichlet_bc[k*mx*my + j*mx + 0][0] = 0.0
-  
-# fix front edge 
-for i in range(mx):
-  elasticity_dirichlet_bc[k*mx*my + 0*mx + i][1] = 0.0
+    elasticity_dirichlet_bc[k*mx*my + 0*mx + i][1] = 0.0
+  return elasticity_dirichlet_bc
        
 # set Neumann BC, set traction at the top
 k = nz-1
@@ -118,39 +131,62 @@ traction_vector = [0, 0, force]     # the traction force in specified in the ref
 
 elasticity_neumann_bc = [{"element": k*nx*ny + j*nx + i, "constantVector": traction_vector, "face": "2+"} for j in range(ny) for i in range(nx)]
 
+# Warm start of the prestretch: the displacements of every prestretch solve are stored in the simulation cache
+# (simulation_cache.sqlite in build_release). The initial guess for this force is interpolated linearly between the stored
+# displacements of the nearest smaller and larger force, so the nonlinear solver starts close to the solution. With
+# no_cache in BayesOpt.py, nothing is read from or written into the cache (see simulation_cache.enabled()).
+prestretch_state_kind = "prestretch_state"
+if variables.fidelity != 1.0:
+  prestretch_state_kind = prestretch_state_kind + "_fidelity_" + str(variables.fidelity)
+prestretch_state_kind = prestretch_state_kind + design_space.suffix(variables.overrides)
+prestretch_state_hash = simulation_cache.settings_hash([os.path.join(script_path, "settings_contraction_with_prestretch.py"),
+                                                        os.path.join(var_path, "variables.py"),
+                                                        "muscle_contraction_with_prestretch"])
+
+# node positions of the undeformed mesh, in the same order as the values of the field variables
+reference_positions = np.array([[physical_extent[0] * i / (mx - 1), physical_extent[1] * j / (my - 1), physical_extent[2] * k / (mz - 1)]
+                                for k in range(mz) for j in range(my) for i in range(mx)])
+
+def warm_start_displacements(force):
+  if not variables.warm_start_prestretch or not simulation_cache.enabled():
+    return None
+  states = simulation_cache.neighbors(prestretch_state_kind, prestretch_state_hash, force, variables.warm_start_max_distance)
+  if len(states) == 0:
+    return None
+  if len(states) == 1:
+    return np.array(states[0][1]["displacements"])
+  (force_below, state_below), (force_above, state_above) = states
+  weight = (force - force_below) / (force_above - force_below)
+  return (1 - weight) * np.array(state_below["displacements"]) + weight * np.array(state_above["displacements"])
+
+initial_displacements = warm_start_displacements(force)
+if initial_displacements is None:
+  initial_displacements = np.zeros((mx*my*mz, 3))
+  warm_started = False
+else:
+  print("warm start of the prestretch from stored displacements")
+  warm_started = True
+
+# The muscle lengths are recorded in memory and written as binary files at the end, see result_channel.py
+muscle_lengths_prestretch = result_channel.LengthRecord("muscle_length_prestretch", individuality_parameter, 2)
+muscle_lengths_contraction = result_channel.LengthRecord("muscle_length_contraction", individuality_parameter, int(round(variables.end_time / variables.dt_3D)) + 1)
+
 # callback for result
 def handle_result_prestretch(result):
   data = result[0]
 
-  number_of_nodes = mx * my
-  average_z_start = 0
-  average_z_end = 0
-
   z_data = data["data"][0]["components"][2]["values"]
-
-  for i in range(number_of_nodes):
-    average_z_start += z_data[i]
-    average_z_end += z_data[number_of_nodes*(mz -1) + i]
-
-  average_z_start /= number_of_nodes
-  average_z_end /= number_of_nodes
-
-  length_of_muscle = np.abs(average_z_end - average_z_start)
+  length_of_muscle = muscle_geometry.muscle_length(z_data, mx * my)
+  if warm_started and data["timeStepNo"] == 0:
+    length_of_muscle = physical_extent[2] # the initial geometry is already stretched, the muscle starts at its reference length
   print("length of muscle (prestretch): ", length_of_muscle)
 
-  if data["timeStepNo"] == 0:
-    f = open("muscle_length_prestretch"+individuality_parameter+".csv", "w")
-    f.write(str(length_of_muscle))
-    f.write(",")
-    f.close()
-  else:
-    f = open("muscle_length_prestretch"+individuality_parameter+".csv", "a")
-    f.write(str(length_of_muscle))
-    f.write(",")
-    f.close()
-  
+  muscle_lengths_prestretch.append(length_of_muscle)
   
   if data["timeStepNo"] == 1:
+    muscle_lengths_prestretch.write()
+    print("length profile along z (prestretch): ", muscle_geometry.length_profile(z_data, mx * my))
+
     field_variables = data["data"]
     
     strain = max(field_variables[1]["components"][2]["values"])
@@ -161,560 +197,601 @@ def handle_result_prestretch(result):
     with open("result.csv","a") as f:
       f.write("{},{},{}\n".format(scenario_name,strain,stress))
 
+    geometry = np.array([data["data"][0]["components"][i]["values"] for i in range(3)]).T
+    if simulation_cache.enabled():
+      simulation_cache.store(prestretch_state_kind, prestretch_state_hash, force, {"displacements": (geometry - reference_positions).tolist()})
+
+
+# Extrapolates the muscle length at end_time, assuming that it approaches its limit exponentially. The changes over the
+# two halves of the window shrink by the factor r, so the remaining change is the sum of the geometric series over the
+# half windows that are left until end_time. Returns None if the length doesn't settle fast enough (r above
+# plateau_max_ratio), then the simulation goes on.
+def extrapolated_muscle_length(lengths, window, remaining_time):
+  length_start = lengths[-window-1]
+  length_middle = lengths[-window//2-1]
+  length_end = lengths[-1]
+  change_first_half = length_middle - length_start
+  change_second_half = length_end - length_middle
+  if change_first_half == 0:
+    return length_end
+  r = change_second_half / change_first_half
+  if r < 0:
+    return length_end
+  if r > variables.plateau_max_ratio:
+    return None
+  remaining_half_windows = remaining_time / (variables.plateau_window / 2)
+  return length_end + change_second_half * r * (1 - r**remaining_half_windows) / (1 - r)
 
 def callback_function_contraction(raw_data):
   t = raw_data[0]["currentTime"]
   if True:
-    number_of_nodes = variables.bs_x * variables.bs_y
-    average_z_start = 0
-    average_z_end = 0
-
     z_data = raw_data[0]["data"][0]["components"][2]["values"]
-
-    for i in range(number_of_nodes):
-      average_z_start += z_data[i]
-      average_z_end += z_data[number_of_nodes*(variables.bs_z -1) + i]
-
-    average_z_start /= number_of_nodes
-    average_z_end /= number_of_nodes
-
-    length_of_muscle = np.abs(average_z_end - average_z_start)
+    length_of_muscle = muscle_geometry.muscle_length(z_data, variables.bs_x * variables.bs_y)
     print("length of muscle (contraction): ", length_of_muscle)
 
-    if t == variables.dt_3D:
-      f = open("muscle_length_contraction"+individuality_parameter+".csv", "w")
-      f.write(str(length_of_muscle))
-      f.write(",")
-      f.close()
-    else:
-      f = open("muscle_length_contraction"+individuality_parameter+".csv", "a")
-      f.write(str(length_of_muscle))
-      f.write(",")
-      f.close()
-
-
-config = {
-  "scenarioName":                 scenario_name,                # scenario name to identify the simulation runs in the log file
-  "logFormat":                    "csv",                        # "csv" or "json", format of the lines in the log file, csv gives smaller files
-  "solverStructureDiagramFile":   "solver_structure.txt",       # output file of a diagram that shows data connection between solvers
-  "mappingsBetweenMeshesLogFile": "mappings_between_meshes_log.txt",    # log file for mappings 
-
-  "Meshes": meshes,
-  "Solvers": {
-    "linearElasticitySolver": {           # solver for linear elasticity
-      "relativeTolerance":  1e-10,
-      "absoluteTolerance":  1e-10,         # 1e-10 absolute tolerance of the residual    ,
-      "maxIterations":      1e4,
-      "solverType":         "gmres",
-      "preconditionerType": "none",
-      "dumpFilename":       "",
-      "dumpFormat":         "matlab",
-    }, 
-    "diffusionSolver": {
-      "solverType":                     "cg",
-      "preconditionerType":             "none",
-      "relativeTolerance":              1e-10,
-      "absoluteTolerance":              1e-10,
-      "maxIterations":                  1e4,
-      "dumpFilename":                   "",
-      "dumpFormat":                     "matlab"
+    muscle_lengths_contraction.append(length_of_muscle)
+    if t >= variables.end_time - variables.dt_3D/2:
+      muscle_lengths_contraction.write()
+
+    # If the muscle length has changed by less than plateau_tolerance over the last plateau_window, the contraction is
+    # determined. The extrapolated final length is written as the last value and the simulation is stopped.
+    window = int(round(variables.plateau_window / variables.dt_3D))
+    lengths = muscle_lengths_contraction.recorded()
+    if t >= variables.plateau_start_time and len(lengths) > window and t < variables.end_time - variables.dt_3D/2:
+      if (lengths[-window-1:].max() - lengths[-window-1:].min()) / lengths[-1] < variables.plateau_tolerance:
+        final_length = extrapolated_muscle_length(lengths, window, variables.end_time - t)
+        if final_length is None:
+          return
+        print("muscle length settled at t = {}, extrapolated final length: {}".format(t, final_length))
+        muscle_lengths_contraction.append(final_length)
+        # OpenDiHu can't be told to end its time loop early, and os._exit skips the atexit handlers and the teardown of
+        # OpenDiHu, so every record is written and the output is flushed before
+        result_channel.write_all()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
+
+
+# The config is built by create_config(). Its force-independent part is cached in build_release/config_cache, so later
+# simulations with the same settings only load it and fill in the force-dependent fields, see config_cache.py
+initial_values_displacements = initial_displacements.tolist()
+force_dependent = {
+  "neumann_bc":                   elasticity_neumann_bc,
+  "initial_values_displacements": initial_values_displacements,
+  "callback_prestretch":          handle_result_prestretch,
+  "callback_contraction":         callback_function_contraction,
+}
+
+def create_config():
+  return {
+    "scenarioName":                 scenario_name,                # scenario name to identify the simulation runs in the log file
+    "logFormat":                    "csv",                        # "csv" or "json", format of the lines in the log file, csv gives smaller files
+    "solverStructureDiagramFile":   "solver_structure.txt",       # output file of a diagram that shows data connection between solvers
+    "mappingsBetweenMeshesLogFile": "mappings_between_meshes_log.txt",    # log file for mappings 
+
+    "Meshes": create_meshes(),
+    "Solvers": {
+      "linearElasticitySolver": {           # solver for linear elasticity
+        "relativeTolerance":  1e-10,
+        "absoluteTolerance":  1e-10,         # 1e-10 absolute tolerance of the residual    ,
+        "maxIterations":      1e4,
+        "solverType":         "gmres",
+        "preconditionerType": "none",
+        "dumpFilename":       "",
+        "dumpFormat":         "matlab",
+      }, 
+      "diffusionSolver": {
+        "solverType":                     "cg",
+        "preconditionerType":             "none",
+        "relativeTolerance":              1e-10,
+        "absoluteTolerance":              1e-10,
+        "maxIterations":                  1e4,
+        "dumpFilename":                   "",
+        "dumpFormat":                     "matlab"
+      },
+      "mechanicsSolver": {
+        "solverType":                     "preonly",
+        "preconditionerType":             "lu",
+        "relativeTolerance":              1e-10,
+        "absoluteTolerance":              1e-10,
+        "maxIterations":                  1e4,
+        "snesLineSearchType":             "l2",
+        "snesRelativeTolerance":          1e-5,
+        "snesAbsoluteTolerance":          1e-5,
+        "snesMaxIterations":              10,
+        "snesMaxFunctionEvaluations":     1e8,
+        "snesRebuildJacobianFrequency":   5,
+        "dumpFilename":                   "",
+        "dumpFormat":                     "matlab"
+      }
     },
-    "mechanicsSolver": {
-      "solverType":                     "preonly",
-      "preconditionerType":             "lu",
-      "relativeTolerance":              1e-10,
-      "absoluteTolerance":              1e-10,
-      "maxIterations":                  1e4,
-      "snesLineSearchType":             "l2",
-      "snesRelativeTolerance":          1e-5,
-      "snesAbsoluteTolerance":          1e-5,
-      "snesMaxIterations":              10,
-      "snesMaxFunctionEvaluations":     1e8,
-      "snesRebuildJacobianFrequency":   5,
-      "dumpFilename":                   "",
-      "dumpFormat":                     "matlab"
-    }
-  },
-
-  "Coupling": {
-    "timeStepWidth": variables.end_time,
-    "endTime": variables.end_time,
-    "connectedSlotsTerm1To2": None,
-    "connectedSlotsTerm2To1": None,
-    "Term1": {
-      "Coupling": {
-            "numberTimeSteps":              1,
-            "logTimeStepWidthAsKey":    "dt_3D",
-            "durationLogKey":           "duration_3D",
-            "connectedSlotsTerm1To2":   {1:2},  # transfer stress to MuscleContractionSolver gamma
-            "connectedSlotsTerm2To1":   None,   # transfer nothing back
-
-            "Term1": { # fibers (FastMonodomainSolver)
-              "MultipleInstances": { 
-                "ranksAllComputedInstances":    list(range(n_ranks)),
-                "nInstances":                   1,
-
-                "instances": [{
-                  "ranks": [0],
-
-                  "StrangSplitting": {
-                    "numberTimeSteps":              1,
-
-                    "logTimeStepWidthAsKey":    "dt_splitting",
-                    "durationLogKey":           "duration_splitting",
-                    "timeStepOutputInterval":   100,
-                    "connectedSlotsTerm1To2":   None,
-                    "connectedSlotsTerm2To1":   None,
-
-                    "Term1": { # reaction term
-                      "MultipleInstances": {
-                        "nInstances":   variables.fb_x * variables.fb_y,
-
-                        "instances": [{
-                          "ranks": [0],
-
-                          "Heun": {
-                            "numberTimeSteps":              1,
-                            "logTimeStepWidthAsKey":    "dt_0D",
-                            "durationLogKey":           "duration_0D",
-                            "timeStepOutputInterval":   100,
-
-                            "initialValues":                [],
-                            "dirichletBoundaryConditions":  {},
-                            "dirichletOutputFilename":      None,
-                            "inputMeshIsGlobal":            True,
-                            "checkForNanInf":               False,
-                            "nAdditionalFieldVariables":    0,
-                            "additionalSlotNames":          [],
-                            "OutputWriter":                 [],
-
-                            "CellML": {
-                              "modelFilename":          variables.input_dir + "hodgkin_huxley-razumova.cellml",
-                              "meshName":               "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)), 
-                              "stimulationLogFilename": "out/" + scenario_name + "stimulation.log",
-
-                              "statesInitialValues":                        [],
-                              "initializeStatesToEquilibrium":              False,
-                              "initializeStatesToEquilibriumTimeStepWidth": 1e-4,
-                              "optimizationType":                           "vc",
-                              "approximateExponentialFunction":             True,
-                              "compilerFlags":                              "-fPIC -O3 -march=native -Wno-deprecated_declarations -shared",
-                              "maximumNumberOfThreads":                     0,
-
-                              "setSpecificStatesCallEnableBegin":       variables.end_time,
-                              "setSpecificStatesCallFrequency":         variables.specific_states_call_frequency,
-                              "setSpecificStatesRepeatAfterFirstCall":  0.01,
-                              "setSpecificStatesFrequencyJitter":       [0] ,
-                              "setSpecificStatesCallInterval":          0,
-                              "setSpecificStatesFunction":              None,
-                              "additionalArgument":                     None, 
-
-                              "mappings": {
-                                ("parameter", 0):               "membrane/i_Stim",
-                                ("parameter", 1):               "Razumova/l_hs",
-                                ("parameter", 2):               ("constant", "Razumova/rel_velo"),
-                                ("connectorSlot", "vm"):        "membrane/V",
-                                ("connectorSlot", "stress"):    "Razumova/activestress",
-                                ("connectorSlot", "alpha"):     "Razumova/activation",
-                                ("connectorSlot", "lambda"):    "Razumova/l_hs",
-                                ("connectorSlot", "ldot"):      "Razumova/rel_velo"
+
+    "Coupling": {
+      "timeStepWidth": variables.end_time,
+      "endTime": variables.end_time,
+      "connectedSlotsTerm1To2": None,
+      "connectedSlotsTerm2To1": None,
+      "Term1": {
+        "Coupling": {
+              "numberTimeSteps":              1,
+              "logTimeStepWidthAsKey":    "dt_3D",
+              "durationLogKey":           "duration_3D",
+              "connectedSlotsTerm1To2":   {1:2},  # transfer stress to MuscleContractionSolver gamma
+              "connectedSlotsTerm2To1":   None,   # transfer nothing back
+
+              "Term1": { # fibers (FastMonodomainSolver)
+                "MultipleInstances": { 
+                  "ranksAllComputedInstances":    list(range(n_ranks)),
+                  "nInstances":                   1,
+
+                  "instances": [{
+                    "ranks": [0],
+
+                    "StrangSplitting": {
+                      "numberTimeSteps":              1,
+
+                      "logTimeStepWidthAsKey":    "dt_splitting",
+                      "durationLogKey":           "duration_splitting",
+                      "timeStepOutputInterval":   100,
+                      "connectedSlotsTerm1To2":   None,
+                      "connectedSlotsTerm2To1":   None,
+
+                      "Term1": { # reaction term
+                        "MultipleInstances": {
+                          "nInstances":   variables.fb_x * variables.fb_y,
+
+                          "instances": [{
+                            "ranks": [0],
+
+                            "Heun": {
+                              "numberTimeSteps":              1,
+                              "logTimeStepWidthAsKey":    "dt_0D",
+                              "durationLogKey":           "duration_0D",
+                              "timeStepOutputInterval":   100,
+
+                              "initialValues":                [],
+                              "dirichletBoundaryConditions":  {},
+                              "dirichletOutputFilename":      None,
+                              "inputMeshIsGlobal":            True,
+                              "checkForNanInf":               False,
+                              "nAdditionalFieldVariables":    0,
+                              "additionalSlotNames":          [],
+                              "OutputWriter":                 [],
+
+                              "CellML": {
+                                "modelFilename":          variables.input_dir + "hodgkin_huxley-razumova.cellml",
+                                "meshName":               "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)), 
+                                "stimulationLogFilename": "out/" + scenario_name + "stimulation.log",
+
+                                "statesInitialValues":                        [],
+                                "initializeStatesToEquilibrium":              False,
+                                "initializeStatesToEquilibriumTimeStepWidth": 1e-4,
+                                "optimizationType":                           "vc",
+                                "approximateExponentialFunction":             True,
+                                "compilerFlags":                              "-fPIC -O3 -march=native -Wno-deprecated_declarations -shared",
+                                "maximumNumberOfThreads":                     0,
+
+                                "setSpecificStatesCallEnableBegin":       variables.end_time,
+                                "setSpecificStatesCallFrequency":         variables.specific_states_call_frequency,
+                                "setSpecificStatesRepeatAfterFirstCall":  0.01,
+                                "setSpecificStatesFrequencyJitter":       [0] ,
+                                "setSpecificStatesCallInterval":          0,
+                                "setSpecificStatesFunction":              None,
+                                "additionalArgument":                     None, 
+
+                                "mappings": {
+                                  ("parameter", 0):               "membrane/i_Stim",
+                                  ("parameter", 1):               "Razumova/l_hs",
+                                  ("parameter", 2):               ("constant", "Razumova/rel_velo"),
+                                  ("connectorSlot", "vm"):        "membrane/V",
+                                  ("connectorSlot", "stress"):    "Razumova/activestress",
+                                  ("connectorSlot", "alpha"):     "Razumova/activation",
+                                  ("connectorSlot", "lambda"):    "Razumova/l_hs",
+                                  ("connectorSlot", "ldot"):      "Razumova/rel_velo"
+                                },
+                                "parametersInitialValues": [0.0, 1.0, 0.0],
                               },
-                              "parametersInitialValues": [0.0, 1.0, 0.0],
-                            },
-                          }
-                        } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)] 
-                      }
-                    },
-
-                    "Term2": { # diffusion term
-                      "MultipleInstances": {
-                        "nInstances": variables.fb_x * variables.fb_y, 
-
-                        "OutputWriter": [
-                          {
-                            "format":             "Paraview",
-                            "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
-                            "filename":           "out/" + scenario_name + "/fibers_prestretch",
-                            "fileNumbering":      "incremental",
-                            "binary":             True,
-                            "fixedFormat":        False,
-                            "onlyNodalValues":    True,
-                            "combineFiles":       True
-                          }
-                        ],
-
-                        "instances": [{
-                          "ranks": [0],
-
-                          "ImplicitEuler": {
-                            "numberTimeSteps":              1,
-                            "logTimeStepWidthAsKey":    "dt_1D",
-                            "durationLogKey":           "duration_1D",
-                            "timeStepOutputInterval":   100,
-
-                            "nAdditionalFieldVariables":    4,
-                            "additionalSlotNames":          ["stress", "alpha", "lambda", "ldot"],
-
-                            "solverName":                       "diffusionSolver",
-                            "timeStepWidthRelativeTolerance":   1e-10,
-
-                            "dirichletBoundaryConditions":      {},
-                            "dirichletOutputFilename":          None,
-                            "inputMeshIsGlobal":                True,
-                            "checkForNanInf":                   False,
-                            "OutputWriter":                     [],
-
-                            "FiniteElementMethod": {
-                              "meshName":           "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)),
-                              "inputMeshIsGlobal":  True,
-                              "solverName":         "diffusionSolver",
-                              "prefactor":          variables.diffusion_prefactor,
-                              "slotName":           "vm"
                             }
-                          }
-                        } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)]
+                          } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)] 
+                        }
+                      },
+
+                      "Term2": { # diffusion term
+                        "MultipleInstances": {
+                          "nInstances": variables.fb_x * variables.fb_y, 
+
+                          "OutputWriter": [
+                            {
+                              "format":             "Paraview",
+                              "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
+                              "filename":           "out/" + scenario_name + "/fibers_prestretch",
+                              "fileNumbering":      "incremental",
+                              "binary":             True,
+                              "fixedFormat":        False,
+                              "onlyNodalValues":    True,
+                              "combineFiles":       True
+                            }
+                          ],
+
+                          "instances": [{
+                            "ranks": [0],
+
+                            "ImplicitEuler": {
+                              "numberTimeSteps":              1,
+                              "logTimeStepWidthAsKey":    "dt_1D",
+                              "durationLogKey":           "duration_1D",
+                              "timeStepOutputInterval":   100,
+
+                              "nAdditionalFieldVariables":    4,
+                              "additionalSlotNames":          ["stress", "alpha", "lambda", "ldot"],
+
+                              "solverName":                       "diffusionSolver",
+                              "timeStepWidthRelativeTolerance":   1e-10,
+
+                              "dirichletBoundaryConditions":      {},
+                              "dirichletOutputFilename":          None,
+                              "inputMeshIsGlobal":                True,
+                              "checkForNanInf":                   False,
+                              "OutputWriter":                     [],
+
+                              "FiniteElementMethod": {
+                                "meshName":           "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)),
+                                "inputMeshIsGlobal":  True,
+                                "solverName":         "diffusionSolver",
+                                "prefactor":          variables.diffusion_prefactor,
+                                "slotName":           "vm"
+                              }
+                            }
+                          } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)]
+                        }
                       }
                     }
-                  }
-                }]
-              },
+                  }]
+                },
 
-              "fiberDistributionFile":                              variables.fiber_distribution_file,
-              "firingTimesFile":                                    variables.firing_times_file,
-              "valueForStimulatedPoint":                            20.0,
-              "onlyComputeIfHasBeenStimulated":                     True,
-              "disableComputationWhenStatesAreCloseToEquilibrium":  True,
-              "neuromuscularJunctionRelativeSize":                  0.0,################################change for no randomness
-              "generateGPUSource":                                  True,
-              "useSinglePrecision":                                 False
-            },
+                "fiberDistributionFile":                              variables.fiber_distribution_file,
+                "firingTimesFile":                                    variables.firing_times_file,
+                "valueForStimulatedPoint":                            20.0,
+                "onlyComputeIfHasBeenStimulated":                     True,
+                "disableComputationWhenStatesAreCloseToEquilibrium":  True,
+                "neuromuscularJunctionRelativeSize":                  0.0,################################change for no randomness
+                "generateGPUSource":                                  True,
+                "useSinglePrecision":                                 False
+              },
 
-            "Term2": { # solid mechanics (MuscleContractionSolver)
-              "MuscleContractionSolver": {
-                "Pmax":                         variables.pmax,
-                "slotNames":                    ["lambda", "ldot", "gamma", "T"],
-                "dynamic":                      False,
+              "Term2": { # solid mechanics (MuscleContractionSolver)
+                "MuscleContractionSolver": {
+                  "Pmax":                         variables.pmax,
+                  "slotNames":                    ["lambda", "ldot", "gamma", "T"],
+                  "dynamic":                      False,
 
-                "numberTimeSteps":              1,
-                "timeStepOutputInterval":       100,
-                "lambdaDotScalingFactor":       1,
-                "enableForceLengthRelation":    True,
-                "mapGeometryToMeshes":          [],
+                  "numberTimeSteps":              1,
+                  "timeStepOutputInterval":       100,
+                  "lambdaDotScalingFactor":       1,
+                  "enableForceLengthRelation":    True,
+                  "mapGeometryToMeshes":          [],
 
-                "OutputWriter": [
-                  {
-                    "format":             "Paraview",
-                    "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
-                    "filename":           "out/" + scenario_name + "/mechanics",
-                    "fileNumbering":      "incremental",
-                    "binary":             True,
-                    "fixedFormat":        False,
-                    "onlyNodalValues":    True,
-                    "combineFiles":       True
-                  }
-                ],
-                "HyperelasticitySolver": {
-                  "durationLogKey":             "duration_mechanics",         # key to find duration of this solver in the log file
+                  "OutputWriter": [
+                    {
+                      "format":             "Paraview",
+                      "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
+                      "filename":           "out/" + scenario_name + "/mechanics",
+                      "fileNumbering":      "incremental",
+                      "binary":             True,
+                      "fixedFormat":        False,
+                      "onlyNodalValues":    True,
+                      "combineFiles":       True
+                    }
+                  ],
+                  "HyperelasticitySolver": {
+                    "durationLogKey":             "duration_mechanics",         # key to find duration of this solver in the log file
                   
-                  "materialParameters":         variables.material_parameters,          # material parameters of the Mooney-Rivlin material
-                  "displacementsScalingFactor": 1.0,                          # scaling factor for displacements, only set to sth. other than 1 only to increase visual appearance for very small displacements
-                  "residualNormLogFilename":    "log_residual_norm.txt",      # log file where residual norm values of the nonlinear solver will be written
-                  "useAnalyticJacobian":        True,                         # whether to use the analytically computed jacobian matrix in the nonlinear solver (fast)
-                  "useNumericJacobian":         False,                        # whether to use the numerically computed jacobian matrix in the nonlinear solver (slow), only works with non-nested matrices, if both numeric and analytic are enable, it uses the analytic for the preconditioner and the numeric as normal jacobian
+                    "materialParameters":         variables.material_parameters,          # material parameters of the Mooney-Rivlin material
+                    "displacementsScalingFactor": 1.0,                          # scaling factor for displacements, only set to sth. other than 1 only to increase visual appearance for very small displacements
+                    "residualNormLogFilename":    "log_residual_norm.txt",      # log file where residual norm values of the nonlinear solver will be written
+                    "useAnalyticJacobian":        True,                         # whether to use the analytically computed jacobian matrix in the nonlinear solver (fast)
+                    "useNumericJacobian":         False,                        # whether to use the numerically computed jacobian matrix in the nonlinear solver (slow), only works with non-nested matrices, if both numeric and analytic are enable, it uses the analytic for the preconditioner and the numeric as normal jacobian
                     
-                  "dumpDenseMatlabVariables":   False,                        # whether to have extra output of matlab vectors, x,r, jacobian matrix (very slow)
-                  # if useAnalyticJacobian,useNumericJacobian and dumpDenseMatlabVariables all all three true, the analytic and numeric jacobian matrices will get compared to see if there are programming errors for the analytic jacobian
+                    "dumpDenseMatlabVariables":   False,                        # whether to have extra output of matlab vectors, x,r, jacobian matrix (very slow)
+                    # if useAnalyticJacobian,useNumericJacobian and dumpDenseMatlabVariables all all three true, the analytic and numeric jacobian matrices will get compared to see if there are programming errors for the analytic jacobian
                   
-                  # mesh
-                  "meshName":                   "3Dmesh_quadratic",           # mesh with quadratic Lagrange ansatz functions
-                  "inputMeshIsGlobal":          True,                         # boundary conditions are specified in global numberings, whereas the mesh is given in local numberings
+                    # mesh
+                    "meshName":                   "3Dmesh_quadratic",           # mesh with quadratic Lagrange ansatz functions
+                    "inputMeshIsGlobal":          True,                         # boundary conditions are specified in global numberings, whereas the mesh is given in local numberings
                   
-                  #"fiberMeshNames":             [],                           # fiber meshes that will be used to determine the fiber direction
-                  #"fiberDirection":             [0,0,1],                      # if fiberMeshNames is empty, directly set the constant fiber direction, in element coordinate system
+                    #"fiberMeshNames":             [],                           # fiber meshes that will be used to determine the fiber direction
+                    #"fiberDirection":             [0,0,1],                      # if fiberMeshNames is empty, directly set the constant fiber direction, in element coordinate system
                   
-                  # nonlinear solver
-                  "relativeTolerance":          1e-5,                         # 1e-10 relative tolerance of the linear solver
-                  "absoluteTolerance":          1e-10,                        # 1e-10 absolute tolerance of the residual of the linear solver       
-                  "solverType":                 "preonly",                    # type of the linear solver: cg groppcg pipecg pipecgrr cgne nash stcg gltr richardson chebyshev gmres tcqmr fcg pipefcg bcgs ibcgs fbcgs fbcgsr bcgsl cgs tfqmr cr pipecr lsqr preonly qcg bicg fgmres pipefgmres minres symmlq lgmres lcd gcr pipegcr pgmres dgmres tsirm cgls
-                  "preconditionerType":         "lu",                         # type of the preconditioner
-                  "maxIterations":              1e4,                          # maximum number of iterations in the linear solver
-                  "snesMaxFunctionEvaluations": 1e8,                          # maximum number of function iterations
-                  "snesMaxIterations":          100,                           # maximum number of iterations in the nonlinear solver
-                  "snesRelativeTolerance":      1e-5,                         # relative tolerance of the nonlinear solver
-                  "snesLineSearchType":         "l2",                         # type of linesearch, possible values: "bt" "nleqerr" "basic" "l2" "cp" "ncglinear"
-                  "snesAbsoluteTolerance":      1e-5,                         # absolute tolerance of the nonlinear solver
-                  "snesRebuildJacobianFrequency": 1,                          # how often the jacobian should be recomputed, -1 indicates NEVER rebuild, 1 means rebuild every time the Jacobian is computed within a single nonlinear solve, 2 means every second time the Jacobian is built etc. -2 means rebuild at next chance but then never again 
+                    # nonlinear solver
+                    "relativeTolerance":          1e-5,                         # 1e-10 relative tolerance of the linear solver
+                    "absoluteTolerance":          1e-10,                        # 1e-10 absolute tolerance of the residual of the linear solver       
+                    "solverType":                 "preonly",                    # type of the linear solver: cg groppcg pipecg pipecgrr cgne nash stcg gltr richardson chebyshev gmres tcqmr fcg pipefcg bcgs ibcgs fbcgs fbcgsr bcgsl cgs tfqmr cr pipecr lsqr preonly qcg bicg fgmres pipefgmres minres symmlq lgmres lcd gcr pipegcr pgmres dgmres tsirm cgls
+                    "preconditionerType":         "lu",                         # type of the preconditioner
+                    "maxIterations":              1e4,                          # maximum number of iterations in the linear solver
+                    "snesMaxFunctionEvaluations": 1e8,                          # maximum number of function iterations
+                    "snesMaxIterations":          100,                           # maximum number of iterations in the nonlinear solver
+                    "snesRelativeTolerance":      1e-5,                         # relative tolerance of the nonlinear solver
+                    "snesLineSearchType":         "l2",                         # type of linesearch, possible values: "bt" "nleqerr" "basic" "l2" "cp" "ncglinear"
+                    "snesAbsoluteTolerance":      1e-5,                         # absolute tolerance of the nonlinear solver
+                    "snesRebuildJacobianFrequency": 1,                          # how often the jacobian should be recomputed, -1 indicates NEVER rebuild, 1 means rebuild every time the Jacobian is computed within a single nonlinear solve, 2 means every second time the Jacobian is built etc. -2 means rebuild at next chance but then never again 
                   
-                  #"dumpFilename": "out/r{}/m".format(sys.argv[-1]),          # dump system matrix and right hand side after every solve
-                  "dumpFilename":               "",                           # dump disabled
-                  "dumpFormat":                 "default",                     # default, ascii, matlab
+                    #"dumpFilename": "out/r{}/m".format(sys.argv[-1]),          # dump system matrix and right hand side after every solve
+                    "dumpFilename":               "",                           # dump disabled
+                    "dumpFormat":                 "default",                     # default, ascii, matlab
                   
-                  #"loadFactors":                [0.1, 0.2, 0.35, 0.5, 1.0],   # load factors for every timestep
-                  #"loadFactors":                [0.5, 1.0],                   # load factors for every timestep
-                  "loadFactors":                [],                           # no load factors, solve problem directly
-                  "loadFactorGiveUpThreshold":    0.1,                        # if the adaptive time stepping produces a load factor smaller than this value, the solution will be accepted for the current timestep, even if it did not converge fully to the tolerance
-                  "nNonlinearSolveCalls":       1,                            # how often the nonlinear solve should be called
+                    #"loadFactors":                [0.1, 0.2, 0.35, 0.5, 1.0],   # load factors for every timestep
+                    #"loadFactors":                [0.5, 1.0],                   # load factors for every timestep
+                    "loadFactors":                [],                           # no load factors, solve problem directly
+                    "loadFactorGiveUpThreshold":    0.1,                        # if the adaptive time stepping produces a load factor smaller than this value, the solution will be accepted for the current timestep, even if it did not converge fully to the tolerance
+                    "nNonlinearSolveCalls":       1,                            # how often the nonlinear solve should be called
                   
-                  # boundary and initial conditions
-                  "dirichletBoundaryConditions": elasticity_dirichlet_bc,             # the initial Dirichlet boundary conditions that define values for displacements u
-                  "dirichletOutputFilename":     None,                                # filename for a vtp file that contains the Dirichlet boundary condition nodes and their values, set to None to disable
-                  "neumannBoundaryConditions":   elasticity_neumann_bc,               # Neumann boundary conditions that define traction forces on surfaces of elements
-                  "divideNeumannBoundaryConditionValuesByTotalArea": True,            # if the given Neumann boundary condition values under "neumannBoundaryConditions" are total forces instead of surface loads and therefore should be scaled by the surface area of all elements where Neumann BC are applied
-                  "updateDirichletBoundaryConditionsFunction": None,                  # function that updates the dirichlet BCs while the simulation is running
-                  "updateDirichletBoundaryConditionsFunctionCallInterval": 1,         # every which step the update function should be called, 1 means every time step
+                    # boundary and initial conditions
+                    "dirichletBoundaryConditions": create_dirichlet_bc(),           # the initial Dirichlet boundary conditions that define values for displacements u
+                    "dirichletOutputFilename":     None,                                # filename for a vtp file that contains the Dirichlet boundary condition nodes and their values, set to None to disable
+                    "neumannBoundaryConditions":   elasticity_neumann_bc,               # Neumann boundary conditions that define traction forces on surfaces of elements
+                    "divideNeumannBoundaryConditionValuesByTotalArea": True,            # if the given Neumann boundary condition values under "neumannBoundaryConditions" are total forces instead of surface loads and therefore should be scaled by the surface area of all elements where Neumann BC are applied
+                    "updateDirichletBoundaryConditionsFunction": None,                  # function that updates the dirichlet BCs while the simulation is running
+                    "updateDirichletBoundaryConditionsFunctionCallInterval": 1,         # every which step the update function should be called, 1 means every time step
                   
-                  "initialValuesDisplacements":  [[0.0,0.0,0.0] for _ in range(mx*my*mz)],     # the initial values for the displacements, vector of values for every node [[node1-x,y,z], [node2-x,y,z], ...]
-                  "initialValuesVelocities":     [[0.0,0.0,0.0] for _ in range(mx*my*mz)],     # the initial values for the velocities, vector of values for every node [[node1-x,y,z], [node2-x,y,z], ...]
-                  "extrapolateInitialGuess":     True,                                # if the initial values for the dynamic nonlinear problem should be computed by extrapolating the previous displacements and velocities
-                  "constantBodyForce":           constant_body_force,                 # a constant force that acts on the whole body, e.g. for gravity
+                    "initialValuesDisplacements":  initial_values_displacements,        # the initial values for the displacements, vector of values for every node [[node1-x,y,z], [node2-x,y,z], ...], see warm_start_displacements
+                    "initialValuesVelocities":     [[0.0,0.0,0.0] for _ in range(mx*my*mz)],     # the initial values for the velocities, vector of values for every node [[node1-x,y,z], [node2-x,y,z], ...]
+                    "extrapolateInitialGuess":     True,                                # if the initial values for the dynamic nonlinear problem should be computed by extrapolating the previous displacements and velocities
+                    "constantBodyForce":           constant_body_force,                 # a constant force that acts on the whole body, e.g. for gravity
                   
-                  "dirichletOutputFilename":      "out/"+scenario_name+"/dirichlet_boundary_conditions",           # filename for a vtp file that contains the Dirichlet boundary condition nodes and their values, set to None to disable
+                    "dirichletOutputFilename":      "out/"+scenario_name+"/dirichlet_boundary_conditions",           # filename for a vtp file that contains the Dirichlet boundary condition nodes and their values, set to None to disable
         
                 
-                  "OutputWriter": 
-                  [
-                    {"format": "Paraview", "outputInterval": 1, "filename": "out/"+scenario_name+"/prestretch", "binary": True, "fixedFormat": False, "onlyNodalValues":True, "combineFiles":True, "fileNumbering": "incremental"},
+                    "OutputWriter": 
+                    [
+                      {"format": "Paraview", "outputInterval": 1, "filename": "out/"+scenario_name+"/prestretch", "binary": True, "fixedFormat": False, "onlyNodalValues":True, "combineFiles":True, "fileNumbering": "incremental"},
 
-                    {
-                      "format": "PythonCallback",
-                      "callback": handle_result_prestretch,
-                      "outputInterval": 1,
-                    }
-                  ],
-                  "pressure":       { "OutputWriter": [] },
-                  "LoadIncrements": { "OutputWriter": [] }
+                      {
+                        "format": "PythonCallback",
+                        "callback": handle_result_prestretch,
+                        "outputInterval": 1,
+                      }
+                    ],
+                    "pressure":       { "OutputWriter": [] },
+                    "LoadIncrements": { "OutputWriter": [] }
+                  }
                 }
               }
             }
-          }
-    },
-    "Term2": {
-      "Coupling": {
-        "timeStepWidth":            variables.dt_3D,
-        "logTimeStepWidthAsKey":    "dt_3D",
-        "durationLogKey":           "duration_3D",
-        "endTime":                  variables.end_time,
-        "connectedSlotsTerm1To2":   {1:2},  # transfer stress to MuscleContractionSolver gamma
-        "connectedSlotsTerm2To1":   None,   # transfer nothing back
-
-        "Term1": { # fibers (FastMonodomainSolver)
-          "MultipleInstances": { 
-            "ranksAllComputedInstances":    list(range(n_ranks)),
-            "nInstances":                   1,
-
-            "instances": [{
-              "ranks": [0],
-
-              "StrangSplitting": {
-                "timeStepWidth":            variables.dt_splitting,
-                "logTimeStepWidthAsKey":    "dt_splitting",
-                "durationLogKey":           "duration_splitting",
-                "timeStepOutputInterval":   100,
-                "connectedSlotsTerm1To2":   None, #{0:0,1:1,2:2,3:3,4:4},
-                "connectedSlotsTerm2To1":   None, #{0:0,1:1,2:2,3:3,4:4},
-
-                "Term1": { # reaction term
-                  "MultipleInstances": {
-                    "nInstances":   variables.fb_x * variables.fb_y,
-
-                    "instances": [{
-                      "ranks": [0],
-
-                      "Heun": {
-                        "timeStepWidth":            variables.dt_0D,
-                        "logTimeStepWidthAsKey":    "dt_0D",
-                        "durationLogKey":           "duration_0D",
-                        "timeStepOutputInterval":   100,
-
-                        "initialValues":                [],
-                        "dirichletBoundaryConditions":  {},
-                        "dirichletOutputFilename":      None,
-                        "inputMeshIsGlobal":            True,
-                        "checkForNanInf":               False,
-                        "nAdditionalFieldVariables":    0,
-                        "additionalSlotNames":          [],
-                        "OutputWriter":                 [],
-
-                        "CellML": {
-                          "modelFilename":          variables.input_dir + "hodgkin_huxley-razumova.cellml",
-                          "meshName":               "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)), 
-                          "stimulationLogFilename": "out/" + scenario_name + "stimulation.log",
-
-                          "statesInitialValues":                        [],
-                          "initializeStatesToEquilibrium":              False,
-                          "initializeStatesToEquilibriumTimeStepWidth": 1e-4,
-                          "optimizationType":                           "vc",
-                          "approximateExponentialFunction":             True,
-                          "compilerFlags":                              "-fPIC -O3 -march=native -Wno-deprecated_declarations -shared",
-                          "maximumNumberOfThreads":                     0,
-
-                          "setSpecificStatesCallEnableBegin":       variables.specific_states_call_enable_begin,
-                          "setSpecificStatesCallFrequency":         variables.specific_states_call_frequency,
-                          "setSpecificStatesRepeatAfterFirstCall":  0.01,
-                          "setSpecificStatesFrequencyJitter":       [0] ,
-                          "setSpecificStatesCallInterval":          0,
-                          "setSpecificStatesFunction":              None,
-                          "additionalArgument":                     None, 
-
-                          "mappings": {
-                            ("parameter", 0):               "membrane/i_Stim",
-                            ("parameter", 1):               "Razumova/l_hs",
-                            ("parameter", 2):               ("constant", "Razumova/rel_velo"),
-                            ("connectorSlot", "vm"):        "membrane/V",
-                            ("connectorSlot", "stress"):    "Razumova/activestress",
-                            ("connectorSlot", "alpha"):     "Razumova/activation",
-                            ("connectorSlot", "lambda"):    "Razumova/l_hs",
-                            ("connectorSlot", "ldot"):      "Razumova/rel_velo"
+      },
+      "Term2": {
+        "Coupling": {
+          "timeStepWidth":            variables.dt_3D,
+          "logTimeStepWidthAsKey":    "dt_3D",
+          "durationLogKey":           "duration_3D",
+          "endTime":                  variables.end_time,
+          "connectedSlotsTerm1To2":   {1:2},  # transfer stress to MuscleContractionSolver gamma
+          "connectedSlotsTerm2To1":   None,   # transfer nothing back
+
+          "Term1": { # fibers (FastMonodomainSolver)
+            "MultipleInstances": { 
+              "ranksAllComputedInstances":    list(range(n_ranks)),
+              "nInstances":                   1,
+
+              "instances": [{
+                "ranks": [0],
+
+                "StrangSplitting": {
+                  "timeStepWidth":            variables.dt_splitting,
+                  "logTimeStepWidthAsKey":    "dt_splitting",
+                  "durationLogKey":           "duration_splitting",
+                  "timeStepOutputInterval":   100,
+                  "connectedSlotsTerm1To2":   None, #{0:0,1:1,2:2,3:3,4:4},
+                  "connectedSlotsTerm2To1":   None, #{0:0,1:1,2:2,3:3,4:4},
+
+                  "Term1": { # reaction term
+                    "MultipleInstances": {
+                      "nInstances":   variables.fb_x * variables.fb_y,
+
+                      "instances": [{
+                        "ranks": [0],
+
+                        "Heun": {
+                          "timeStepWidth":            variables.dt_0D,
+                          "logTimeStepWidthAsKey":    "dt_0D",
+                          "durationLogKey":           "duration_0D",
+                          "timeStepOutputInterval":   100,
+
+                          "initialValues":                [],
+                          "dirichletBoundaryConditions":  {},
+                          "dirichletOutputFilename":      None,
+                          "inputMeshIsGlobal":            True,
+                          "checkForNanInf":               False,
+                          "nAdditionalFieldVariables":    0,
+                          "additionalSlotNames":          [],
+                          "OutputWriter":                 [],
+
+                          "CellML": {
+                            "modelFilename":          variables.input_dir + "hodgkin_huxley-razumova.cellml",
+                            "meshName":               "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)), 
+                            "stimulationLogFilename": "out/" + scenario_name + "stimulation.log",
+
+                            "statesInitialValues":                        [],
+                            "initializeStatesToEquilibrium":              False,
+                            "initializeStatesToEquilibriumTimeStepWidth": 1e-4,
+                            "optimizationType":                           "vc",
+                            "approximateExponentialFunction":             True,
+                            "compilerFlags":                              "-fPIC -O3 -march=native -Wno-deprecated_declarations -shared",
+                            "maximumNumberOfThreads":                     0,
+
+                            "setSpecificStatesCallEnableBegin":       variables.specific_states_call_enable_begin,
+                            "setSpecificStatesCallFrequency":         variables.specific_states_call_frequency,
+                            "setSpecificStatesRepeatAfterFirstCall":  0.01,
+                            "setSpecificStatesFrequencyJitter":       [0] ,
+                            "setSpecificStatesCallInterval":          0,
+                            "setSpecificStatesFunction":              None,
+                            "additionalArgument":                     None, 
+
+                            "mappings": {
+                              ("parameter", 0):               "membrane/i_Stim",
+                              ("parameter", 1):               "Razumova/l_hs",
+                              ("parameter", 2):               ("constant", "Razumova/rel_velo"),
+                              ("connectorSlot", "vm"):        "membrane/V",
+                              ("connectorSlot", "stress"):    "Razumova/activestress",
+                              ("connectorSlot", "alpha"):     "Razumova/activation",
+                              ("connectorSlot", "lambda"):    "Razumova/l_hs",
+                              ("connectorSlot", "ldot"):      "Razumova/rel_velo"
+                            },
+                            "parametersInitialValues": [0.0, 1.0, 0.0],
                           },
-                          "parametersInitialValues": [0.0, 1.0, 0.0],
-                        },
-                      }
-                    } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)] 
-                  }
-                },
-
-                "Term2": { # diffusion term
-                  "MultipleInstances": {
-                    "nInstances": variables.fb_x * variables.fb_y, 
-
-                    "OutputWriter": [
-                      {
-                        "format":             "Paraview",
-                        "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
-                        "filename":           "out/" + scenario_name + "/fibers",
-                        "fileNumbering":      "incremental",
-                        "binary":             True,
-                        "fixedFormat":        False,
-                        "onlyNodalValues":    True,
-                        "combineFiles":       True
-                      }
-                    ],
-
-                    "instances": [{
-                      "ranks": [0],
-
-                      "ImplicitEuler": {
-                        "timeStepWidth":            variables.dt_1D,
-                        "logTimeStepWidthAsKey":    "dt_1D",
-                        "durationLogKey":           "duration_1D",
-                        "timeStepOutputInterval":   100,
-
-                        "nAdditionalFieldVariables":    4,
-                        "additionalSlotNames":          ["stress", "alpha", "lambda", "ldot"],
-
-                        "solverName":                       "diffusionSolver",
-                        "timeStepWidthRelativeTolerance":   1e-10,
-
-                        "dirichletBoundaryConditions":      {},
-                        "dirichletOutputFilename":          None,
-                        "inputMeshIsGlobal":                True,
-                        "checkForNanInf":                   False,
-                        "OutputWriter":                     [],
-
-                        "FiniteElementMethod": {
-                          "meshName":           "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)),
-                          "inputMeshIsGlobal":  True,
-                          "solverName":         "diffusionSolver",
-                          "prefactor":          variables.diffusion_prefactor,
-                          "slotName":           "vm"
                         }
-                      }
-                    } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)]
+                      } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)] 
+                    }
+                  },
+
+                  "Term2": { # diffusion term
+                    "MultipleInstances": {
+                      "nInstances": variables.fb_x * variables.fb_y, 
+
+                      "OutputWriter": [
+                        {
+                          "format":             "Paraview",
+                          "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
+                          "filename":           "out/" + scenario_name + "/fibers",
+                          "fileNumbering":      "incremental",
+                          "binary":             True,
+                          "fixedFormat":        False,
+                          "onlyNodalValues":    True,
+                          "combineFiles":       True
+                        }
+                      ],
+
+                      "instances": [{
+                        "ranks": [0],
+
+                        "ImplicitEuler": {
+                          "timeStepWidth":            variables.dt_1D,
+                          "logTimeStepWidthAsKey":    "dt_1D",
+                          "durationLogKey":           "duration_1D",
+                          "timeStepOutputInterval":   100,
+
+                          "nAdditionalFieldVariables":    4,
+                          "additionalSlotNames":          ["stress", "alpha", "lambda", "ldot"],
+
+                          "solverName":                       "diffusionSolver",
+                          "timeStepWidthRelativeTolerance":   1e-10,
+
+                          "dirichletBoundaryConditions":      {},
+                          "dirichletOutputFilename":          None,
+                          "inputMeshIsGlobal":                True,
+                          "checkForNanInf":                   False,
+                          "OutputWriter":                     [],
+
+                          "FiniteElementMethod": {
+                            "meshName":           "fiber{}".format(variables.get_fiber_no(fiber_x, fiber_y)),
+                            "inputMeshIsGlobal":  True,
+                            "solverName":         "diffusionSolver",
+                            "prefactor":          variables.diffusion_prefactor,
+                            "slotName":           "vm"
+                          }
+                        }
+                      } for fiber_x in range(variables.fb_x) for fiber_y in range(variables.fb_y)]
+                    }
                   }
                 }
-              }
-            }]
+              }]
+            },
+
+            "fiberDistributionFile":                              variables.fiber_distribution_file,
+            "firingTimesFile":                                    variables.firing_times_file,
+            "valueForStimulatedPoint":                            20.0,
+            "onlyComputeIfHasBeenStimulated":                     True,
+            "disableComputationWhenStatesAreCloseToEquilibrium":  True,
+            "neuromuscularJunctionRelativeSize":                  0.0,################################change for no randomness
+            "generateGPUSource":                                  True,
+            "useSinglePrecision":                                 False
           },
 
-          "fiberDistributionFile":                              variables.fiber_distribution_file,
-          "firingTimesFile":                                    variables.firing_times_file,
-          "valueForStimulatedPoint":                            20.0,
-          "onlyComputeIfHasBeenStimulated":                     True,
-          "disableComputationWhenStatesAreCloseToEquilibrium":  True,
-          "neuromuscularJunctionRelativeSize":                  0.0,################################change for no randomness
-          "generateGPUSource":                                  True,
-          "useSinglePrecision":                                 False
-        },
-
-        "Term2": { # solid mechanics (MuscleContractionSolver)
-          "MuscleContractionSolver": {
-            "Pmax":                         variables.pmax,
-            "slotNames":                    ["lambdaContraction", "ldotContraction", "gammaContraction", "TContraction"],
-            #"slotNames":                    ["lambda", "ldot", "gamma", "T"],
-            "dynamic":                      True,
-
-            "numberTimeSteps":              1,
-            "timeStepOutputInterval":       100,
-            "lambdaDotScalingFactor":       1,
-            "enableForceLengthRelation":    True,
-            "mapGeometryToMeshes":          [],
-
-            "OutputWriter": [
-              {
-                "format":             "Paraview",
-                "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
-                "filename":           "out/" + scenario_name + "/mechanics",
-                "fileNumbering":      "incremental",
-                "binary":             True,
-                "fixedFormat":        False,
-                "onlyNodalValues":    True,
-                "combineFiles":       True
-              }
-            ],
-
-            "DynamicHyperelasticitySolver": {
-              "durationLogKey":         "duration_3D",
-              "logTimeStepWidthAsKey":  "dt_3D",
-              "numberTimeSteps":        1,
-              "materialParameters":     variables.material_parameters,
-              "density":                variables.rho,
-              "timeStepOutputInterval": 1,
-
-              "meshName":                   "3Dmesh_quadratic",
-              "fiberDirectionInElement":    variables.fiber_direction,
-              "inputMeshIsGlobal":          True,
-              "fiberMeshNames":             [],
-              "fiberDirection":             [0,0,1],
-
-              "solverName":                 "mechanicsSolver",
-              "displacementsScalingFactor":  1.0,
-              "useAnalyticJacobian":        True,
-              "useNumericJacobian":         False,
-              "dumpDenseMatlabVariables":   False,
-              "loadFactorGiveUpThreshold":  1,
-              "loadFactors":                [],
-              "scaleInitialGuess":          False,
-              "extrapolateInitialGuess":    True,
-              "nNonlinearSolveCalls":       1,
-
-              "dirichletBoundaryConditions":                            {}, #elasticity_dirichlet_bc, #variables.dirichlet_bc,
-              "neumannBoundaryConditions":                              {}, #elasticity_neumann_bc, #variables.neumann_bc,
-              "updateDirichletBoundaryConditionsFunction":              None,
-              "updateDirichletBoundaryConditionsFunctionCallInterval":  1,
-              "divideNeumannBoundaryConditionValuesByTotalArea":        True,
-
-              "initialValuesDisplacements": [[0, 0, 0] for _ in range(variables.bs_x * variables.bs_y * variables.bs_z)],
-              "initialValuesVelocities":    [[0, 0, 0] for _ in range(variables.bs_x * variables.bs_y * variables.bs_z)],
-              "constantBodyForce":          (0, 0, 0),
-
-              "dirichletOutputFilename":    "out/" + scenario_name + "/dirichlet_output",
-              "residualNormLogFilename":    "out/" + scenario_name + "/residual_norm_log.txt",
-              "totalForceLogFilename":      "out/" + scenario_name + "/total_force_log.txt",
+          "Term2": { # solid mechanics (MuscleContractionSolver)
+            "MuscleContractionSolver": {
+              "Pmax":                         variables.pmax,
+              "slotNames":                    ["lambdaContraction", "ldotContraction", "gammaContraction", "TContraction"],
+              #"slotNames":                    ["lambda", "ldot", "gamma", "T"],
+              "dynamic":                      True,
+
+              "numberTimeSteps":              1,
+              "timeStepOutputInterval":       100,
+              "lambdaDotScalingFactor":       1,
+              "enableForceLengthRelation":    True,
+              "mapGeometryToMeshes":          [],
 
               "OutputWriter": [
                 {
-                  "format": "PythonCallback",
-                  "callback": callback_function_contraction,
-                  "outputInterval": 1,
+                  "format":             "Paraview",
+                  "outputInterval":     int(1.0 / variables.dt_3D * variables.output_interval),
+                  "filename":           "out/" + scenario_name + "/mechanics",
+                  "fileNumbering":      "incremental",
+                  "binary":             True,
+                  "fixedFormat":        False,
+                  "onlyNodalValues":    True,
+                  "combineFiles":       True
                 }
               ],
-              "pressure":       { "OutputWriter": [] },
-              "dynamic":        { "OutputWriter": [] },
-              "LoadIncrements": { "OutputWriter": [] }
+
+              "DynamicHyperelasticitySolver": {
+                "durationLogKey":         "duration_3D",
+                "logTimeStepWidthAsKey":  "dt_3D",
+                "numberTimeSteps":        1,
+                "materialParameters":     variables.material_parameters,
+                "density":                variables.rho,
+                "timeStepOutputInterval": 1,
+
+                "meshName":                   "3Dmesh_quadratic",
+                "fiberDirectionInElement":    variables.fiber_direction,
+                "inputMeshIsGlobal":          True,
+                "fiberMeshNames":             [],
+                "fiberDirection":             [0,0,1],
+
+                "solverName":                 "mechanicsSolver",
+                "displacementsScalingFactor":  1.0,
+                "useAnalyticJacobian":        True,
+                "useNumericJacobian":         False,
+                "dumpDenseMatlabVariables":   False,
+                "loadFactorGiveUpThreshold":  1,
+                "loadFactors":                [],
+                "scaleInitialGuess":          False,
+                "extrapolateInitialGuess":    True,
+                "nNonlinearSolveCalls":       1,
+
+                "dirichletBoundaryConditions":                            {}, #elasticity_dirichlet_bc, #variables.dirichlet_bc,
+                "neumannBoundaryConditions":                              {}, #elasticity_neumann_bc, #variables.neumann_bc,
+                "updateDirichletBoundaryConditionsFunction":              None,
+                "updateDirichletBoundaryConditionsFunctionCallInterval":  1,
+                "divideNeumannBoundaryConditionValuesByTotalArea":        True,
+
+                "initialValuesDisplacements": [[0, 0, 0] for _ in range(variables.bs_x * variables.bs_y * variables.bs_z)],
+                "initialValuesVelocities":    [[0, 0, 0] for _ in range(variables.bs_x * variables.bs_y * variables.bs_z)],
+                "constantBodyForce":          (0, 0, 0),
+
+                "dirichletOutputFilename":    "out/" + scenario_name + "/dirichlet_output",
+                "residualNormLogFilename":    "out/" + scenario_name + "/residual_norm_log.txt",
+                "totalForceLogFilename":      "out/" + scenario_name + "/total_force_log.txt",
+
+                "OutputWriter": [
+                  {
+                    "format": "PythonCallback",
+                    "callback": callback_function_contraction,
+                    "outputInterval": 1,
+                  }
+                ],
+                "pressure":       { "OutputWriter": [] },
+                "dynamic":        { "OutputWriter": [] },
+                "LoadIncrements": { "OutputWriter": [] }
+              }
             }
           }
         }
       }
-    }
-  },
-}
+    },
+  }
+
+config_key = config_cache.key([os.path.join(script_path, "settings_contraction_with_prestretch.py"), os.path.join(var_path, "variables.py")],
+                              sys.argv[:1] + sys.argv[3:] + [design_space.suffix(variables.overrides)]) # all arguments except force and individuality parameter, and the overridden variables
+config = config_cache.load(config_key, force_dependent)
+if config is None:
+  config = create_config()
+  config_cache.store(config_key, config, force_dependent)
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+from functools import lru_cache
+
+"""
+This is a persistent cache for the results of OpenDiHu simulations, stored in an SQLite database.
+An entry is identified by the kind of the simulation (the name of the binary), the force and a hash of everything else
+that determines the result: the settings file, variables/variables.py and the binary itself. If one of these files
+changes, the old entries don't match anymore and can be removed with invalidate(). If the database holds more than
+max_entries entries, the least recently used ones are evicted.
+The settings files of the simulations use the cache as well (the warm start of the prestretch). They leave it alone if
+the environment variable SIMULATION_CACHE is "0", which BayesOpt.py sets with "no_cache", see enabled().
+The database can be inspected from the command line, go to build_release and run:
+>python ../simulation_cache.py info
+>python ../simulation_cache.py clear
+"""
+
+database = "simulation_cache.sqlite"
+max_entries = 10000
+environment_variable = "SIMULATION_CACHE"
+
+
+#Returns whether the cache may be used by this process, i.e. whether the driver didn't switch it off.
+def enabled():
+    return os.environ.get(environment_variable, "1") != "0"
+
+
+def connect():
+    connection = sqlite3.connect(database, timeout=60)
+    connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                              kind TEXT NOT NULL,
+                              settings_hash TEXT NOT NULL,
+                              force REAL NOT NULL,
+                              result TEXT NOT NULL,
+                              created REAL NOT NULL,
+                              last_used REAL NOT NULL,
+                              PRIMARY KEY (kind, settings_hash, force))""")
+    connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+    return connection
+
+
+@lru_cache(maxsize=None)
+def file_hash(path, modification_time, size):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+#This hashes the files a simulation depends on. The hashes of the single files are kept in memory as long as the files
+#are not modified, so only the first call per file reads it.
+def settings_hash(paths):
+    sha = hashlib.sha256()
+    for path in paths:
+        sha.update(os.path.basename(path).encode())
+        if os.path.exists(path):
+            status = os.stat(path)
+            sha.update(file_hash(os.path.abspath(path), status.st_mtime, status.st_size).encode())
+    return sha.hexdigest()
+
+
+#Returns the stored result of the simulation whose force is closest to the given one, if it differs by at most
+#tolerance. Otherwise None is returned.
+def lookup(kind, settings_hash, force, tolerance=0.0):
+    connection = connect()
+    try:
+        with connection:
+            row = connection.execute("""SELECT force, result FROM results
+                                        WHERE kind = ? AND settings_hash = ? AND force BETWEEN ? AND ?
+                                        ORDER BY ABS(force - ?) LIMIT 1""",
+                                     (kind, settings_hash, force - tolerance, force + tolerance, force)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE results SET last_used = ? WHERE kind = ? AND settings_hash = ? AND force = ?",
+                               (time.time(), kind, settings_hash, row[0]))
+    finally:
+        connection.close()
+    return json.loads(row[1])
+
+
+#Returns the stored results of the simulations with the nearest force below or equal to and the nearest force above the
+#given one, as a list of up to two pairs (force, result). Forces that differ by more than max_distance are left out.
+def neighbors(kind, settings_hash, force, max_distance):
+    connection = connect()
+    try:
+        with connection:
+            rows = connection.execute("""SELECT * FROM
+                                         (SELECT force, result FROM results
+                                          WHERE kind = ? AND settings_hash = ? AND force BETWEEN ? AND ?
+                                          ORDER BY force DESC LIMIT 1)
+                                         UNION ALL
+                                         SELECT * FROM
+                                         (SELECT force, result FROM results
+                                          WHERE kind = ? AND settings_hash = ? AND force > ? AND force <= ?
+                                          ORDER BY force ASC LIMIT 1)""",
+                                      (kind, settings_hash, force - max_distance, force,
+                                       kind, settings_hash, force, force + max_distance)).fetchall()
+            for row in rows:
+                connection.execute("UPDATE results SET last_used = ? WHERE kind = ? AND settings_hash = ? AND force = ?",
+                                   (time.time(), kind, settings_hash, row[0]))
+    finally:
+        connection.close()
+    return [(row[0], json.loads(row[1])) for row in rows]
+
+
+#Returns all stored results of the given kind and settings as a list of pairs (force, result), sorted by force.
+def entries(kind, settings_hash):
+    connection = connect()
+    try:
+        rows = connection.execute("SELECT force, result FROM results WHERE kind = ? AND settings_hash = ? ORDER BY force",
+                                  (kind, settings_hash)).fetchall()
+    finally:
+        connection.close()
+    return [(row[0], json.loads(row[1])) for row in rows]
+
+
+#Stores the result (a dictionary) of a simulation and evicts the least recently used entries if the cache is full.
+def store(kind, settings_hash, force, result):
+    now = time.time()
+    connection = connect()
+    try:
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                               (kind, settings_hash, float(force), json.dumps(result), now, now))
+            connection.execute("""DELETE FROM results WHERE rowid IN
+                                  (SELECT rowid FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                               (max_entries,))
+    finally:
+        connection.close()
+
+
+#Removes all entries of the given kind that were computed with other settings than the current ones. The kinds that
+#start with kind + "_", e.g. the ones of other fidelities or overridden parameters, are removed as well.
+def invalidate(kind, settings_hash):
+    pattern = kind.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "\\_%"
+    connection = connect()
+    try:
+        with connection:
+            removed = connection.execute("""DELETE FROM results WHERE (kind = ? OR kind LIKE ? ESCAPE '\\')
+                                            AND settings_hash != ?""",
+                                         (kind, pattern, settings_hash)).rowcount
+    finally:
+        connection.close()
+    return removed
+
+
+def clear():
+    connection = connect()
+    try:
+        with connection:
+            connection.execute("DELETE FROM results")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        clear()
+        print("Removed all entries from", database)
+    else:
+        connection = connect()
+        for kind, number, hashes in connection.execute("""SELECT kind, COUNT(*), COUNT(DISTINCT settings_hash)
+                                                          FROM results GROUP BY kind"""):
+            print(kind, ":", number, "entries for", hashes, "different settings")
+        connection.close()
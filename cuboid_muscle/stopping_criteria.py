@@ -0,0 +1,60 @@
+import torch
+
+"""
+This is a file with the stopping criteria of the BO loops.
+Every criterion returns a boolean tensor that says if it is met. All inputs may have leading batch dimensions, e.g. one
+per replicate of a batched BO run, then the result has these batch dimensions, otherwise it is a single boolean.
+stopping_xy_met: there is a trial with at least num_consecutive_trials trials (including itself) closer than x_range,
+    and the best trial is among them. The trials are sorted once, and the number of neighbors of every trial is counted
+    with a binary search, so this takes O(n log n) instead of comparing all pairs of trials. With several inputs (a
+    multi-dimensional design space), all pairs are compared in the maximum norm.
+regret_bound_met: the simple regret of the best posterior mean is at most threshold with high probability, i.e. the
+    largest upper confidence bound (mean + beta*stddev) is less than threshold above the largest lower confidence bound.
+acquisition_value_met: the value of the acquisition function at the new query point is below threshold, so no query
+    point is expected to improve the result noticeably.
+posterior_variance_met: the posterior variance is below threshold everywhere, so the GP is certain about the function.
+The posterior criteria take the posterior mean and standard deviation on a grid of query points (last dimension).
+"""
+
+
+#Returns the number of trials closer than x_range for every trial. x has shape (..., n), sorted_x is x sorted along the
+#last dimension.
+def neighbor_counts(x, sorted_x, x_range):
+    upper = torch.searchsorted(sorted_x, x + x_range, side="left")
+    lower = torch.searchsorted(sorted_x, x - x_range, side="right")
+    return upper - lower
+
+
+#train_x and train_y have shape (..., n, d) and (..., n, 1).
+def stopping_xy_met(train_x, train_y, x_range, num_consecutive_trials):
+    if train_x.shape[-1] > 1:
+        return stopping_xy_met_multi_dimensional(train_x, train_y, x_range, num_consecutive_trials)
+    x = train_x[..., 0].contiguous()
+    sorted_x = x.sort(dim=-1).values
+    max_x = x.gather(-1, train_y[..., 0].argmax(dim=-1, keepdim=True))
+    #The best trial is in the neighborhood of trial k exactly if trial k is closer than x_range to the best trial
+    near_max = (x - max_x).abs() < x_range
+    return ((neighbor_counts(x, sorted_x, x_range) >= num_consecutive_trials) & near_max).any(dim=-1)
+
+
+def regret_bound_met(mean, stddev, threshold, beta=2.0):
+    upper_confidence_bound = (mean + beta*stddev).max(dim=-1).values
+    lower_confidence_bound = (mean - beta*stddev).max(dim=-1).values
+    return upper_confidence_bound - lower_confidence_bound < threshold
+
+
+def acquisition_value_met(acq_value, threshold):
+    return torch.as_tensor(acq_value) < threshold
+
+
+def posterior_variance_met(stddev, threshold):
+    return (stddev**2).max(dim=-1).values < threshold
+
+
+#stopping_xy_met for several inputs, where the distance of two trials is the largest distance of their inputs. The
+#trials can't be sorted then, so all pairs of trials are compared.
+def stopping_xy_met_multi_dimensional(train_x, train_y, x_range, num_consecutive_trials):
+    close = (train_x.unsqueeze(-2) - train_x.unsqueeze(-3)).abs().max(dim=-1).values < x_range
+    best = train_y[..., 0].argmax(dim=-1)
+    near_max = close.gather(-2, best[..., None, None].expand(*close.shape[:-2], 1, close.shape[-1])).squeeze(-2)
+    return ((close.sum(dim=-1) >= num_consecutive_trials) & near_max).any(dim=-1)
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import subprocess
+
+"""
+Runs BayesOpt.py end to end with a further parameter of variables/variables.py (a multi-dimensional run, see
+design_space.py). The OpenDiHu binaries are replaced by small python scripts that write the same result files, with a
+contraction that depends on the force and on pmax.
+Run it from cuboid_muscle with:
+>python -m pytest test_bayes_opt_parameters.py
+"""
+
+fake_prestretch = """#!{python}
+import sys
+import numpy as np
+force, individuality_parameter = float(sys.argv[3]), sys.argv[4]
+np.save("muscle_length_prestretch" + individuality_parameter + ".npy", np.array([12.0, 12.0*(1 + force/50)]))
+"""
+
+fake_contraction = """#!{python}
+import os
+import sys
+import json
+import math
+import numpy as np
+force, individuality_parameter = float(sys.argv[3]), sys.argv[4]
+pmax = json.loads(os.environ.get("VARIABLES_OVERRIDES", "{{}}")).get("pmax", 7.3)
+length = 12.0 + 0.1*force
+contraction = math.sin(force/5.0) - 0.05*(pmax - 8)**2
+np.save("muscle_length_prestretch" + individuality_parameter + ".npy", np.array([12.0, length]))
+np.save("muscle_length_contraction" + individuality_parameter + ".npy",
+        np.array([length - contraction*(1 - math.exp(-t/5)) for t in range(1, 401)]))
+"""
+
+
+def write_binary(path, source):
+    with open(path, "w") as f:
+        f.write(source.format(python=sys.executable))
+    os.chmod(path, 0o755)
+
+
+def test_run_with_parameter(tmp_path):
+    directory = tmp_path / "cuboid_muscle"
+    shutil.copytree(os.path.dirname(os.path.abspath(__file__)), directory,
+                    ignore=shutil.ignore_patterns("build_release", "__pycache__"))
+    build_release = directory / "build_release"
+    build_release.mkdir()
+    write_binary(build_release / "incompressible_mooney_rivlin_prestretch_only", fake_prestretch)
+    write_binary(build_release / "muscle_contraction_with_prestretch", fake_contraction)
+
+    environment = dict(os.environ, SMOKE_TEST="1", MPLBACKEND="Agg")
+    process = subprocess.run([sys.executable, "BayesOpt.py", "matern", "2.5", "const", "fixed_noise", "ei", "stopping_xy",
+                              "parameter", "pmax", "5", "10"],
+                             cwd=directory, env=environment, capture_output=True, text=True, timeout=900)
+    assert process.returncode == 0, process.stdout[-2000:] + process.stderr[-2000:]
+
+    #The bounds of pmax must not be taken for the nu of the kernel
+    connection = sqlite3.connect(build_release / "BayesOpt_results.sqlite")
+    individuality_parameter, finished, maximizer, maximizer_parameters = connection.execute(
+        "SELECT individuality_parameter, finished, maximizer, maximizer_parameters FROM runs").fetchone()
+    connection.close()
+    assert individuality_parameter.startswith("_matern_2.5_")
+    assert finished is not None
+    assert 5 <= json.loads(maximizer_parameters)["pmax"] <= 10
+    assert not any(name.endswith(".pt") for name in os.listdir(build_release))
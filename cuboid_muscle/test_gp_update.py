@@ -0,0 +1,86 @@
+import io
+import contextlib
+import torch
+import pytest
+import BayesOpt_test_functions
+from gp_update import IncrementalGP
+
+"""
+Tests of the incremental GP of gp_update.py: an update without a refit gives the exact posterior of the GP with the same
+hyperparameters, and the BO runs of the test functions with the default refit_interval and min_refit_trials use such
+updates and still give the same results as fitting the hyperparameters after every iteration.
+Run them from cuboid_muscle with:
+>python -m pytest test_gp_update.py
+"""
+
+
+class RecordingIncrementalGP(IncrementalGP):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        RecordingIncrementalGP.instances.append(self)
+
+
+def run(function_number, seed, refit_interval, monkeypatch):
+    BayesOpt_test_functions.set_options(["matern", "2.5", "const", "fixed_noise", "ei", "stopping_xy"])
+    monkeypatch.setattr(BayesOpt_test_functions, "visualize", False)
+    monkeypatch.setattr(BayesOpt_test_functions, "add_points", False)
+    monkeypatch.setattr(BayesOpt_test_functions, "refit_interval", refit_interval)
+    monkeypatch.setattr(BayesOpt_test_functions, "IncrementalGP", RecordingIncrementalGP)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = BayesOpt_test_functions.bayes_opt(function_number=function_number, seed=seed, write_files=False)
+    return result, RecordingIncrementalGP.instances[-1]
+
+
+def test_refit_interval_matches_refit_every_iteration(monkeypatch):
+    refit_interval = BayesOpt_test_functions.refit_interval
+    num_fits, num_updates = 0, 0
+    for seed in range(4):
+        every_iteration, _ = run(1, seed, 1, monkeypatch)
+        result, incremental_gp = run(1, seed, refit_interval, monkeypatch)
+        assert result.number_of_trials == every_iteration.number_of_trials
+        assert result.maximizer == pytest.approx(every_iteration.maximizer, abs=2e-3)
+        #The hyperparameters fitted on the two initial trials must not stop the run right after them
+        assert every_iteration.number_of_trials > 4
+        assert every_iteration.maximizer == pytest.approx(0.65, abs=3e-2)
+        num_fits += incremental_gp.num_fits - 1
+        num_updates += incremental_gp.num_updates
+    #Some of the updates append the new trial to the GP without fitting the hyperparameters again
+    assert num_fits < num_updates
+
+
+def test_update_is_exact_posterior(monkeypatch):
+    BayesOpt_test_functions.set_options(["matern", "2.5", "const", "fixed_noise", "ei", "stopping_xy"])
+    torch.manual_seed(0)
+    train_x = torch.rand(6, 1, dtype=torch.double)
+    train_y = torch.sin(6*train_x)
+    new_x = torch.rand(2, 1, dtype=torch.double)
+    new_y = torch.sin(6*new_x)
+    all_x, all_y = torch.cat([train_x, new_x]), torch.cat([train_y, new_y])
+
+    incremental_gp = IncrementalGP(BayesOpt_test_functions.CustomSingleTaskGP, train_x, train_y, refit_interval=10,
+                                   mll_tolerance=float("inf"))
+    fitted = incremental_gp.gp
+    gp = incremental_gp.update(all_x, all_y, new_x, new_y)
+    assert incremental_gp.num_fits == 1 and incremental_gp.num_updates == 1
+
+    #The exact posterior with the hyperparameters, input normalization and outcome standardization of the fit
+    test_x = torch.linspace(0, 1, 50, dtype=torch.double).unsqueeze(-1)
+    with torch.no_grad():
+        normalized_x = fitted.input_transform(all_x)
+        normalized_test_x = fitted.input_transform(test_x)
+        means, stdvs = fitted.outcome_transform.means.squeeze(), fitted.outcome_transform.stdvs.squeeze()
+        standardized_y = ((all_y - means)/stdvs).squeeze(-1)
+        prior_mean = fitted.mean_module(normalized_x)
+        covariance = fitted.covar_module(normalized_x).to_dense()
+        covariance = covariance + fitted.likelihood.noise*torch.eye(len(all_x), dtype=torch.double)
+        cross_covariance = fitted.covar_module(normalized_test_x, normalized_x).to_dense()
+        test_covariance = fitted.covar_module(normalized_test_x, diag=True)
+        weights = torch.linalg.solve(covariance, standardized_y - prior_mean)
+        mean = fitted.mean_module(normalized_test_x) + cross_covariance @ weights
+        variance = test_covariance - (cross_covariance*torch.linalg.solve(covariance, cross_covariance.T).T).sum(-1)
+
+        posterior = gp.posterior(test_x)
+    assert posterior.mean.squeeze(-1) == pytest.approx((mean*stdvs + means).numpy(), abs=1e-6)
+    assert posterior.variance.squeeze(-1) == pytest.approx((variance*stdvs**2).numpy(), abs=1e-6)
@@ -1,4 +1,6 @@
 import sys
+import os
+import json
 import itertools
 import numpy as np
 
@@ -8,26 +10,44 @@ if sys.argv[-1] != "BayesOpt.py":
 else:
     n_ranks = 1
 
+# Fidelity of the simulation, 1.0 is the full model. A lower fidelity (given after the individuality parameter, see
+# settings_contraction_with_prestretch.py) scales down the number of elements, the number of fibers and the end time,
+# which gives a cheap approximation of the contraction
+fidelity = 1.0
+if len(sys.argv) > 5:
+    fidelity = float(sys.argv[3])
+
+# Overrides of parameters, e.g. the design parameters of a multi-dimensional BO run (see design_space.py). The
+# environment variable VARIABLES_OVERRIDES holds a JSON object of names and values, e.g. {"pmax": 7.0, "c2": 1.9}
+overrides = json.loads(os.environ.get("VARIABLES_OVERRIDES", "{}"))
+overridable = set()
+
+def parameter(name, default):
+    overridable.add(name)
+    return overrides.get(name, default)
+
 # Time stepping
 dt_3D = 1e-1            # time step of 3D mechanics
 dt_splitting = 2e-3     # time step of strang splitting
 dt_1D = 2e-3            # time step of 1D fiber diffusion
 dt_0D = 1e-3            # time step of 0D cellml problem
-end_time = 40.0         # end time of the simulation 
+end_time = 40.0*fidelity # end time of the simulation
 output_interval = dt_3D # time interval between outputs
 
 # Material parameters
-pmax = 7.3                                                  # maximum active stress
-rho = 10                                                    # density of the muscle
-material_parameters = [3.176e-10, 1.813, 1.075e-2, 1.0]     # [c1, c2, b, d]
-diffusion_prefactor = 3.828 / (500.0 * 0.58)                # Conductivity / (Am * Cm)
+pmax = parameter("pmax", 7.3)                               # maximum active stress
+rho = parameter("rho", 10)                                  # density of the muscle
+material_parameters = [parameter("c1", 3.176e-10), parameter("c2", 1.813),
+                       parameter("b", 1.075e-2), parameter("d", 1.0)]         # [c1, c2, b, d]
+diffusion_prefactor = parameter("diffusion_prefactor", 3.828 / (500.0 * 0.58)) # Conductivity / (Am * Cm)
 
 # Meshes
 ex_x, ex_y, ex_z = 3.0, 3.0, 12.0               # extent of muscle
-el_x, el_y, el_z = 3, 3, 12                     # number of elements
+el_x, el_y, el_z = max(1, round(3*fidelity)), max(1, round(3*fidelity)), max(2, round(12*fidelity)) # number of elements
 bs_x, bs_y, bs_z = 2*el_x+1, 2*el_y+1, 2*el_z+1 # quadratic basis functions
 
-fb_x, fb_y = 10, 10         # number of fibers
+fibers = parameter("fibers", 10) # number of fibers in x and y direction of the full model
+fb_x, fb_y = max(2, round(fibers*fidelity)), max(2, round(fibers*fidelity)) # number of fibers
 fb_points = 100             # number of points per fiber
 fiber_direction = [0, 0, 1] # direction of fiber in element
 
@@ -84,3 +104,18 @@ fiber_distribution_file = input_dir + "MU_fibre_distribution_3780.txt"
 firing_times_file = input_dir + "MU_firing_times_always.txt"
 specific_states_call_enable_begin = 1.0                     # time of first fiber activation
 specific_states_call_frequency = 1e-3                       # frequency of fiber activation
+
+# Early termination of the contraction
+plateau_start_time = 5.0    # the muscle length is not checked for a plateau before this time
+plateau_window = 5.0        # time window over which the muscle length has to be settled
+plateau_tolerance = 1e-4    # maximum relative change of the muscle length within the window, 0 disables early termination
+plateau_max_ratio = 0.8     # the length is only extrapolated if the change over a half window shrinks at least by this factor
+
+# Warm start of the prestretch
+warm_start_prestretch = True    # start the prestretch solve from the stored displacements of nearby forces
+warm_start_max_distance = 5.0   # [N] stored displacements of forces that differ by more than this are not used
+
+# A misspelled override would otherwise be ignored silently
+unknown_overrides = set(overrides) - overridable
+if len(unknown_overrides) > 0:
+    raise ValueError("Unknown parameters in VARIABLES_OVERRIDES: {}".format(", ".join(sorted(unknown_overrides))))
@@ -1,43 +1,41 @@
-import csv
 import os
 import matplotlib.pyplot as plt
-import numpy as np
 import sys
+import results_store
 
 """
 When calling this file: python visualise_BayesOpt.py {individuality_parameter}
 with individuality_parameter being parameter printed by BayesOpt file in the end.
-It is the parameter in the filename in build_releas: "BayesOpt_outputs{individuality_parameter}.csv".
+It plots the latest finished run with this parameter in build_release/BayesOpt_results.sqlite (see results_store.py).
+An earlier run can be chosen by its run_id, which is also printed by BayesOpt file in the end:
+python visualise_BayesOpt.py {individuality_parameter} {run_id}
 """
 
 individuality_parameter = sys.argv[1]
 
 os.chdir("build_release")
 
-with open("BayesOpt_outputs"+individuality_parameter+".csv", "r") as f:
-    reader = csv.reader(f, delimiter=",")
-    rows = [row for row in reader]
+runs = [run for run in results_store.runs(individuality_parameter) if run["finished"] is not None]
+if len(sys.argv) > 2:
+    runs = [run for run in runs if run["run_id"] == int(sys.argv[2])]
+if len(runs) == 0:
+    sys.exit("No finished run with the individuality parameter " + individuality_parameter + " found.")
+run = runs[-1]
 
-for i in range(len(rows) - 6):
-    plt.scatter(float(rows[i][0]), float(rows[i][1]), color="red", label="Trials" if i == 0 else "", zorder=3)
+for i, (force, y, fidelity, parameters) in enumerate(results_store.trials(run["run_id"])):
+    plt.scatter(force, y, color="red", label="Trials" if i == 0 else "", zorder=3)
 
-x = list(map(float, rows[-6]))
-mean = list(map(float, rows[-5]))
-stddev = list(map(float, rows[-4]))
-number_of_trials = float(rows[-3][0])
-maximizer = float(rows[-2][0])
-best_f = float(rows[-2][1])
-time_elapsed = float(rows[-1][0])
+x, mean, stddev = results_store.posterior(run["run_id"])
+number_of_trials = run["number_of_trials"]
+maximizer = run["maximizer"]
+best_f = run["best_y"]
+time_elapsed = run["time"]
 
 print("Time elapsed: ", time_elapsed, " seconds")
 print("Number of trials: ", number_of_trials)
 print("Best value: ", best_f)
 print("Maximizer: ", maximizer)
 
-x = np.array(x)
-mean = np.array(mean)
-stddev = np.array(stddev)
-
 plt.scatter(maximizer, best_f, color="green", label="Maximum", zorder=3)
 plt.plot(x, mean, color="blue", label="GP Mean")
 plt.fill_between(x, mean - 2 * stddev, mean + 2 * stddev, alpha=0.3, label="GP 95% CI", color="lightblue")